@@ -0,0 +1,19 @@
+# ruff: noqa
+"""
+ASGI config for Ticketing API project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with the uvicorn worker, e.g.
+``gunicorn config.asgi -k uvicorn_worker.UvicornWorker``, and set
+``TICKETS_ASYNC_VIEWS=True`` so the Jira proxy endpoints are served by the
+async viewset.
+
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
+
+application = get_asgi_application()
@@ -1,10 +1,12 @@
 # ruff: noqa: ERA001, E501
 """Base settings to build other settings files upon."""
 
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
 import environ
+from corsheaders.defaults import default_headers
 from django.utils.translation import gettext_lazy as _
 
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
@@ -31,6 +33,7 @@ ADMIN_ALLOWED_HOSTS = env.list("DJANGO_ADMIN_ALLOWED_HOSTS", default=[])
 # django-cors-headers - https://github.com/adamchainz/django-cors-headers#setup
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = env.list("CORS_ALLOWED_ORIGINS", default=[])
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 CSRF_TRUSTED_ORIGINS = env.list("CSRF_TRUSTED_ORIGINS", default=[])
 # Local time zone. Choices are
 # http://en.wikipedia.org/wiki/List_of_tz_zones_by_name
@@ -67,6 +70,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 ROOT_URLCONF = "config.urls"
 # https://docs.djangoproject.com/en/dev/ref/settings/#wsgi-application
 WSGI_APPLICATION = "config.wsgi.application"
+# https://docs.djangoproject.com/en/dev/ref/settings/#asgi-application
+ASGI_APPLICATION = "config.asgi.application"
 
 # APPS
 # ------------------------------------------------------------------------------
@@ -102,6 +107,7 @@ LOCAL_APPS = [
     # Your stuff: custom apps go here
     "users",
     "tickets",
+    "jira",
 ]
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -159,6 +165,7 @@ MIDDLEWARE = [
     # "allauth.account.middleware.AccountMiddleware",
     "utils.middleware.DeleteCookieMiddleware",
     "utils.middleware.AdminHostMiddleware",
+    "utils.middleware.DeadlineMiddleware",
 ]
 
 # STATIC
@@ -308,6 +315,18 @@ CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
 CELERY_TASK_SEND_SENT_EVENT = True
 CELERY_TASK_ACKS_LATE = True
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-schedule
+CELERY_BEAT_SCHEDULE = {
+    "sync-jira-issues": {
+        "task": "tickets.tasks.sync_jira_issues",
+        "schedule": env.int("JIRA_SYNC_INTERVAL", 60),
+    },
+    # Retries failed webhook events and any whose task was never queued.
+    "process-jira-webhooks": {
+        "task": "jira.tasks.process_jira_webhooks",
+        "schedule": env.int("JIRA_WEBHOOK_SWEEP_INTERVAL", 60),
+    },
+}
 # django-allauth
 # ------------------------------------------------------------------------------
 ACCOUNT_ALLOW_REGISTRATION = env.bool("DJANGO_ACCOUNT_ALLOW_REGISTRATION", True)
@@ -402,4 +421,166 @@ JIRA_SETTINGS = {
     "username": env("JIRA_USERNAME", default=""),
     "password": env("JIRA_PASSWORD", default=""),
     "default_project_key": env("JIRA_DEFAULT_PROJECT_KEY", default=""),
+    # Seconds an issue detail is served from CACHES before asking Jira again.
+    # Webhooks and local writes invalidate it earlier. 0 disables the cache.
+    "issue_cache_ttl": env.int("JIRA_ISSUE_CACHE_TTL", 300),
+    # Ticket list pages are served from CACHES for list_cache_ttl seconds,
+    # then served stale for up to list_stale_ttl more while a background
+    # refresh runs. A customer's pages are dropped when they create a ticket
+    # or comment. 0 disables the list cache.
+    "list_cache_ttl": env.int("JIRA_LIST_CACHE_TTL", 30),
+    "list_stale_ttl": env.int("JIRA_LIST_STALE_TTL", 300),
+    # Identical concurrent issue and comment reads share one Jira call. Other
+    # processes wait up to this many seconds for the call holding the lock;
+    # 0 coalesces within a process only.
+    "coalesce_wait": env.int("JIRA_COALESCE_WAIT", 5),
+    # Each endpoint class (search, issue, comment, attachment) has a circuit
+    # breaker whose state is shared through CACHES. It opens for open_for
+    # seconds once error_rate of at least min_calls calls in a window fail;
+    # timeouts follow the observed p99 latency within min/max_timeout.
+    "circuit_breaker": {
+        "error_rate": env.float("JIRA_BREAKER_ERROR_RATE", 0.5),
+        "min_calls": env.int("JIRA_BREAKER_MIN_CALLS", 20),
+        "window": env.int("JIRA_BREAKER_WINDOW", 30),
+        "open_for": env.int("JIRA_BREAKER_OPEN_FOR", 30),
+        "min_timeout": env.float("JIRA_MIN_TIMEOUT", 1),
+        "max_timeout": env.float("JIRA_MAX_TIMEOUT", 5),
+    },
+    # Seconds a cached issue (past issue_cache_ttl) and the last comments
+    # response are kept to answer reads while a circuit is open.
+    "stale_fallback_ttl": env.int("JIRA_STALE_FALLBACK_TTL", 86400),
+    # Attachments are kept on local disk and evicted least recently used
+    # first once they take more than attachment_cache_size bytes. 0 disables.
+    "attachment_cache_dir": env(
+        "JIRA_ATTACHMENT_CACHE_DIR",
+        default=str(Path(tempfile.gettempdir()) / "jira-attachments"),
+    ),
+    "attachment_cache_size": env.int("JIRA_ATTACHMENT_CACHE_SIZE", 1024**3),
+    # proxy streams attachments through Django. accel and signed stage them in
+    # the cache above and let nginx send them, via X-Accel-Redirect or a
+    # redirect to a secure_link URL; see compose/production/nginx.
+    "attachment_delivery": env("JIRA_ATTACHMENT_DELIVERY", default="proxy"),
+    "attachment_url_secret": env("JIRA_ATTACHMENT_URL_SECRET", default=None),
+    "attachment_url_ttl": env.int("JIRA_ATTACHMENT_URL_TTL", 300),
+    # Concurrent per-file uploads when Jira rejects a multi-file upload.
+    "attachment_upload_workers": env.int("JIRA_ATTACHMENT_UPLOAD_WORKERS", 4),
+    # Calls per second to Jira for reads, writes and attachments, shared by
+    # every process through Redis. burst is how many seconds of calls may go
+    # out at once; calls over the rate wait up to max_wait seconds for their
+    # turn. A 429 pauses its bucket for Retry-After seconds and the call is
+    # retried up to retries times. A rate of 0 leaves that kind unpaced.
+    "rate_limit": {
+        "rates": {
+            "read": env.float("JIRA_READ_RATE", 20),
+            "write": env.float("JIRA_WRITE_RATE", 5),
+            "attachment": env.float("JIRA_ATTACHMENT_RATE", 2),
+        },
+        "burst": env.float("JIRA_RATE_BURST", 2),
+        "max_wait": env.float("JIRA_RATE_MAX_WAIT", 5),
+        "retries": env.int("JIRA_RATE_RETRIES", 2),
+    },
+    # Opt-in: a GET of an issue or its comments that has not answered by the
+    # given percentile of recent latencies is sent again and the first answer
+    # wins. budget caps the extra calls as a share of hedgeable calls. Each
+    # worker reports its hedge rate at /tickets/stats/ on the admin host.
+    "hedging": {
+        "percentile": env.float("JIRA_HEDGE_PERCENTILE", 0.95),
+        "budget": env.float("JIRA_HEDGE_BUDGET", 0.05),
+        "min_delay": env.float("JIRA_HEDGE_MIN_DELAY", 0.02),
+        "workers": env.int("JIRA_HEDGE_WORKERS", 20),
+    }
+    if env.bool("JIRA_HEDGING", default=False)
+    else None,
+    # Opt-in: issue lookups arriving within detail_batch_window seconds of
+    # each other (e.g. 0.005) are answered by one search for up to
+    # detail_batch_size issues. 0 sends each lookup on its own.
+    "detail_batch_window": env.float("JIRA_DETAIL_BATCH_WINDOW", 0),
+    "detail_batch_size": env.int("JIRA_DETAIL_BATCH_SIZE", 50),
+    # Per-process keep-alive connection pool shared by all worker threads.
+    # Keep pool_size >= the number of gunicorn threads per worker.
+    "pool_size": env.int("JIRA_POOL_SIZE", 10),
+    "pool_block": env.bool("JIRA_POOL_BLOCK", default=False),
+    "keep_alive": env.bool("JIRA_KEEP_ALIVE", default=True),
+}
+# Used by the async views served under ASGI (config/asgi.py).
+JIRA_ASYNC_SETTINGS = {
+    "base_url": JIRA_SETTINGS["base_url"],
+    "username": JIRA_SETTINGS["username"],
+    "password": JIRA_SETTINGS["password"],
+    "default_project_key": JIRA_SETTINGS["default_project_key"],
+    "issue_cache_ttl": JIRA_SETTINGS["issue_cache_ttl"],
+    "list_cache_ttl": JIRA_SETTINGS["list_cache_ttl"],
+    "list_stale_ttl": JIRA_SETTINGS["list_stale_ttl"],
+    "coalesce_wait": JIRA_SETTINGS["coalesce_wait"],
+    "circuit_breaker": JIRA_SETTINGS["circuit_breaker"],
+    "stale_fallback_ttl": JIRA_SETTINGS["stale_fallback_ttl"],
+    "attachment_cache_dir": JIRA_SETTINGS["attachment_cache_dir"],
+    "attachment_cache_size": JIRA_SETTINGS["attachment_cache_size"],
+    "attachment_delivery": JIRA_SETTINGS["attachment_delivery"],
+    "attachment_url_secret": JIRA_SETTINGS["attachment_url_secret"],
+    "attachment_url_ttl": JIRA_SETTINGS["attachment_url_ttl"],
+    "attachment_upload_workers": JIRA_SETTINGS["attachment_upload_workers"],
+    "rate_limit": JIRA_SETTINGS["rate_limit"],
+    "hedging": JIRA_SETTINGS["hedging"],
+    "detail_batch_window": JIRA_SETTINGS["detail_batch_window"],
+    "detail_batch_size": JIRA_SETTINGS["detail_batch_size"],
+    "pool_size": env.int("JIRA_ASYNC_POOL_SIZE", 100),
+    "keep_alive": JIRA_SETTINGS["keep_alive"],
+    "http2": env.bool("JIRA_HTTP2", default=True),
+}
+# Used by the CRM consumer's client in jira.services.
+JIRA_BASE_URL = JIRA_SETTINGS["base_url"]
+JIRA_ADMIN_USERNAME = JIRA_SETTINGS["username"]
+JIRA_ADMIN_PASSWORD = JIRA_SETTINGS["password"]
+CRM_API_BASE_URL = env("CRM_API_BASE_URL", default="")
+# CRM attachments are streamed into Jira; larger ones are refused.
+CRM_ATTACHMENT_MAX_SIZE = env.int("CRM_ATTACHMENT_MAX_SIZE", 50 * 1024 * 1024)
+# (connect, read) seconds for the CRM download; read is per chunk.
+CRM_ATTACHMENT_TIMEOUT = (5, env.int("CRM_ATTACHMENT_READ_TIMEOUT", 30))
+# Shared secret Jira must send as ?secret=... when calling our webhooks.
+JIRA_WEBHOOK_SECRET = env("JIRA_WEBHOOK_SECRET", default="")
+# Serve the Jira proxy endpoints with the async viewset (requires ASGI).
+TICKETS_ASYNC_VIEWS = env.bool("TICKETS_ASYNC_VIEWS", default=False)
+# Where ticket lists are read from: "jira" runs a JQL search per request,
+# "local" reads the JiraIssue mirror kept by webhooks and sync_jira_issues.
+TICKETS_LIST_SOURCE = env("TICKETS_LIST_SOURCE", default="jira")
+# Seconds one API request may spend on Jira calls in total; later calls get
+# only what is left and fail with 504 once it is spent. 0 disables.
+REQUEST_DEADLINE = env.float("REQUEST_DEADLINE", 10)
+# Requests of each kind one worker process serves at once; more get a 503
+# with Retry-After. Keep each below the worker's threads (or connections
+# under ASGI) so one slow kind cannot take them all. 0 means no limit.
+# GET /tickets/stats/ on the admin host shows a worker's occupancy.
+TICKETS_BULKHEADS = {
+    "search": env.int("TICKETS_BULKHEAD_SEARCH", 8),
+    "detail": env.int("TICKETS_BULKHEAD_DETAIL", 16),
+    "comments": env.int("TICKETS_BULKHEAD_COMMENTS", 8),
+    "writes": env.int("TICKETS_BULKHEAD_WRITES", 8),
+    "attachments": env.int("TICKETS_BULKHEAD_ATTACHMENTS", 4),
 }
+TICKETS_BULKHEAD_RETRY_AFTER = env.int("TICKETS_BULKHEAD_RETRY_AFTER", 1)
+# Most tickets GET /tickets/batch/?ids= returns at once. Jira caps a search
+# page at 100 issues.
+TICKETS_BATCH_MAX_IDS = env.int("TICKETS_BATCH_MAX_IDS", 50)
+# Answer POST /tickets/ with 202 and create the Jira issue in a Celery task;
+# clients poll /tickets/operations/<id>/ for the issue key.
+TICKETS_ASYNC_CREATE = env.bool("TICKETS_ASYNC_CREATE", default=False)
+# Responses to requests with an Idempotency-Key are replayed for this long.
+IDEMPOTENCY_KEY_TTL = env.int("IDEMPOTENCY_KEY_TTL", 86400)
+# How long a retry waits for the same key's in-flight request before a 409;
+# never longer than the request's own deadline.
+IDEMPOTENCY_WAIT = env.int("IDEMPOTENCY_WAIT", 30)
+# Upper bound on one request; a crashed request frees its key after this.
+IDEMPOTENCY_LOCK_TIMEOUT = env.int("IDEMPOTENCY_LOCK_TIMEOUT", 120)
+# Time zone of the Jira user the API logs in as; JQL dates are read in it.
+JIRA_TIMEZONE = env("JIRA_TIMEZONE", default=TIME_ZONE)
+JIRA_SYNC_PAGE_SIZE = env.int("JIRA_SYNC_PAGE_SIZE", 100)
+# Pages per sync_jira_issues run, to stay within the task time limit.
+JIRA_SYNC_MAX_PAGES = env.int("JIRA_SYNC_MAX_PAGES", 20)
+JIRA_SYNC_LOCK_TIMEOUT = CELERY_TASK_TIME_LIMIT
+# CRMTicketCreated events the consumer creates per /issue/bulk request.
+JIRA_BULK_CREATE_SIZE = env.int("JIRA_BULK_CREATE_SIZE", 50)
+# Stored Jira webhook events handled per batch, and batches per task run.
+JIRA_WEBHOOK_BATCH_SIZE = env.int("JIRA_WEBHOOK_BATCH_SIZE", 100)
+JIRA_WEBHOOK_MAX_BATCHES = env.int("JIRA_WEBHOOK_MAX_BATCHES", 20)
+JIRA_WEBHOOK_MAX_ATTEMPTS = env.int("JIRA_WEBHOOK_MAX_ATTEMPTS", 5)
@@ -25,3 +25,5 @@ urlpatterns = i18n_patterns(
     ),
     path("tickets/", include("tickets.urls")),
 )
+# Jira webhooks are not localized; Jira does not follow language redirects.
+urlpatterns += [path("", include("jira.urls"))]
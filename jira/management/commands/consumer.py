@@ -5,6 +5,7 @@ from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
 
 from utils.kafka import create_consumer
+from utils.kafka import create_producer
 from jira.services import jira_service
 
 logger = logging.getLogger(__name__)
@@ -19,6 +20,19 @@ class Command(BaseCommand):
     CALLBACKS = {
         "CRMTicketCreated": lambda body: jira_service.on_crm_ticket_created(**body),
     }
+    # Events created together through one Jira request per batch; each
+    # callback returns the result or the exception for every payload.
+    BATCH_CALLBACKS = {
+        "CRMTicketCreated": jira_service.on_crm_tickets_created,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.JIRA_BULK_CREATE_SIZE,
+            help="Events per bulk Jira request; 1 handles events one by one.",
+        )
 
     def on_message(self, message):
         tp = message.value["type"]
@@ -31,9 +45,49 @@ class Command(BaseCommand):
             body = message.value["payload"]
             callback(body)
 
-    def handle(self, *args, countdown=3, **options):
+    def on_batch(self, messages):
+        failures = []
+        batches = {}
+        for message in messages:
+            tp = message.value["type"]
+            if tp in self.BATCH_CALLBACKS:
+                batches.setdefault(tp, []).append(message)
+                continue
+            try:
+                self.on_message(message)
+            except Exception as e:
+                failures.append((message, e))
+
+        for tp, batch in batches.items():
+            for start in range(0, len(batch), self.batch_size):
+                chunk = batch[start : start + self.batch_size]
+                logger.info("Processing %s %s events", len(chunk), tp)
+                try:
+                    results = self.BATCH_CALLBACKS[tp](
+                        [message.value["payload"] for message in chunk]
+                    )
+                except Exception as e:
+                    failures.extend((message, e) for message in chunk)
+                    continue
+                failures.extend(
+                    (message, result)
+                    for message, result in zip(chunk, results)
+                    if isinstance(result, Exception)
+                )
+        return failures
+
+    def handle(self, *args, countdown=3, batch_size=1, **options):
         bootstrap_servers = settings.KAFKA_URL
         logger.info("Connecting to Kafka...")
         # Create Kafka consumer
-        consumer = create_consumer(bootstrap_servers, "jiraapi", self.TOPICS)
-        consumer.start_consuming(on_message=self.on_message)
+        consumer = create_consumer(
+            bootstrap_servers,
+            "jiraapi",
+            self.TOPICS,
+            dlq_producer=create_producer(bootstrap_servers),
+        )
+        self.batch_size = batch_size
+        if batch_size > 1:
+            consumer.start_consuming(on_batch=self.on_batch)
+        else:
+            consumer.start_consuming(on_message=self.on_message)
@@ -1 +1,81 @@
-# Create your models here.
+from datetime import timedelta
+
+from django.db import models
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from utils.models import BaseModel
+
+
+class JiraWebhookEventManager(models.Manager):
+    def receive(self, event_id, kind, payload):
+        """Stores a delivery; returns False for a redelivery of a stored event."""
+        _, created = self.get_or_create(
+            event_id=event_id, defaults={"kind": kind, "payload": payload}
+        )
+        return created
+
+    def claim(self, limit, stale_after, after=0):
+        """
+        Marks up to `limit` events after id `after` as running and returns
+        them, oldest first. Rows claimed by another worker are skipped;
+        events left running for `stale_after` seconds by a worker that died
+        are claimed again.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            events = list(
+                self.select_for_update(skip_locked=True)
+                .filter(
+                    models.Q(status=self.model.PENDING)
+                    | models.Q(
+                        status=self.model.RUNNING,
+                        updated_at__lt=now - timedelta(seconds=stale_after),
+                    )
+                )
+                .filter(id__gt=after)
+                .order_by("id")[:limit]
+            )
+            self.filter(pk__in=[event.pk for event in events]).update(
+                status=self.model.RUNNING,
+                attempts=models.F("attempts") + 1,
+                updated_at=now,
+            )
+        for event in events:
+            event.status = self.model.RUNNING
+            event.attempts += 1
+        return events
+
+
+class JiraWebhookEvent(BaseModel):
+    """
+    A webhook delivery from Jira, stored as received and processed by the
+    `process_jira_webhooks` task. Jira redelivers slow or failed calls with
+    the same identifier, so `event_id` is unique.
+    """
+
+    event_id = models.CharField(max_length=128, unique=True)
+    COMMENT_CREATED = 1
+    KIND_CHOICES = {COMMENT_CREATED: _("Comment created")}
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    payload = models.JSONField()
+    PENDING = 0
+    RUNNING = 1
+    PROCESSED = 2
+    FAILED = 3
+    STATUS_CHOICES = {
+        PENDING: _("Pending"),
+        RUNNING: _("Running"),
+        PROCESSED: _("Processed"),
+        FAILED: _("Failed"),
+    }
+    status = models.PositiveSmallIntegerField(
+        choices=STATUS_CHOICES, default=PENDING, db_index=True
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    objects = JiraWebhookEventManager()
+
+    def __str__(self):
+        return self.event_id
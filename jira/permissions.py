@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+
+
+class HasWebhookSecret(BasePermission):
+    def has_permission(self, request, view):
+        secret = request.query_params.get("secret", "")
+        return bool(settings.JIRA_WEBHOOK_SECRET) and constant_time_compare(
+            secret, settings.JIRA_WEBHOOK_SECRET
+        )
@@ -5,6 +5,7 @@ from urllib.parse import urljoin
 from io import BytesIO
 import requests
 import json
+import re
 import uuid
 
 from jira.serializers.ticket_serializer import (
@@ -15,6 +16,27 @@ from jira.serializers.ticket_serializer import (
     JiraIssuePrioritySerializer,
 )
 from jira.events import JiraTicketCommentCreated
+from utils.http import MultipartStream
+from utils.http import PooledSession
+from utils.ratelimit import JiraRateLimiter
+
+
+ATTACHMENT_NAME_PATTERNS = [
+    re.compile(r"[^!\n]*!(?P<attachment_name>[^!|]+)\|?[^\!\|]*![^\!\n]*"),
+    re.compile(r"[^\[\]\n]*\[\^(?P<attachment_name>[^\[\]]*)\][^\[\]\n]*"),
+]
+
+
+class AttachmentTooLarge(Exception):
+    """A CRM attachment over `CRM_ATTACHMENT_MAX_SIZE`."""
+
+
+class JiraBulkCreateError(Exception):
+    """One issue of a bulk create that Jira refused."""
+
+    def __init__(self, error):
+        self.error = error
+        super().__init__(json.dumps(error.get("elementErrors") or error))
 
 
 class JiraService:
@@ -23,6 +45,14 @@ class JiraService:
         self.auth = auth or HTTPBasicAuth(
             username=settings.JIRA_ADMIN_USERNAME, password=settings.JIRA_ADMIN_PASSWORD
         )
+        self.pool = PooledSession(
+            auth=self.auth,
+            pool_size=settings.JIRA_SETTINGS["pool_size"],
+            pool_block=settings.JIRA_SETTINGS["pool_block"],
+            keep_alive=settings.JIRA_SETTINGS["keep_alive"],
+            # Shares the panel's Redis buckets, so both stay within one quota.
+            rate_limiter=JiraRateLimiter(**settings.JIRA_SETTINGS["rate_limit"]),
+        )
         self.base_project = (
             JiraIssueProjectSerializer(instance={"key": project_key})
             if project_key
@@ -47,19 +77,21 @@ class JiraService:
             "سرویس جدید",
         ]
 
-    def create_jira_issue(
-        self,
+    @property
+    def session(self):
+        return self.pool.get()
+
+    @staticmethod
+    def issue_update(
         project: JiraIssueProjectSerializer,
         description: str,
         issue_type: JiraIssueTypeSerializer,
         summary: str = None,
         customer_id: str = None,
         panel_id: str = None,
-        priority=JiraIssuePrioritySerializer(data={"name": "Lowest"}),
+        priority=JiraIssuePrioritySerializer(instance={"name": "Lowest"}),
     ):
-        jira_create_issue_url = f"{settings.JIRA_BASE_URL}/rest/api/2/issue"
-        headers = {"Content-Type": "application/json"}
-        data = {
+        return {
             "fields": {
                 "project": project.data,
                 "summary": summary,
@@ -70,39 +102,81 @@ class JiraService:
                 JiraIssueSerializer.customer_id_field: customer_id,
             }
         }
-        issue_creation_response = requests.post(
+
+    def create_jira_issue(self, **kwargs):
+        jira_create_issue_url = f"{settings.JIRA_BASE_URL}/rest/api/2/issue"
+        headers = {"Content-Type": "application/json"}
+        data = self.issue_update(**kwargs)
+        issue_creation_response = self.session.post(
             url=jira_create_issue_url,
             data=json.dumps(data),
-            auth=self.auth,
             headers=headers,
             timeout=30,
-            verify=False,
         )
         issue_creation_response.raise_for_status()
         return issue_creation_response.json()
 
+    def create_jira_issues(self, issues):
+        """
+        Creates several issues in one request. Returns, for each of `issues`,
+        the created issue or the `JiraBulkCreateError` Jira reported for it.
+        """
+        return self.bulk_create([self.issue_update(**issue) for issue in issues])
+
+    def bulk_create(self, issue_updates):
+        """`create_jira_issues` for issue updates that are already built."""
+        jira_bulk_create_url = f"{settings.JIRA_BASE_URL}/rest/api/2/issue/bulk"
+        data = {"issueUpdates": issue_updates}
+        response = self.session.post(
+            url=jira_bulk_create_url,
+            data=json.dumps(data),
+            headers={"Content-Type": "application/json"},
+            timeout=30,
+        )
+        # Jira answers 400 when any issue failed, with the rest created.
+        if response.status_code != 400 or "errors" not in response.json():
+            response.raise_for_status()
+        data = response.json()
+        failed = {
+            error["failedElementNumber"]: error for error in data.get("errors", [])
+        }
+        # Created issues are listed in request order, without the failed ones.
+        created = iter(data.get("issues", []))
+        return [
+            JiraBulkCreateError(failed[i]) if i in failed else next(created)
+            for i in range(len(issue_updates))
+        ]
+
     def add_attachment(self, issue_key, file: BytesIO, file_name: str):
         jira_add_attachment_url = (
             f"{settings.JIRA_BASE_URL}/rest/api/2/issue/{issue_key}/attachments"
         )
         headers = {"X-Atlassian-Token": "nocheck"}
         files = {"file": (file_name, file)}
-        add_attachment_response = requests.post(
+        add_attachment_response = self.session.post(
             url=jira_add_attachment_url,
             files=files,
             headers=headers,
-            auth=self.auth,
             timeout=50,
-            verify=False,
         )
         add_attachment_response.raise_for_status()
         return add_attachment_response.json()
 
+    def stream_attachment(self, issue_key, chunks, file_name, size=None):
+        """Like `add_attachment`, but sends `chunks` as they are produced."""
+        body = MultipartStream("file", file_name, chunks, size=size)
+        response = self.session.post(
+            url=f"{settings.JIRA_BASE_URL}/rest/api/2/issue/{issue_key}/attachments",
+            data=body,
+            headers={"X-Atlassian-Token": "nocheck", "Content-Type": body.content_type},
+            timeout=50,
+        )
+        response.raise_for_status()
+        return response.json()
+
     def fetch_tickets(self, jql_filters=""):
         jira_search_url = f"{settings.JIRA_BASE_URL}/rest/api/2/search/?{jql_filters}"
-        response = requests.get(
-            jira_search_url, auth=self.auth, timeout=15, verify=False
-        )
+        response = self.session.get(jira_search_url, timeout=15)
         response.raise_for_status()
         return response.json()
 
@@ -116,19 +190,17 @@ class JiraService:
         )
         if fields:
             jira_detail_search_url += f"?fields={','.join(fields)}"
-        response = requests.get(
-            jira_detail_search_url, auth=self.auth, timeout=15, verify=False
-        )
+        response = self.session.get(jira_detail_search_url, timeout=15)
         response.raise_for_status()
         return response.json()
 
     def fetch_user_tickets(self, user_id):
         return self.fetch_tickets(jql_filters=f'jql=customer_id ~ "{user_id}"')
 
-    def on_crm_ticket_created(self, **data):
+    def crm_issue(self, data):
         user = data["user"]
-        data.pop("crm_id", None)
-        request_type = data.pop("request_type", None)
+        # Left intact: a payload that fails is sent to the DLQ as received.
+        request_type = data.get("request_type")
         issue_type = JiraIssueTypeSerializer(data={"name": request_type})
         if not issue_type.is_valid():
             issue_type = self.base_issue_type
@@ -142,25 +214,135 @@ class JiraService:
             "panel_id": data["id"],
             "customer_id": user,
         }
-        jira_issue_data = dict(
-            filter(lambda item: item[1] is not None, jira_issue_data.items())
-        )
-        created_ticket_data = self.create_jira_issue(**jira_issue_data)
-        if attachment_download_link := data.pop("attachment_download_link", None):
+        return dict(filter(lambda item: item[1] is not None, jira_issue_data.items()))
+
+    def on_crm_ticket_created(self, **data):
+        created_ticket_data = self.create_jira_issue(**self.crm_issue(data))
+        return self.add_crm_attachment(created_ticket_data, data)
+
+    def on_crm_tickets_created(self, payloads):
+        """
+        Bulk counterpart of `on_crm_ticket_created`. Returns the created issue
+        or the exception raised for each payload.
+
+        A payload that cannot be turned into an issue fails on its own, and
+        once the issues exist an attachment failure only fails its payload.
+        """
+        results = [None] * len(payloads)
+        issue_updates = {}
+        for i, data in enumerate(payloads):
+            try:
+                issue_updates[i] = self.issue_update(**self.crm_issue(data))
+            except Exception as e:
+                results[i] = e
+        if issue_updates:
+            created = self.bulk_create(list(issue_updates.values()))
+            for i, created_ticket_data in zip(issue_updates, created):
+                results[i] = created_ticket_data
+        for i, (created_ticket_data, data) in enumerate(zip(results, payloads)):
+            if isinstance(created_ticket_data, Exception):
+                continue
+            try:
+                self.add_crm_attachment(created_ticket_data, data)
+            except Exception as e:
+                results[i] = e
+        return results
+
+    def add_crm_attachment(self, created_ticket_data, data):
+        if attachment_download_link := data.get("attachment_download_link"):
             attachment_download_link = urljoin(
                 settings.CRM_API_BASE_URL, attachment_download_link
             )
-            response = requests.get(url=attachment_download_link)
-            response.raise_for_status()
-            file_name = response.headers["filename"]
-            self.add_attachment(
-                issue_key=created_ticket_data["key"],
-                file=BytesIO(response.content),
-                file_name=file_name,
-            )
+            # The download is read only as fast as Jira takes the upload.
+            with requests.get(
+                url=attachment_download_link,
+                stream=True,
+                timeout=settings.CRM_ATTACHMENT_TIMEOUT,
+            ) as response:
+                response.raise_for_status()
+                self.stream_attachment(
+                    issue_key=created_ticket_data["key"],
+                    chunks=self.crm_attachment_chunks(response),
+                    file_name=response.headers["filename"],
+                    size=self.crm_attachment_size(response),
+                )
             return created_ticket_data
         return created_ticket_data
 
+    @staticmethod
+    def crm_attachment_size(response):
+        if "Content-Encoding" in response.headers:
+            # The length is of the encoded body, not of the file.
+            return None
+        size = response.headers.get("Content-Length")
+        if size is None:
+            return None
+        if int(size) > settings.CRM_ATTACHMENT_MAX_SIZE:
+            raise AttachmentTooLarge(f"{size} bytes")
+        return int(size)
+
+    @staticmethod
+    def crm_attachment_chunks(response):
+        received = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            received += len(chunk)
+            # Bodies without a Content-Length are only checked as they arrive.
+            if received > settings.CRM_ATTACHMENT_MAX_SIZE:
+                raise AttachmentTooLarge(f"over {received} bytes")
+            yield chunk
+
+    @staticmethod
+    def comment_attachments(comment_text, ticket_data):
+        """The issue attachments a comment embeds (!name!) or links ([^name])."""
+        attachment_names = {
+            match.group("attachment_name")
+            for pattern in ATTACHMENT_NAME_PATTERNS
+            for match in pattern.finditer(comment_text)
+        }
+        if not attachment_names:
+            return []
+        return [
+            {
+                "name": attachment["file_name"],
+                "author_email": attachment["author"]["emailAddress"],
+                "download-link": attachment["content"],
+            }
+            for attachment in ticket_data.get("attachment", [])
+            if attachment.get("file_name") in attachment_names
+        ]
+
+    def on_comments_created(self, comments):
+        """
+        Publishes comments received by the comment webhook as panel
+        follow-ups. Each issue is fetched once however many of its comments
+        are in the batch. Returns `(ticket_data, followup)` or the exception
+        raised for each comment.
+        """
+        tickets = {}
+        results = []
+        for comment_data in comments:
+            issue_id = comment_data["issueId"]
+            try:
+                if issue_id not in tickets:
+                    ticket_serializer = JiraIssueSerializer(
+                        data=self.fetch_ticket_detail(issue_id)
+                    )
+                    ticket_serializer.is_valid(raise_exception=True)
+                    tickets[issue_id] = ticket_serializer.validated_data
+                ticket_data = tickets[issue_id]
+                followup = self.add_comment_created(
+                    **comment_data,
+                    ticket_id=ticket_data["panel_id"],
+                    attachments_data=self.comment_attachments(
+                        comment_data["body"], ticket_data
+                    ),
+                )
+            except Exception as e:
+                results.append(e)
+            else:
+                results.append((ticket_data, followup))
+        return results
+
     def add_comment_created(self, **data):
         comment_serializer = JiraIssueCommentSerializer(data=data)
         comment_serializer.is_valid(raise_exception=True)
@@ -0,0 +1,65 @@
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from config import celery_app
+from jira.models import JiraWebhookEvent
+from jira.services import jira_service
+from utils.jira import jira_service as panel_jira_service
+
+logger = logging.getLogger(__name__)
+
+# Retrying these cannot help: the payload or the issue is malformed.
+PERMANENT_ERRORS = (ValidationError, KeyError)
+
+
+def process_comment_events(events):
+    results = jira_service.on_comments_created([event.payload for event in events])
+    customer_ids = set()
+    now = timezone.now()
+    for event, result in zip(events, results):
+        event.updated_at = now
+        if isinstance(result, Exception):
+            logger.warning("Jira webhook event %s failed: %r", event.event_id, result)
+            event.error = repr(result)
+            gave_up = event.attempts >= settings.JIRA_WEBHOOK_MAX_ATTEMPTS
+            if gave_up or isinstance(result, PERMANENT_ERRORS):
+                event.status = JiraWebhookEvent.FAILED
+            else:
+                event.status = JiraWebhookEvent.PENDING
+            continue
+        ticket_data, _ = result
+        customer_ids.add(ticket_data.get("customer_id"))
+        event.status = JiraWebhookEvent.PROCESSED
+        event.error = ""
+    JiraWebhookEvent.objects.bulk_update(events, ["status", "error", "updated_at"])
+
+    for issue_id in {event.payload.get("issueId") for event in events}:
+        panel_jira_service.invalidate_ticket(issue_id)
+    for customer_id in customer_ids:
+        panel_jira_service.invalidate_ticket_lists(customer_id)
+
+
+@celery_app.task()
+def process_jira_webhooks():
+    """
+    Processes stored webhook events in batches. Several workers can run this
+    at once; each claims different rows. Failed events are picked up again
+    by the next run until they run out of attempts.
+    """
+    processed = last_id = 0
+    for _ in range(settings.JIRA_WEBHOOK_MAX_BATCHES):
+        # Moving past the last batch keeps a run from retrying its own failures.
+        events = JiraWebhookEvent.objects.claim(
+            settings.JIRA_WEBHOOK_BATCH_SIZE,
+            stale_after=settings.CELERY_TASK_TIME_LIMIT,
+            after=last_id,
+        )
+        if not events:
+            break
+        process_comment_events(events)
+        processed += len(events)
+        last_id = events[-1].id
+    return processed
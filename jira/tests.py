@@ -1 +1,274 @@
-# Create your tests here.
+import json
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import requests
+
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from jira.management.commands.consumer import Command
+from jira.models import JiraWebhookEvent
+from jira.services import jira_service
+from jira.serializers.ticket_serializer import JiraIssueSerializer
+from jira.services.jira import AttachmentTooLarge
+from jira.services.jira import JiraBulkCreateError
+from jira.tasks import process_jira_webhooks
+from tickets.models import JiraIssue
+from tickets.tests.factories import JiraIssueDataFactory
+from users.factories import UserFactory
+
+
+@override_settings(JIRA_WEBHOOK_SECRET="s3cret")
+class IssueUpdateWebhookTests(APITestCase):
+    url = reverse("issue_update_webhook")
+
+    def test_wrong_secret(self):
+        response = self.client.post(f"{self.url}?secret=nope", {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @patch("jira.views.panel_jira_service.invalidate_ticket")
+    def test_invalidates_ticket(self, invalidate_ticket):
+        data = {"webhookEvent": "jira:issue_updated", "issue": {"id": "10001"}}
+        response = self.client.post(f"{self.url}?secret=s3cret", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        invalidate_ticket.assert_called_once_with("10001")
+
+    def test_mirrors_issue(self):
+        issue = JiraIssueDataFactory()
+        data = {"webhookEvent": "jira:issue_updated", "issue": issue}
+        self.client.post(f"{self.url}?secret=s3cret", data, format="json")
+        self.assertEqual(JiraIssue.objects.get().data, issue)
+
+        data["webhookEvent"] = "jira:issue_deleted"
+        self.client.post(f"{self.url}?secret=s3cret", data, format="json")
+        self.assertFalse(JiraIssue.objects.exists())
+
+
+def crm_message(panel_id, **payload):
+    payload = {"id": panel_id, "user": "1", "description": "d", **payload}
+    return MagicMock(value={"type": "CRMTicketCreated", "payload": payload})
+
+
+class CRMTicketBatchTests(SimpleTestCase):
+    @patch("jira.services.jira.PooledSession.get")
+    def test_bulk_results_map_back_to_payloads(self, get_session):
+        response = MagicMock(status_code=400)
+        response.json.return_value = {
+            "issues": [{"id": "1", "key": "TPP-1"}, {"id": "3", "key": "TPP-3"}],
+            "errors": [{"failedElementNumber": 1, "elementErrors": {"errors": {}}}],
+        }
+        get_session.return_value.post.return_value = response
+
+        payloads = [crm_message(panel_id).value["payload"] for panel_id in "abc"]
+        results = jira_service.create_jira_issues(
+            [jira_service.crm_issue(payload) for payload in payloads]
+        )
+
+        self.assertEqual(results[0]["key"], "TPP-1")
+        self.assertIsInstance(results[1], JiraBulkCreateError)
+        self.assertEqual(results[2]["key"], "TPP-3")
+        url = get_session.return_value.post.call_args.kwargs["url"]
+        self.assertTrue(url.endswith("/rest/api/2/issue/bulk"))
+
+    @patch("jira.services.jira.PooledSession.get")
+    def test_invalid_payload_fails_alone(self, get_session):
+        response = MagicMock(status_code=201)
+        response.json.return_value = {
+            "issues": [{"id": "1", "key": "TPP-1"}, {"id": "3", "key": "TPP-3"}],
+        }
+        get_session.return_value.post.return_value = response
+        payloads = [crm_message(panel_id).value["payload"] for panel_id in "abc"]
+        del payloads[1]["user"]
+
+        results = jira_service.on_crm_tickets_created(payloads)
+
+        self.assertEqual(results[0]["key"], "TPP-1")
+        self.assertIsInstance(results[1], KeyError)
+        self.assertEqual(results[2]["key"], "TPP-3")
+        data = get_session.return_value.post.call_args.kwargs["data"]
+        self.assertEqual(len(json.loads(data)["issueUpdates"]), 2)
+
+    @patch("jira.services.jira.JiraService.add_crm_attachment")
+    @patch("jira.services.jira.PooledSession.get")
+    def test_attachment_failure_fails_alone(self, get_session, add_crm_attachment):
+        response = MagicMock(status_code=201)
+        response.json.return_value = {
+            "issues": [{"id": "1", "key": "TPP-1"}, {"id": "2", "key": "TPP-2"}],
+        }
+        get_session.return_value.post.return_value = response
+        add_crm_attachment.side_effect = [KeyError("filename"), {"key": "TPP-2"}]
+        payloads = [crm_message(panel_id).value["payload"] for panel_id in "ab"]
+
+        results = jira_service.on_crm_tickets_created(payloads)
+
+        self.assertIsInstance(results[0], KeyError)
+        self.assertEqual(results[1]["key"], "TPP-2")
+
+    @patch("jira.management.commands.consumer.jira_service.on_crm_ticket_created")
+    @patch.dict(
+        Command.BATCH_CALLBACKS,
+        {"CRMTicketCreated": lambda payloads: [{"key": "TPP-1"}, ValueError()]},
+    )
+    def test_consumer_reports_failures_per_message(self, on_crm_ticket_created):
+        command = Command()
+        command.batch_size = 2
+        ok, failed = crm_message("a"), crm_message("b")
+        other = MagicMock(value={"type": "UserCreated", "payload": {}})
+
+        failures = command.on_batch([ok, other, failed])
+
+        self.assertEqual([message for message, _ in failures], [failed])
+        on_crm_ticket_created.assert_not_called()
+
+
+def crm_download(chunks, **headers):
+    response = MagicMock(headers={"filename": "a.txt", **headers})
+    response.__enter__.return_value = response
+    response.iter_content.return_value = iter(chunks)
+    return response
+
+
+@patch("jira.services.jira.PooledSession.get")
+@patch("jira.services.jira.requests.get")
+class CRMAttachmentStreamTests(SimpleTestCase):
+    def upload(self, get_session):
+        sent = {}
+
+        def post(url, data, headers, timeout):
+            prepared = requests.Request(
+                "POST", "https://jira.example.com/", data=data, headers=headers
+            )
+            sent["request"] = prepared.prepare()
+            sent["body"] = b"".join(data)
+            return MagicMock()
+
+        get_session.return_value.post.side_effect = post
+        jira_service.add_crm_attachment(
+            {"key": "TPP-1"}, {"attachment_download_link": "/files/1"}
+        )
+        return sent["request"], sent["body"]
+
+    def test_streams_download_into_upload(self, get, get_session):
+        get.return_value = crm_download([b"ab", b"cd"], **{"Content-Length": "4"})
+        request, body = self.upload(get_session)
+
+        self.assertTrue(get.call_args.kwargs["stream"])
+        self.assertIn(b'filename="a.txt"', body)
+        self.assertIn(b"\r\n\r\nabcd\r\n", body)
+        self.assertEqual(request.headers["Content-Length"], str(len(body)))
+
+    def test_unknown_size_is_chunked(self, get, get_session):
+        get.return_value = crm_download([b"ab"])
+        request, _ = self.upload(get_session)
+        self.assertEqual(request.headers["Transfer-Encoding"], "chunked")
+
+    @override_settings(CRM_ATTACHMENT_MAX_SIZE=3)
+    def test_size_limit(self, get, get_session):
+        get.return_value = crm_download([b"ab", b"cd"], **{"Content-Length": "4"})
+        with self.assertRaises(AttachmentTooLarge):
+            self.upload(get_session)
+
+        get.return_value = crm_download([b"ab", b"cd"])
+        with self.assertRaises(AttachmentTooLarge):
+            self.upload(get_session)
+
+
+@override_settings(JIRA_WEBHOOK_SECRET="s3cret")
+class CommentWebhookTests(APITestCase):
+    url = reverse("comment_creation_webhook")
+
+    @patch("jira.views.process_jira_webhooks.delay")
+    def test_redelivery_is_stored_once(self, delay):
+        data = {"issueId": "10001", "body": "hi"}
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    f"{self.url}?secret=s3cret",
+                    data,
+                    format="json",
+                    HTTP_X_ATLASSIAN_WEBHOOK_IDENTIFIER="42",
+                )
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        event = JiraWebhookEvent.objects.get()
+        self.assertEqual(event.event_id, "42")
+        self.assertEqual(event.payload, data)
+        delay.assert_called_once()
+
+
+def jira_issue(panel_id):
+    issue = {
+        field: {}
+        for field in ("project", "creator", "assignee", "status", "issuetype")
+    }
+    attachment = {"author": {"emailAddress": "a@example.com"}, "content": "url"}
+    return {
+        **issue,
+        "priority": {},
+        "customfield_10200": "7",
+        "customfield_10201": panel_id,
+        "attachment": [{**attachment, "file_name": "a.png"}],
+    }
+
+
+@patch("jira.tasks.panel_jira_service")
+@patch.object(jira_service.event_store, "add_event")
+@patch.object(jira_service, "fetch_ticket_detail", side_effect=jira_issue)
+class ProcessJiraWebhooksTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(email="a@example.com")
+
+    def receive(self, event_id, body, issue_id="p1"):
+        author = {"emailAddress": "a@example.com"}
+        JiraWebhookEvent.objects.receive(
+            event_id,
+            JiraWebhookEvent.COMMENT_CREATED,
+            {"issueId": issue_id, "body": body, "author": author},
+        )
+
+    def test_batch_fetches_each_issue_once(self, fetch, add_event, panel):
+        self.receive("1", "see !a.png!")
+        self.receive("2", "thanks")
+        self.receive("3", "other issue", issue_id="p2")
+
+        self.assertEqual(process_jira_webhooks(), 3)
+
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(
+            set(JiraWebhookEvent.objects.values_list("status", flat=True)),
+            {JiraWebhookEvent.PROCESSED},
+        )
+        followup = add_event.call_args_list[0].args[0]
+        self.assertEqual(followup.data["ticket"], "p1")
+        panel.invalidate_ticket_lists.assert_called_once_with("7")
+
+    def test_comment_attachments(self, *mocks):
+        ticket = JiraIssueSerializer(data=jira_issue("p1"))
+        ticket.is_valid(raise_exception=True)
+        for body, names in (("see !a.png|thumbnail!", ["a.png"]), ("[^b.png]", [])):
+            attachments = jira_service.comment_attachments(body, ticket.validated_data)
+            self.assertEqual([a["name"] for a in attachments], names)
+
+    @override_settings(JIRA_WEBHOOK_MAX_ATTEMPTS=2)
+    def test_failures_are_retried_until_attempts_run_out(
+        self, fetch, add_event, panel
+    ):
+        self.receive("1", "hi")
+        fetch.side_effect = ConnectionError("reset")
+
+        process_jira_webhooks()
+        event = JiraWebhookEvent.objects.get()
+        self.assertEqual(event.status, JiraWebhookEvent.PENDING)
+
+        process_jira_webhooks()
+        event.refresh_from_db()
+        self.assertEqual(event.status, JiraWebhookEvent.FAILED)
+        self.assertEqual(event.attempts, 2)
+        self.assertIn("reset", event.error)
+        add_event.assert_not_called()
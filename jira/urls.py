@@ -7,4 +7,9 @@ urlpatterns = [
         JiraTicketUpdateHook.as_view({"post": "comment_created"}),
         name="comment_creation_webhook",
     ),
+    path(
+        "tickets/issue_update_webhook",
+        JiraTicketUpdateHook.as_view({"post": "issue_updated"}),
+        name="issue_update_webhook",
+    ),
 ]
@@ -1,47 +1,59 @@
+import hashlib
+import json
+import logging
+
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
-import re
-from jira.serializers.ticket_serializer import (
-    JiraIssueAttachmentSerializer,
-    JiraIssueSerializer,
-)
-from jira.services import jira_service
-from loguru import logger
+
+from jira.models import JiraWebhookEvent
+from jira.permissions import HasWebhookSecret
+from jira.tasks import process_jira_webhooks
+from tickets.models import JiraIssue
+from utils.jira import jira_service as panel_jira_service
+
+logger = logging.getLogger(__name__)
+
+
+def get_issue_id(data):
+    return data.get("issueId") or data.get("issue", {}).get("id")
+
+
+def get_customer_id(data):
+    return data.get("issue", {}).get("fields", {}).get("customfield_10200")
+
+
+def get_event_id(request):
+    # Jira sends the same identifier when it redelivers a webhook.
+    if event_id := request.headers.get("X-Atlassian-Webhook-Identifier"):
+        return event_id
+    body = json.dumps(request.data, sort_keys=True)
+    return hashlib.sha256(body.encode()).hexdigest()
 
 
 class JiraTicketUpdateHook(ViewSet):
-    # permission_classes = [IsAuthenticated]
+    authentication_classes = []
+    permission_classes = [HasWebhookSecret]
+
+    def issue_updated(self, request):
+        if issue_id := get_issue_id(request.data):
+            panel_jira_service.invalidate_ticket(issue_id)
+        if request.data.get("webhookEvent") == "jira:issue_deleted":
+            JiraIssue.objects.filter(id=issue_id).delete()
+        elif "fields" in request.data.get("issue", {}):
+            JiraIssue.objects.upsert([request.data["issue"]])
+        panel_jira_service.invalidate_ticket_lists(get_customer_id(request.data))
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     def comment_created(self, request):
-        logger.info(f"{request.data=}")
-        comment_data = request.data
-        comment_text = comment_data["body"]
-        attachment_regex_patterns = [
-            r"[^!\n]*!(?P<attachment_name>[^!|]+)\|?[^\!\|]*![^\!\n]*",
-            r"[^\[\]\n]*\[\^(?P<attachment_name>[^\[\]]*)\][^\[\]\n]*",
-        ]
-        attachment_names = []
-        attachments_data = []
-        for attachment_pattern in attachment_regex_patterns:
-            for match in re.finditer(pattern=attachment_pattern, string=comment_text):
-                attachment_names.append(match.group("attachment_name"))
-        ticket_data = jira_service.fetch_ticket_detail(request.data["issueId"])
-        ticket_serializer = JiraIssueSerializer(data=ticket_data)
-        ticket_serializer.is_valid(raise_exception=True)
-        for attachment in JiraIssueAttachmentSerializer(
-            instance=ticket_serializer.validated_data["attachments"], many=True
-        ):
-            attachment_data = attachment.validated_data
-            if attachment_data["filename"] in attachment_names:
-                attachments_data.append(
-                    {
-                        "name": attachment_data["filename"],
-                        "author_email": attachment_data["author"]["emailAddress"],
-                        "download-link": attachment_data["content"],
-                    }
-                )
-
-        ticket_panel_id = ticket_serializer.validated_data["panel_id"]
-        comment_data["ticket_id"] = ticket_panel_id
-        comment_data["attachments_data"] = attachments_data
-        jira_service.add_comment_created(comment_data)
-        return comment_data
+        """
+        Stores the comment and answers at once, so Jira does not time out and
+        redeliver; `process_jira_webhooks` publishes it as a follow-up.
+        """
+        created = JiraWebhookEvent.objects.receive(
+            get_event_id(request), JiraWebhookEvent.COMMENT_CREATED, request.data
+        )
+        if created:
+            transaction.on_commit(process_jira_webhooks.delay)
+        return Response(status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,64 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from tickets.services import JiraBackfill
+from utils.jira import jira_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies legacy tickets, follow-ups and attachments into Jira. Rows "
+        "already copied are skipped, so an interrupted run can simply be "
+        "started again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=8, help="Tickets copied concurrently."
+        )
+        parser.add_argument("--limit", type=int, default=None)
+        parser.add_argument(
+            "--report-every",
+            type=int,
+            default=100,
+            help="Print progress after this many tickets.",
+        )
+
+    def handle(self, *args, workers, limit, report_every, **options):
+        backfill = JiraBackfill(jira_service, workers=workers)
+        ticket_ids = list(backfill.pending()[:limit])
+        self.stdout.write(f"{len(ticket_ids)} tickets to copy")
+
+        copied = Counter()
+        failed = 0
+        started = interval_started = time.perf_counter()
+        for done, (ticket_id, result) in enumerate(backfill.run(ticket_ids), 1):
+            if isinstance(result, Exception):
+                failed += 1
+                self.stderr.write(f"Ticket {ticket_id}: {result!r}")
+            else:
+                copied.update(result)
+            if done % report_every == 0:
+                now = time.perf_counter()
+                self.stdout.write(
+                    f"{done}/{len(ticket_ids)} tickets, "
+                    f"{report_every / (now - interval_started):.1f}/s, "
+                    f"{failed} failed"
+                )
+                interval_started = now
+
+        elapsed = time.perf_counter() - started
+        rate = len(ticket_ids) / elapsed if elapsed else 0
+        summary = (
+            f"Copied {copied['issues']} issues, {copied['comments']} comments and "
+            f"{copied['attachments']} attachments in {elapsed:.1f}s "
+            f"({rate:.1f} tickets/s)"
+        )
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(f"{summary}; {failed} tickets failed, run again")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
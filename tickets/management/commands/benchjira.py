@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from utils.jira import AsyncJiraService
+from utils.jira import JiraService
+
+
+STUB_BODY = json.dumps(
+    {
+        "id": "10000",
+        "key": "TPP-1",
+        "fields": {"customfield_10200": "1", "summary": "stub"},
+    }
+).encode()
+
+
+async def serve_stub_connection(reader, writer, latency):
+    # Minimal keep-alive HTTP/1.1 responder; the benchmark only sends GETs.
+    try:
+        while await reader.readuntil(b"\r\n\r\n"):
+            await asyncio.sleep(latency)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/json\r\n"
+                + f"Content-Length: {len(STUB_BODY)}\r\n\r\n".encode()
+                + STUB_BODY
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def run_stub(port_queue, latency):
+    async def main():
+        server = await asyncio.start_server(
+            lambda r, w: serve_stub_connection(r, w, latency),
+            "127.0.0.1",
+            0,
+            backlog=1024,
+        )
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(0, math.ceil(p * len(values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the sync (WSGI) and async (ASGI) Jira clients against a local "
+        "Jira stub."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--latency", type=float, default=0.1, help="Stub latency in seconds."
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="Concurrent requests of the sync path (gunicorn workers x threads).",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=200,
+            help="In-flight requests of the async path (one uvicorn worker).",
+        )
+
+    def handle(self, *args, **options):
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        # The stub runs in its own process so it does not compete with the
+        # clients under test for the GIL.
+        port_queue = multiprocessing.Queue()
+        stub = multiprocessing.Process(
+            target=run_stub, args=(port_queue, options["latency"]), daemon=True
+        )
+        stub.start()
+        base_url = f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+        try:
+            results = [
+                ("wsgi", *self.bench_sync(base_url, **options)),
+                ("asgi", *self.bench_async(base_url, **options)),
+            ]
+        finally:
+            stub.terminate()
+
+        self.stdout.write(
+            f"{'path':<6}{'in-flight':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        for name, concurrency, elapsed, latencies in results:
+            self.stdout.write(
+                f"{name:<6}{concurrency:>10}"
+                f"{len(latencies) / elapsed:>10.1f}"
+                f"{percentile(latencies, 0.5) * 1000:>10.1f}"
+                f"{percentile(latencies, 0.99) * 1000:>10.1f}"
+            )
+
+    def bench_sync(self, base_url, requests, threads, **options):
+        service = JiraService(
+            base_url=base_url, pool_size=threads, issue_cache_ttl=0
+        )
+        latencies = []
+
+        def call(submitted_at):
+            service.fetch_ticket_detail(ticket_id=1)
+            latencies.append(time.perf_counter() - submitted_at)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for _ in range(requests):
+                executor.submit(call, time.perf_counter())
+        elapsed = time.perf_counter() - started
+        service.pool.close()
+        return threads, elapsed, latencies
+
+    def bench_async(self, base_url, requests, concurrency, **options):
+        service = AsyncJiraService(
+            base_url=base_url, pool_size=concurrency, issue_cache_ttl=0
+        )
+        latencies = []
+
+        async def call(semaphore, submitted_at):
+            async with semaphore:
+                await service.fetch_ticket_detail(ticket_id=1)
+            latencies.append(time.perf_counter() - submitted_at)
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(call(semaphore, time.perf_counter()) for _ in range(requests))
+            )
+            elapsed = time.perf_counter() - started
+            await service.aclose()
+            return elapsed
+
+        elapsed = asyncio.run(run())
+        return concurrency, elapsed, latencies
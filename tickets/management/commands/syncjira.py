@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import localtime
+
+from tickets.models import JiraSyncCursor
+from tickets.services import JiraIssueSync
+from utils.jira import jira_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Pulls issues changed since the last run from Jira into the local "
+        "mirror. Interrupted runs resume from the saved cursor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cursor",
+            default="full",
+            help="Name of the saved position; separate names sync independently.",
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=100,
+            help="Issues per search; Jira returns at most 100.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Rows per upsert statement."
+        )
+        parser.add_argument("--max-pages", type=int, default=None)
+        parser.add_argument(
+            "--reset", action="store_true", help="Start over from the oldest issue."
+        )
+
+    def handle(self, *args, cursor, reset, **options):
+        if reset:
+            JiraSyncCursor.objects.filter(name=cursor).delete()
+        sync = JiraIssueSync(
+            jira_service,
+            cursor,
+            page_size=options["page_size"],
+            batch_size=options["batch_size"],
+        )
+
+        synced = 0
+        started = page_started = time.perf_counter()
+        for count in sync.pages(max_pages=options["max_pages"]):
+            now = time.perf_counter()
+            synced += count
+            position = JiraSyncCursor.objects.get(name=cursor)
+            self.stdout.write(
+                f"{synced} issues, {count / (now - page_started):.0f}/s "
+                f"(up to {localtime(position.checkpoint):%Y-%m-%d %H:%M})"
+            )
+            page_started = now
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Synced {synced} issues in {elapsed:.1f}s "
+                f"({synced / elapsed if elapsed else 0:.0f} issues/s)"
+            )
+        )
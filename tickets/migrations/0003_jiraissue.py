@@ -0,0 +1,43 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0002_ticket_ref_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JiraSyncCursor',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('checkpoint', models.DateTimeField(null=True)),
+                ('offset', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JiraIssue',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('key', models.CharField(db_index=True, max_length=32)),
+                ('project', models.CharField(max_length=32)),
+                ('customer_id', models.CharField(max_length=64, null=True)),
+                ('summary', models.CharField(blank=True, max_length=256)),
+                ('status', models.CharField(blank=True, max_length=64)),
+                ('priority', models.CharField(blank=True, max_length=64)),
+                ('issue_type', models.CharField(blank=True, max_length=64)),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('data', models.JSONField()),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created'],
+                'indexes': [models.Index(fields=['customer_id', '-created'], name='tickets_jir_custome_474798_idx'), models.Index(fields=['customer_id', '-updated'], name='tickets_jir_custome_33be15_idx'), models.Index(fields=['-updated'], name='tickets_jir_updated_489954_idx')],
+            },
+        ),
+    ]
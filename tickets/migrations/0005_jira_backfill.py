@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_ticketoperation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='jira_attachment_id',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='followup',
+            name='jira_comment_id',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='jira_issue_id',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -1,6 +1,9 @@
+import uuid
+
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.db import transaction
+from django.utils.dateparse import parse_datetime
 from django.utils.translation import gettext_lazy as _
 
 from utils.models import BaseModel
@@ -20,6 +23,8 @@ class Attachment(BaseModel):
         editable=False,
     )
     file = models.FileField(upload_to=upload_attachment)
+    # Set once `backfilljira` has uploaded the file to Jira.
+    jira_attachment_id = models.CharField(max_length=32, blank=True)
 
 
 class TicketManager(models.Manager):
@@ -94,6 +99,8 @@ class Ticket(BaseModel):
     CLOSED = 1
     STATUS_CHOICES = {OPEN: _("Open"), CLOSED: _("Closed")}
     status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=OPEN)
+    # Set once `backfilljira` has created the ticket's Jira issue.
+    jira_issue_id = models.CharField(max_length=32, blank=True)
     objects = TicketManager()
 
     class Meta:
@@ -142,7 +149,207 @@ class FollowUp(BaseModel):
     )
     description = models.TextField()
     attachments = models.ManyToManyField(Attachment)
+    # Set once `backfilljira` has posted the follow-up as a Jira comment.
+    jira_comment_id = models.CharField(max_length=32, blank=True)
     objects = FollowUpManager()
 
     class Meta:
         ordering = ["created_at"]
+
+
+class JiraIssueManager(models.Manager):
+    # JQL ORDER BY fields the ticket list accepts, and their columns.
+    ORDERINGS = {
+        "created": "created",
+        "updated": "updated",
+        "priority": "priority",
+        "status": "status",
+        "key": "id",
+    }
+
+    def order_by_jql(self, ordering):
+        field, _, direction = (ordering or "").strip().partition(" ")
+        column = self.ORDERINGS.get(field.lower(), "created")
+        if direction.strip().upper() != "ASC":
+            column = f"-{column}"
+        return [column, "-id"] if column.lstrip("-") != "id" else [column]
+
+    def upsert(self, issues, batch_size=None):
+        instances = [self.model.from_jira(issue) for issue in issues]
+        return self.bulk_create(
+            instances,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=[
+                field.name
+                for field in self.model._meta.concrete_fields
+                if not field.primary_key
+            ],
+        )
+
+    def filter_search(
+        self, customer_id=None, ticket_id=None, ordering=None, project="TPP"
+    ):
+        # Webhooks mirror issues of every project; the JQL search reads one.
+        queryset = self.filter(project=project)
+        if customer_id:
+            queryset = queryset.filter(customer_id=customer_id)
+        if ticket_id:
+            ticket_id = str(ticket_id)
+            if ticket_id.isdigit():
+                queryset = queryset.filter(id=ticket_id)
+            else:
+                queryset = queryset.filter(key=ticket_id.upper())
+        return queryset.order_by(*self.order_by_jql(ordering))
+
+    @staticmethod
+    def search_response(issues, total, start, page_size):
+        return {
+            "startAt": start,
+            "maxResults": page_size,
+            "total": total,
+            "issues": issues,
+        }
+
+    def search(self, page=None, page_size=None, **kwargs):
+        """Returns a page in the shape of a Jira search response."""
+        page_size = page_size or 10
+        start = ((page or 1) - 1) * page_size
+        queryset = self.filter_search(**kwargs)
+        issues = list(queryset.values_list("data", flat=True)[start : start + page_size])
+        return self.search_response(issues, queryset.count(), start, page_size)
+
+    async def asearch(self, page=None, page_size=None, **kwargs):
+        page_size = page_size or 10
+        start = ((page or 1) - 1) * page_size
+        queryset = self.filter_search(**kwargs)
+        issues = [
+            issue
+            async for issue in queryset.values_list("data", flat=True)[
+                start : start + page_size
+            ]
+        ]
+        return self.search_response(issues, await queryset.acount(), start, page_size)
+
+
+class JiraIssue(models.Model):
+    """
+    Read model of the Jira issues behind the ticket endpoints.
+
+    Kept up to date by the Jira webhooks and the `sync_jira_issues` task so
+    that ticket lists can be served without a JQL search. `data` holds the
+    issue as returned by Jira.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    key = models.CharField(max_length=32, db_index=True)
+    project = models.CharField(max_length=32)
+    customer_id = models.CharField(max_length=64, null=True)
+    summary = models.CharField(max_length=256, blank=True)
+    status = models.CharField(max_length=64, blank=True)
+    priority = models.CharField(max_length=64, blank=True)
+    issue_type = models.CharField(max_length=64, blank=True)
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    data = models.JSONField()
+    synced_at = models.DateTimeField(auto_now=True)
+    objects = JiraIssueManager()
+
+    class Meta:
+        ordering = ["-created"]
+        indexes = [
+            models.Index(fields=["customer_id", "-created"]),
+            models.Index(fields=["customer_id", "-updated"]),
+            models.Index(fields=["-updated"]),
+        ]
+
+    def __str__(self):
+        return self.key
+
+    @classmethod
+    def from_jira(cls, issue):
+        fields = issue["fields"]
+        return cls(
+            id=int(issue["id"]),
+            key=issue["key"],
+            project=(fields.get("project") or {}).get("key", ""),
+            customer_id=fields.get("customfield_10200"),
+            summary=(fields.get("summary") or "")[:256],
+            status=(fields.get("status") or {}).get("name", ""),
+            priority=(fields.get("priority") or {}).get("name", ""),
+            issue_type=(fields.get("issuetype") or {}).get("name", ""),
+            created=parse_datetime(fields["created"]),
+            updated=parse_datetime(fields["updated"]),
+            data=issue,
+        )
+
+
+class JiraSyncCursor(models.Model):
+    """Position of an incremental `updated >= checkpoint` Jira sync."""
+
+    name = models.CharField(max_length=64, primary_key=True)
+    checkpoint = models.DateTimeField(null=True)
+    offset = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class TicketOperationManager(models.Manager):
+    def create_operation(self, user, issue, uploaded_files):
+        with transaction.atomic():
+            instance = self.create(user=user, issue=issue)
+            instance.attachments.set(
+                [Attachment.objects.create(user=user, file=f) for f in uploaded_files]
+            )
+            return instance
+
+
+class TicketOperation(BaseModel):
+    """
+    A ticket accepted by the API and created in Jira by a Celery task.
+
+    `issue` holds the arguments of `create_issue`; the files to upload are
+    staged as `attachments` until the task has sent them to Jira.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="ticket_operations",
+        editable=False,
+    )
+    PENDING = 0
+    RUNNING = 1
+    SUCCEEDED = 2
+    FAILED = 3
+    STATUS_CHOICES = {
+        PENDING: _("Pending"),
+        RUNNING: _("Running"),
+        SUCCEEDED: _("Succeeded"),
+        FAILED: _("Failed"),
+    }
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=PENDING)
+    issue = models.JSONField()
+    attachments = models.ManyToManyField(Attachment, blank=True)
+    issue_id = models.CharField(max_length=32, blank=True)
+    issue_key = models.CharField(max_length=32, blank=True)
+    # The response a synchronous create would have returned.
+    result = models.JSONField(null=True)
+    error = models.TextField(blank=True)
+    objects = TicketOperationManager()
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    @property
+    def done(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def discard_attachments(self):
+        for attachment in self.attachments.all():
+            attachment.file.delete(save=False)
+            attachment.delete()
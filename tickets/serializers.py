@@ -10,6 +10,7 @@ from users.serializers import UserSerializer
 from .models import Attachment
 from .models import FollowUp
 from .models import Ticket
+from .models import TicketOperation
 
 User = get_user_model()
 
@@ -259,5 +260,20 @@ class TicketSerializer(serializers.Serializer):
     description = serializers.CharField()
 
 
+class TicketOperationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TicketOperation
+        fields = (
+            "id",
+            "status",
+            "issue_id",
+            "issue_key",
+            "result",
+            "error",
+            "created_at",
+            "updated_at",
+        )
+
+
 class CommentSerializer(serializers.Serializer):
     body = serializers.CharField()
@@ -1,24 +1,45 @@
+import os
+import time
 import uuid
 import logging
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from zoneinfo import ZoneInfo
 
 from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import localtime
 from django.utils.translation import gettext_lazy as _
+from requests import HTTPError
+from rest_framework.exceptions import APIException
 from rest_framework.exceptions import ValidationError
 
 from tickets.events import FollowUpCreated
 from tickets.events import TicketAssigned
 from tickets.events import TicketClosed
 from tickets.events import TicketCreated
+from tickets.models import Attachment
 from tickets.models import FollowUp
+from tickets.models import JiraIssue
+from tickets.models import JiraSyncCursor
 from tickets.models import Ticket
+from tickets.models import TicketOperation
 from tickets.serializers import ReadOnlyFollowUpSerializer
 from tickets.serializers import ReadOnlyTicketSerializer
+from utils.circuitbreaker import CircuitOpen
 from utils.decorators import delay_return
+from utils.jira import jira_service
 from utils.kafka import kafka_event_store
 # from utils.jira import JiraService
 from django.conf import settings
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 class TicketService:
@@ -130,3 +151,302 @@ class TicketService:
 
 
 ticket_service = TicketService(kafka_event_store)
+
+
+class JiraIssueSync:
+    """
+    Mirrors Jira issues into `JiraIssue` with `updated >= checkpoint` searches.
+
+    JQL compares dates to the minute, in the Jira user's time zone, so the
+    cursor keeps the minute of the last issue seen plus how many issues of
+    that minute were already stored. The cursor is saved with every page, so
+    an interrupted sync resumes where it stopped. The next page is fetched
+    while the current one is written, and only those two pages are held in
+    memory.
+    """
+
+    def __init__(self, service, name, page_size=100, batch_size=None, project=None):
+        self.service = service
+        self.name = name
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.project = project or service.default_project_key or "TPP"
+        self.timezone = ZoneInfo(settings.JIRA_TIMEZONE)
+
+    def jql(self, checkpoint):
+        jql = f'project = "{self.project}"'
+        if checkpoint:
+            since = checkpoint.astimezone(self.timezone).strftime("%Y/%m/%d %H:%M")
+            jql += f' AND updated >= "{since}"'
+        return jql + " ORDER BY updated ASC, key ASC"
+
+    def fetch(self, checkpoint, offset):
+        return self.service.search_issues(
+            self.jql(checkpoint),
+            start_at=offset,
+            max_results=self.page_size,
+            # The list profile plus what the mirror's columns need.
+            fields=[*self.service.FIELD_PROFILES["list"].fields, "project"],
+        )
+
+    @staticmethod
+    def caught_up(page, offset):
+        # Jira may return fewer issues than asked for (it caps pages at 100),
+        # so only its own count tells whether more are left.
+        issues = page["issues"]
+        if not issues or page.get("isLast"):
+            return True
+        if page.get("total") is None:
+            return False
+        return page.get("startAt", offset) + len(issues) >= page["total"]
+
+    @staticmethod
+    def minute(issue):
+        updated = parse_datetime(issue["fields"]["updated"])
+        return updated.replace(second=0, microsecond=0)
+
+    def advance(self, checkpoint, offset, issues):
+        """Returns the cursor position after `issues`."""
+        last = self.minute(issues[-1])
+        if last == checkpoint:
+            return checkpoint, offset + len(issues)
+        return last, sum(self.minute(issue) == last for issue in issues)
+
+    def pages(self, max_pages=None):
+        """Syncs page by page, yielding the number of issues stored."""
+        cursor, _ = JiraSyncCursor.objects.get_or_create(name=self.name)
+        position = cursor.checkpoint, cursor.offset
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_page = executor.submit(self.fetch, *position)
+            pages = 0
+            while next_page:
+                page = next_page.result()
+                issues = page["issues"]
+                pages += 1
+                caught_up = self.caught_up(page, position[1])
+                if issues:
+                    position = self.advance(*position, issues)
+                if caught_up:
+                    # The next run re-reads the checkpoint's minute, which
+                    # also picks up issues that moved while paging.
+                    position = position[0], 0
+                next_page = None
+                if not caught_up and (max_pages is None or pages < max_pages):
+                    next_page = executor.submit(self.fetch, *position)
+
+                JiraIssue.objects.upsert(issues, batch_size=self.batch_size)
+                cursor.checkpoint, cursor.offset = position
+                cursor.save(update_fields=["checkpoint", "offset", "updated_at"])
+                if issues:
+                    yield len(issues)
+
+    def run(self, max_pages=None):
+        return sum(self.pages(max_pages))
+
+    def refresh_issue(self, issue_id):
+        self.service.invalidate_ticket(issue_id)
+        JiraIssue.objects.upsert([self.service.fetch_ticket_detail(issue_id)])
+
+
+jira_issue_sync = JiraIssueSync(
+    jira_service, "catch-up", page_size=settings.JIRA_SYNC_PAGE_SIZE
+)
+
+
+class JiraBackfill:
+    """
+    Copies legacy tickets into Jira: each `Ticket` becomes an issue, its
+    follow-ups comments, and the files of both attachments.
+
+    Every row records the Jira id it was copied to as soon as Jira returns
+    it, so a run can be stopped at any point and the next one copies only
+    what is missing. Tickets are copied concurrently by `workers` threads;
+    the follow-ups of a ticket are posted in order by one worker.
+    """
+
+    def __init__(self, service, workers=8, project="TPP", retries=3):
+        self.service = service
+        self.workers = workers
+        self.project = project
+        self.retries = retries
+
+    @staticmethod
+    def pending():
+        return (
+            Ticket.objects.filter(
+                Q(jira_issue_id="")
+                | Q(attachments__jira_attachment_id="")
+                | Q(followups__jira_comment_id="")
+                | Q(followups__attachments__jira_attachment_id="")
+            )
+            .order_by("created_at")
+            .values_list("pk", flat=True)
+            .distinct()
+        )
+
+    def issue(self, ticket):
+        created = localtime(ticket.created_at)
+        return {
+            "customer_id": str(ticket.user_id),
+            "summary": ticket.subject[:255],
+            "description": (
+                f"{ticket.description}\n\n----\n"
+                f"Ticket #{ticket.ref_code}, {created:%Y-%m-%d %H:%M}"
+            ),
+            "issue_type": self.service.ISSUE_TYPE_MAPPING.get(ticket.cat),
+            "project_key": self.project,
+            "user_full_name": ticket.user.full_name,
+            "user_email": ticket.user.email,
+            "category_field": self.service.CATEGORY_MAPPING.get(ticket.cat),
+        }
+
+    @staticmethod
+    def comment(followup):
+        created = localtime(followup.created_at)
+        return (
+            f"{followup.user.full_name} ({created:%Y-%m-%d %H:%M}):\n\n"
+            f"{followup.description}"
+        )
+
+    def upload(self, issue_id, attachments):
+        attachments = [a for a in attachments if not a.jira_attachment_id]
+        if not attachments:
+            return 0
+        uploaded_files = [
+            File(a.file.open("rb"), name=os.path.basename(a.file.name))
+            for a in attachments
+        ]
+        try:
+            # Jira lists the new attachments in upload order.
+            uploaded = self.service.upload_attachments(issue_id, uploaded_files)
+        finally:
+            for uploaded_file in uploaded_files:
+                uploaded_file.close()
+        for attachment, data in zip(attachments, uploaded):
+            attachment.jira_attachment_id = data["id"]
+        Attachment.objects.bulk_update(attachments, ["jira_attachment_id"])
+        return len(attachments)
+
+    def copy(self, ticket_id):
+        """Copies what is missing of one ticket and returns what was copied."""
+        copied = Counter()
+        ticket = Ticket.objects.select_related("user").get(pk=ticket_id)
+        if not ticket.jira_issue_id:
+            ticket.jira_issue_id = self.service.create_issue(**self.issue(ticket))["id"]
+            # Legacy timestamps are left alone.
+            ticket.save(update_fields=["jira_issue_id"])
+            copied["issues"] += 1
+        copied["attachments"] += self.upload(
+            ticket.jira_issue_id, ticket.attachments.all()
+        )
+
+        followups = (
+            ticket.followups.select_related("user")
+            .prefetch_related("attachments")
+            .order_by("created_at")
+        )
+        for followup in followups:
+            if not followup.jira_comment_id:
+                followup.jira_comment_id = self.service.create_comment(
+                    ticket.jira_issue_id, self.comment(followup)
+                )["id"]
+                followup.save(update_fields=["jira_comment_id"])
+                copied["comments"] += 1
+            copied["attachments"] += self.upload(
+                ticket.jira_issue_id, followup.attachments.all()
+            )
+        return copied
+
+    def copy_with_retries(self, ticket_id):
+        try:
+            for attempt in range(self.retries):
+                try:
+                    return self.copy(ticket_id)
+                except CircuitOpen as e:
+                    # Jira is struggling; back off instead of failing fast.
+                    if attempt == self.retries - 1:
+                        raise
+                    time.sleep(e.wait or 1)
+        finally:
+            # Worker threads would otherwise each keep a connection open.
+            connection.close()
+
+    def run(self, ticket_ids):
+        """
+        Yields `(ticket_id, copied)` for each ticket as it finishes, where
+        `copied` is a Counter or the exception that stopped the ticket.
+        """
+        ticket_ids = iter(ticket_ids)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = {}
+
+            def submit():
+                # Only a few tickets per worker are queued at a time.
+                while len(running) < self.workers * 2:
+                    ticket_id = next(ticket_ids, None)
+                    if ticket_id is None:
+                        return
+                    future = executor.submit(self.copy_with_retries, ticket_id)
+                    running[future] = ticket_id
+
+            submit()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ticket_id = running.pop(future)
+                    yield ticket_id, future.exception() or future.result()
+                submit()
+
+
+def with_attachments(data, attachments, errors):
+    """Reports uploaded attachments, and the files that failed, next to `data`."""
+    data["attachments"] = attachments
+    if errors:
+        data["attachment_errors"] = errors
+    return data
+
+
+def publish_jira_ticket(customer_id, ticket_id):
+    """Makes a Jira issue that was just created show up in the ticket lists."""
+    jira_service.invalidate_ticket_lists(customer_id)
+    if settings.TICKETS_LIST_SOURCE == "local":
+        # Show the ticket in the customer's list before the webhook lands.
+        try:
+            jira_issue_sync.refresh_issue(ticket_id)
+        except (HTTPError, APIException):
+            logger.exception("Could not mirror Jira issue %s", ticket_id)
+
+
+def run_ticket_operation(operation):
+    """
+    Creates the Jira issue of a queued ticket and uploads its attachments.
+
+    The issue id is saved as soon as Jira returns it, so a retry after a
+    failed upload or a crash does not create the issue twice.
+    """
+    if not operation.issue_id:
+        data = jira_service.create_issue(**operation.issue)
+        operation.issue_id = data["id"]
+        operation.issue_key = data.get("key", "")
+        operation.result = data
+        operation.save(update_fields=["issue_id", "issue_key", "result", "updated_at"])
+
+    uploaded_files = [
+        File(attachment.file.open("rb"), name=os.path.basename(attachment.file.name))
+        for attachment in operation.attachments.all()
+    ]
+    try:
+        result = with_attachments(
+            operation.result,
+            *jira_service.add_attachments(operation.issue_id, uploaded_files),
+        )
+    finally:
+        for uploaded_file in uploaded_files:
+            uploaded_file.close()
+
+    operation.result = result
+    operation.status = TicketOperation.SUCCEEDED
+    operation.save(update_fields=["result", "status", "updated_at"])
+    operation.discard_attachments()
+    publish_jira_ticket(operation.issue["customer_id"], operation.issue_id)
+    return operation
@@ -0,0 +1,59 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from requests import HTTPError
+from requests import RequestException
+
+from config import celery_app
+from tickets.models import TicketOperation
+from tickets.services import jira_issue_sync
+from tickets.services import run_ticket_operation
+from utils.circuitbreaker import CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task()
+def sync_jira_issues():
+    """Catches the Jira issue mirror up with issues changed since the last run."""
+    # Beat may fire again before a slow run ends.
+    if not cache.add(
+        "lock:sync_jira_issues", 1, timeout=settings.JIRA_SYNC_LOCK_TIMEOUT
+    ):
+        return 0
+    try:
+        synced = jira_issue_sync.run(max_pages=settings.JIRA_SYNC_MAX_PAGES)
+        logger.info("Synced %s Jira issues", synced)
+        return synced
+    finally:
+        cache.delete("lock:sync_jira_issues")
+
+
+@celery_app.task(bind=True, max_retries=5)
+def create_jira_ticket(self, operation_id):
+    """Runs a ticket accepted with 202; Jira outages are retried with backoff."""
+    operation = TicketOperation.objects.filter(pk=operation_id).first()
+    if operation is None or operation.done:
+        return
+    operation.status = TicketOperation.RUNNING
+    operation.save(update_fields=["status", "updated_at"])
+
+    try:
+        run_ticket_operation(operation)
+    except (RequestException, CircuitOpen) as e:
+        response = getattr(e, "response", None)
+        rejected = (
+            isinstance(e, HTTPError)
+            and response is not None
+            and response.status_code < 500
+            and response.status_code != 429
+        )
+        if rejected or self.request.retries >= self.max_retries:
+            logger.warning("Could not create ticket %s: %s", operation_id, e)
+            operation.status = TicketOperation.FAILED
+            operation.error = response.text if rejected else str(e)
+            operation.save(update_fields=["status", "error", "updated_at"])
+            operation.discard_attachments()
+            return
+        raise self.retry(exc=e, countdown=2**self.request.retries)
@@ -49,3 +49,22 @@ class FollowUpFactory(factory.django.DjangoModelFactory):
     id = factory.LazyAttribute(lambda _: uuid.uuid4())
     ticket = factory.SubFactory(TicketFactory)
     user = factory.SubFactory(UserFactory)
+
+
+class JiraIssueFieldsFactory(factory.DictFactory):
+    project = factory.Dict({"key": "TPP"})
+    customfield_10200 = factory.LazyAttribute(lambda _: str(uuid.uuid4()))
+    summary = factory.LazyAttribute(lambda _: faker.sentence())
+    status = factory.Dict({"name": "Open"})
+    priority = factory.Dict({"name": "Medium"})
+    issuetype = factory.Dict({"name": "Support"})
+    created = "2024-01-01T10:00:00.000+0330"
+    updated = factory.SelfAttribute("created")
+
+
+class JiraIssueDataFactory(factory.DictFactory):
+    """A Jira issue as returned by the REST API."""
+
+    id = factory.Sequence(lambda n: str(10000 + n))
+    key = factory.LazyAttribute(lambda o: f"TPP-{o.id}")
+    fields = factory.SubFactory(JiraIssueFieldsFactory)
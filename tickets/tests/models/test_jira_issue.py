@@ -0,0 +1,61 @@
+from django.test import TestCase
+
+from tickets.models import JiraIssue
+from tickets.tests.factories import JiraIssueDataFactory
+
+
+class JiraIssueTests(TestCase):
+    def test_upsert(self):
+        data = JiraIssueDataFactory(fields__customfield_10200="7")
+        JiraIssue.objects.upsert([data])
+        data["fields"]["status"] = {"name": "Done"}
+        JiraIssue.objects.upsert([data])
+
+        issue = JiraIssue.objects.get()
+        self.assertEqual(issue.id, int(data["id"]))
+        self.assertEqual(issue.customer_id, "7")
+        self.assertEqual(issue.status, "Done")
+        self.assertEqual(issue.data, data)
+
+    def test_search(self):
+        JiraIssue.objects.upsert(
+            [
+                JiraIssueDataFactory(
+                    fields__customfield_10200="7",
+                    fields__created=f"2024-01-0{day}T10:00:00.000+0330",
+                )
+                for day in range(1, 4)
+            ]
+            + [JiraIssueDataFactory(fields__customfield_10200="8")]
+        )
+
+        data = JiraIssue.objects.search(customer_id="7", page=1, page_size=2)
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(
+            [issue["fields"]["created"][:10] for issue in data["issues"]],
+            ["2024-01-03", "2024-01-02"],
+        )
+        data = JiraIssue.objects.search(
+            customer_id="7", page=2, page_size=2, ordering="created ASC"
+        )
+        self.assertEqual(data["startAt"], 2)
+        self.assertEqual(data["issues"][0]["fields"]["created"][:10], "2024-01-03")
+
+    def test_search_by_key(self):
+        data = JiraIssueDataFactory()
+        JiraIssue.objects.upsert([data, JiraIssueDataFactory()])
+        self.assertEqual(
+            JiraIssue.objects.search(ticket_id=data["key"].lower())["issues"], [data]
+        )
+        self.assertEqual(
+            JiraIssue.objects.search(ticket_id=data["id"])["issues"], [data]
+        )
+
+    def test_search_skips_other_projects(self):
+        data = JiraIssueDataFactory(fields__customfield_10200="7")
+        other = JiraIssueDataFactory(
+            key="OPS-1", fields__customfield_10200="7", fields__project={"key": "OPS"}
+        )
+        JiraIssue.objects.upsert([data, other])
+        self.assertEqual(JiraIssue.objects.search()["issues"], [data])
+        self.assertEqual(JiraIssue.objects.search(customer_id="7")["total"], 1)
@@ -0,0 +1,312 @@
+import asyncio
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import httpx
+import requests
+import urllib3
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from utils.jira import AsyncJiraService
+from utils.jira import JiraService
+
+
+class AttachmentDownloadTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch("utils.http.PooledSession.get")
+    def test_streams_and_forwards_range(self, get_session):
+        upstream = MagicMock(status_code=206)
+        upstream.headers = {
+            "Content-Type": "image/png",
+            "Content-Length": "4",
+            "Content-Range": "bytes 2-5/10",
+            "Server": "jira",
+        }
+        upstream.iter_content.return_value = iter([b"ab", b"cd"])
+        get_session.return_value.request.return_value = upstream
+
+        service = JiraService(base_url="https://jira.example.com")
+        response = service.download_attachment(
+            1, "a.png", headers={"Range": "bytes=2-5", "Cookie": "x"}
+        )
+
+        request_headers = get_session.return_value.request.call_args.kwargs["headers"]
+        self.assertEqual(
+            request_headers, {"Accept-Encoding": "identity", "Range": "bytes=2-5"}
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertFalse(response.has_header("Server"))
+        upstream.close.assert_not_called()
+        self.assertEqual(b"".join(response.streaming_content), b"abcd")
+        upstream.close.assert_called_once()
+
+    def test_async_streams(self):
+        def handler(request):
+            self.assertEqual(request.headers["Range"], "bytes=0-1")
+            return httpx.Response(
+                206,
+                headers={"Content-Type": "text/plain", "Content-Range": "bytes 0-1/4"},
+                content=b"ab",
+            )
+
+        service = AsyncJiraService(base_url="https://jira.example.com")
+
+        async def run():
+            with patch.object(
+                service,
+                "build_client",
+                return_value=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            ):
+                response = await service.download_attachment(
+                    1, "a.txt", headers={"Range": "bytes=0-1"}
+                )
+                body = b"".join([chunk async for chunk in response.streaming_content])
+            return response, body
+
+        response, body = asyncio.run(run())
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 0-1/4")
+        self.assertEqual(body, b"ab")
+
+    @patch("utils.http.PooledSession.get")
+    def test_gzip_upstream(self, get_session):
+        compressed = gzip.compress(b"hello" * 100)
+        upstream = requests.Response()
+        upstream.status_code = 200
+        upstream.headers = requests.structures.CaseInsensitiveDict(
+            {"Content-Encoding": "gzip", "Content-Length": str(len(compressed))}
+        )
+        upstream.raw = urllib3.HTTPResponse(
+            io.BytesIO(compressed),
+            headers=dict(upstream.headers),
+            preload_content=False,
+        )
+        get_session.return_value.request.return_value = upstream
+
+        service = JiraService(base_url="https://jira.example.com")
+        response = service.download_attachment(1, "a.txt")
+
+        # The body arrives decoded, so the encoded length must not be sent.
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), b"hello" * 100)
+
+    def test_async_gzip_upstream(self):
+        def handler(request):
+            self.assertEqual(request.headers["Accept-Encoding"], "identity")
+            return httpx.Response(
+                200,
+                headers={"Content-Encoding": "gzip"},
+                content=gzip.compress(b"hello" * 100),
+            )
+
+        service = AsyncJiraService(base_url="https://jira.example.com")
+
+        async def run():
+            with patch.object(
+                service,
+                "build_client",
+                return_value=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            ):
+                response = await service.download_attachment(1, "a.txt")
+                body = b"".join([chunk async for chunk in response.streaming_content])
+            return response, body
+
+        response, body = asyncio.run(run())
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertEqual(body, b"hello" * 100)
+
+
+class AttachmentCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.service = JiraService(
+            base_url="https://jira.example.com",
+            attachment_cache_dir=self.directory,
+            attachment_cache_size=1024,
+        )
+        patcher = patch("utils.http.PooledSession.get")
+        self.session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def upstream(self, content):
+        upstream = MagicMock(status_code=200)
+        upstream.headers = {
+            "Content-Type": "text/plain",
+            "Content-Disposition": 'inline; filename="a.txt"',
+        }
+        upstream.iter_content.return_value = iter([content[:2], content[2:]])
+        self.session.request.return_value = upstream
+        return upstream
+
+    def download(self, attachment_id=1, **headers):
+        response = self.service.download_attachment(attachment_id, "a.txt", headers)
+        return response, b"".join(response) if response.streaming else b""
+
+    def test_second_download_is_served_from_disk(self):
+        self.upstream(b"hello")
+        response, body = self.download()
+        self.assertEqual(body, b"hello")
+        self.assertEqual(response["ETag"], '"jira-attachment-1"')
+        self.assertIn("immutable", response["Cache-Control"])
+
+        response, body = self.download()
+        self.assertEqual(self.session.request.call_count, 1)
+        self.assertEqual(body, b"hello")
+        self.assertEqual(response["Content-Type"], "text/plain")
+        self.assertEqual(response["Content-Disposition"], 'inline; filename="a.txt"')
+
+        response, body = self.download(Range="bytes=1-2")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 1-2/5")
+        self.assertEqual(body, b"el")
+
+    def test_if_none_match(self):
+        response, _ = self.download(**{"If-None-Match": '"jira-attachment-1"'})
+        self.assertEqual(response.status_code, 304)
+        self.session.request.assert_not_called()
+
+    def test_interrupted_download_is_not_cached(self):
+        self.upstream(b"hello")
+        response = self.service.download_attachment(1, "a.txt")
+        next(iter(response))
+        # As the test client does, keep close() away from the database.
+        with patch("django.http.response.signals.request_finished"):
+            response.close()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_oversized_download_without_length_is_not_cached(self):
+        self.upstream(b"x" * 2000)
+        response, body = self.download()
+        self.assertEqual(len(body), 2000)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_least_recently_used_are_evicted(self):
+        for attachment_id in range(1, 4):
+            self.upstream(b"x" * 400)
+            self.download(attachment_id)
+            os.utime(
+                os.path.join(self.directory, str(attachment_id)),
+                (attachment_id, attachment_id),
+            )
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "1")))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "3")))
+
+
+class AttachmentDeliveryTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = patch("utils.http.PooledSession.get")
+        self.session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        upstream = MagicMock(status_code=200)
+        upstream.headers = {"Content-Type": "image/png", "Content-Length": "5"}
+        upstream.iter_content.return_value = iter([b"hel", b"lo"])
+        self.session.request.return_value = upstream
+
+    def service(self, **kwargs):
+        return JiraService(
+            base_url="https://jira.example.com",
+            attachment_cache_dir=self.directory,
+            attachment_cache_size=1024,
+            **kwargs,
+        )
+
+    def test_accel_stages_then_redirects_internally(self):
+        service = self.service(attachment_delivery="accel")
+        response = service.download_attachment(7, "a.png", {"Range": "bytes=0-1"})
+
+        request_headers = self.session.request.call_args.kwargs["headers"]
+        self.assertEqual(request_headers, {"Accept-Encoding": "identity"})
+        self.assertEqual(response["X-Accel-Redirect"], "/internal/jira-attachments/7")
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["ETag"], '"jira-attachment-7"')
+        self.assertEqual(response.content, b"")
+        with open(os.path.join(self.directory, "7"), "rb") as f:
+            self.assertEqual(f.read(), b"hello")
+
+        service.download_attachment(7, "a.png")
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_oversized_attachment_stops_staging_early(self):
+        read = []
+
+        def chunks():
+            for _ in range(10):
+                read.append(1)
+                yield b"x" * 500
+
+        def request(*args, **kwargs):
+            # Chunked: no Content-Length to check up front.
+            upstream = MagicMock(status_code=200, headers={"Content-Type": "a/b"})
+            upstream.iter_content.return_value = chunks()
+            return upstream
+
+        self.session.request.side_effect = request
+        response = self.service(attachment_delivery="accel").download_attachment(
+            7, "a.png"
+        )
+        # Staging gave up at the third chunk; the file is streamed instead.
+        self.assertEqual(len(read), 3)
+        self.assertEqual(len(b"".join(response)), 5000)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_oversized_attachment_keeps_the_range(self):
+        def request(method, url, headers, **kwargs):
+            if "Range" in headers:
+                upstream = MagicMock(status_code=206)
+                upstream.headers = {
+                    "Content-Length": "2",
+                    "Content-Range": "bytes 0-1/5000",
+                }
+                upstream.iter_content.return_value = iter([b"xx"])
+            else:
+                upstream = MagicMock(status_code=200)
+                upstream.headers = {"Content-Length": "5000"}
+            return upstream
+
+        self.session.request.side_effect = request
+        response = self.service(attachment_delivery="accel").download_attachment(
+            7, "a.png", {"Range": "bytes=0-1"}
+        )
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 0-1/5000")
+        self.assertEqual(b"".join(response), b"xx")
+        self.assertEqual(self.session.request.call_count, 2)
+
+    def test_signed_url(self):
+        service = self.service(attachment_delivery="signed", attachment_url_secret="s")
+        with patch("utils.jira.time.time", return_value=1000):
+            response = service.download_attachment(7, "a b.png")
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Cache-Control"], "private, no-store")
+        # echo -n '1300/tickets/attachment-files/7/a b.png s' | openssl md5 -binary
+        #   | base64 | tr +/ -_ | tr -d =
+        self.assertEqual(
+            response["Location"],
+            "/tickets/attachment-files/7/a%20b.png"
+            "?md5=zCThXqu0-uzb_SytdqERJQ&expires=1300",
+        )
+
+    def test_offloading_needs_the_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            JiraService(
+                base_url="https://jira.example.com", attachment_delivery="accel"
+            )
+        with self.assertRaises(ImproperlyConfigured):
+            self.service(attachment_delivery="signed")
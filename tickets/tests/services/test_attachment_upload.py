@@ -0,0 +1,78 @@
+import asyncio
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import httpx
+import requests
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from utils.jira import AsyncJiraService
+from utils.jira import JiraService
+
+
+def uploads(*names):
+    return [SimpleUploadedFile(name, name.encode()) for name in names]
+
+
+def upload_response(*args, files, **kwargs):
+    names = [name for _, (name, _) in files]
+    response = MagicMock(status_code=400 if "bad.txt" in names else 200)
+    response.text = "rejected"
+    if response.status_code == 400:
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+    response.json.return_value = [{"filename": name} for name in names]
+    return response
+
+
+class AddAttachmentsTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = JiraService(base_url="https://jira.example.com")
+        patcher = patch("utils.http.PooledSession.get")
+        self.session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.session.request.side_effect = upload_response
+
+    def test_one_request_for_all_files(self):
+        attachments, errors = self.service.add_attachments(1, uploads("a", "b"))
+        self.assertEqual(attachments, [{"filename": "a"}, {"filename": "b"}])
+        self.assertEqual(errors, {})
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_rejected_files_are_reported_individually(self):
+        attachments, errors = self.service.add_attachments(
+            1, uploads("a", "bad.txt", "b")
+        )
+        self.assertEqual(attachments, [{"filename": "a"}, {"filename": "b"}])
+        self.assertEqual(errors, {"bad.txt": "rejected"})
+        self.assertEqual(self.session.request.call_count, 4)
+
+    def test_transport_errors_are_not_retried(self):
+        self.session.request.side_effect = requests.ConnectionError("reset")
+        attachments, errors = self.service.add_attachments(1, uploads("a", "b"))
+        self.assertEqual(attachments, [])
+        self.assertEqual(errors, {"a": "reset", "b": "reset"})
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_async(self):
+        def handler(request):
+            if b"bad.txt" in request.content:
+                return httpx.Response(400, text="rejected", request=request)
+            names = [n for n in "ab" if f'filename="{n}"'.encode() in request.content]
+            return httpx.Response(200, json=[{"filename": n} for n in names])
+
+        service = AsyncJiraService(base_url="https://jira.example.com")
+
+        async def run():
+            with patch.object(
+                service,
+                "build_client",
+                return_value=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            ):
+                return await service.add_attachments(1, uploads("a", "bad.txt", "b"))
+
+        attachments, errors = asyncio.run(run())
+        self.assertEqual(attachments, [{"filename": "a"}, {"filename": "b"}])
+        self.assertEqual(errors, {"bad.txt": "rejected"})
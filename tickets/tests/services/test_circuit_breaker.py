@@ -0,0 +1,138 @@
+import asyncio
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from utils.circuitbreaker import CircuitBreaker
+from utils.circuitbreaker import CircuitOpen
+from utils.jira import JiraService
+
+
+def response(status_code=200, data=None):
+    response = MagicMock(status_code=status_code)
+    response.json.return_value = data
+    return response
+
+
+def fail(timeout):
+    raise requests.ConnectionError
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker(
+            "test", errors=(requests.RequestException,), min_calls=4
+        )
+
+    def trip(self):
+        for _ in range(4):
+            with self.assertRaises(requests.ConnectionError):
+                self.breaker.call(fail)
+
+    def test_opens_after_failures(self):
+        self.trip()
+        send = MagicMock()
+        with self.assertRaises(CircuitOpen) as e:
+            self.breaker.call(send)
+        send.assert_not_called()
+        self.assertEqual(e.exception.wait, 30)
+
+    def test_client_errors_are_not_failures(self):
+        for _ in range(10):
+            self.breaker.call(lambda timeout: response(404))
+        self.breaker.call(lambda timeout: response())
+
+    def test_probe_closes_circuit(self):
+        self.trip()
+        cache.delete(self.breaker.open_key)
+        self.breaker.call(lambda timeout: response())
+        self.breaker.call(lambda timeout: response())
+
+    def test_failed_probe_reopens_circuit(self):
+        self.trip()
+        cache.delete(self.breaker.open_key)
+        with self.assertRaises(requests.ConnectionError):
+            self.breaker.call(fail)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.call(lambda timeout: response())
+
+    def test_probe_is_released_on_any_error(self):
+        self.trip()
+        cache.delete(self.breaker.open_key)
+        with self.assertRaises(ValueError):
+            self.breaker.call(MagicMock(side_effect=ValueError))
+        self.assertIsNone(cache.get(self.breaker.probe_key))
+        self.breaker.call(lambda timeout: response())
+
+    def test_timeout_follows_latency(self):
+        self.assertEqual(self.breaker.timeout, 5)
+        self.breaker.latencies.extend([0.1] * 100)
+        self.assertEqual(self.breaker.timeout, 1)
+        self.breaker.latencies.extend([0.5] * 100)
+        self.assertEqual(self.breaker.timeout, 1.5)
+
+    def test_async_call_opens_after_failures(self):
+        async def afail(timeout):
+            raise requests.ConnectionError
+
+        async def run():
+            for _ in range(4):
+                with self.assertRaises(requests.ConnectionError):
+                    await self.breaker.acall(afail)
+            await self.breaker.acall(afail)
+
+        with self.assertRaises(CircuitOpen):
+            asyncio.run(run())
+
+
+class JiraServiceBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = JiraService(
+            base_url="https://jira.example.com",
+            issue_cache_ttl=0,
+            circuit_breaker={"min_calls": 1},
+        )
+
+    def test_endpoint_classes(self):
+        self.assertEqual(self.service.endpoint_class("search"), "search")
+        self.assertEqual(self.service.endpoint_class("issue/1?fields=key"), "issue")
+        self.assertEqual(
+            self.service.endpoint_class("/rest/api/2/issue/1/comment"), "comment"
+        )
+        self.assertEqual(
+            self.service.endpoint_class("/rest/api/2/issue/1/attachments"),
+            "attachment",
+        )
+
+    @patch("utils.http.PooledSession.get")
+    def test_serves_last_good_response_while_open(self, get_session):
+        session = get_session.return_value
+        session.request.return_value = response(data={"id": "1"})
+        self.service.fetch_ticket_detail(1)
+
+        session.request.side_effect = requests.ConnectionError
+        with self.assertRaises(requests.ConnectionError):
+            self.service.fetch_ticket_detail(1)
+        self.assertEqual(self.service.fetch_ticket_detail(1), {"id": "1"})
+        with self.assertRaises(CircuitOpen):
+            self.service.fetch_ticket_detail(2)
+
+    @patch("utils.http.PooledSession.get")
+    def test_stale_copy_is_the_cache_entry(self, get_session):
+        self.service.issue_cache_ttl = 60
+        session = get_session.return_value
+        session.request.return_value = response(data={"id": "1"})
+        with patch("utils.circuitbreaker.cache.set", wraps=cache.set) as cache_set:
+            self.service.fetch_ticket_detail(1)
+            self.service.fetch_ticket_detail(1)
+        session.request.assert_called_once()
+        # Coalescing publishes its own short-lived result; the issue itself
+        # is written once.
+        written = [c.args[0] for c in cache_set.call_args_list]
+        written = [key for key in written if key.startswith("jira:")]
+        self.assertEqual(written, [self.service.ticket_cache_key(1)])
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import requests
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test import SimpleTestCase
+from django.test import override_settings
+
+from utils.deadline import DeadlineExceeded
+from utils.deadline import budget
+from utils.deadline import deadline
+from utils.deadline import remaining
+from utils.idempotency import Idempotency
+from utils.jira import JiraService
+from utils.middleware import DeadlineMiddleware
+from utils.singleflight import SingleFlight
+
+
+class DeadlineTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = JiraService(base_url="https://jira.example.com")
+        patcher = patch("utils.http.PooledSession.get")
+        self.session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.session.request.return_value.status_code = 200
+
+    def test_budget(self):
+        self.assertEqual(budget(5), 5)
+        with deadline(1):
+            self.assertLessEqual(budget(5), 1)
+            with deadline(10):
+                # Nested deadlines never extend the outer one.
+                self.assertLessEqual(remaining(), 1)
+        self.assertIsNone(remaining())
+
+    def test_calls_get_the_remaining_time(self):
+        with deadline(2):
+            self.service.request("GET", "issue/1")
+        self.assertLessEqual(self.session.request.call_args.kwargs["timeout"], 2)
+
+    def test_spent_deadline_skips_calls(self):
+        with deadline(0), self.assertRaises(DeadlineExceeded):
+            self.service.request("GET", "issue/1")
+        self.session.request.assert_not_called()
+
+    def test_timeouts_past_the_deadline_do_not_trip_the_breaker(self):
+        def slow(*args, timeout, **kwargs):
+            time.sleep(timeout)
+            raise requests.Timeout
+
+        self.session.request.side_effect = slow
+        with deadline(0.1), self.assertRaises(DeadlineExceeded):
+            self.service.request("GET", "issue/1")
+        _, failures_key = self.service.breakers["issue"].counter_keys()
+        self.assertIsNone(cache.get(failures_key))
+
+    def test_attachment_downloads_are_bounded(self):
+        with deadline(0), self.assertRaises(DeadlineExceeded):
+            self.service.download_attachment(1, "a.txt")
+        self.session.request.assert_not_called()
+
+    def test_coalesced_callers_stop_polling_at_the_deadline(self):
+        cache.add("singleflight:k:lock", 1)
+        fn = MagicMock()
+        started = time.monotonic()
+        with deadline(0.2), self.assertRaises(DeadlineExceeded):
+            SingleFlight(wait=5).do("k", fn)
+        self.assertLess(time.monotonic() - started, 1)
+        fn.assert_not_called()
+
+    def test_idempotent_retries_stop_polling_at_the_deadline(self):
+        cache.add("key:lock", "fingerprint")
+        started = time.monotonic()
+        async def retry():
+            with deadline(0.2):
+                await Idempotency(ttl=60, wait=30, lock_timeout=60).arun(
+                    "key", "fingerprint", MagicMock()
+                )
+
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(retry())
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_sync_idempotent_retries_stop_polling_at_the_deadline(self):
+        cache.add("key:lock", "fingerprint")
+        started = time.monotonic()
+        with deadline(0.2), self.assertRaises(DeadlineExceeded):
+            Idempotency(ttl=60, wait=30, lock_timeout=60).run(
+                "key", "fingerprint", MagicMock()
+            )
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_uploads_fail_per_file(self):
+        files = [SimpleUploadedFile(name, b"x") for name in ("a", "b")]
+        with deadline(0):
+            attachments, errors = self.service.add_attachments(1, files)
+        self.assertEqual(attachments, [])
+        self.assertEqual(set(errors), {"a", "b"})
+
+
+@override_settings(REQUEST_DEADLINE=3)
+class DeadlineMiddlewareTests(SimpleTestCase):
+    def test_sync(self):
+        seen = []
+
+        def view(request):
+            seen.append(remaining())
+            return HttpResponse()
+
+        DeadlineMiddleware(view)(RequestFactory().get("/"))
+        self.assertLessEqual(seen[0], 3)
+        self.assertIsNone(remaining())
+
+    def test_async(self):
+        seen = []
+
+        async def view(request):
+            seen.append(remaining())
+            return HttpResponse()
+
+        asyncio.run(DeadlineMiddleware(view)(RequestFactory().get("/")))
+        self.assertLessEqual(seen[0], 3)
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from utils.batching import MicroBatcher
+from utils.deadline import DeadlineExceeded
+from utils.deadline import deadline
+from utils.jira import AsyncJiraService
+from utils.jira import JiraService
+
+
+def issue(issue_id):
+    return {"id": str(issue_id), "key": f"TPP-{issue_id}", "fields": {}}
+
+
+def search_response(payload):
+    # Answers like Jira: unknown ids are left out of the results.
+    ids = payload["jql"].removeprefix("id in (").removesuffix(")").split(", ")
+    ids = [int(i.removeprefix("TPP-")) for i in ids]
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"issues": [issue(i) for i in ids if i < 100]}
+    return response
+
+
+class DetailBatchingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.methods = []
+        self.service = JiraService(
+            base_url="https://jira.example.com",
+            issue_cache_ttl=0,
+            detail_batch_window=0.2,
+            detail_batch_size=4,
+        )
+
+        def request(method, path, json=None, **kwargs):
+            self.methods.append(method)
+            if method == "POST":
+                return search_response(json)
+            response = MagicMock(status_code=404)
+            response.raise_for_status.side_effect = ValueError(path)
+            return response
+
+        patcher = patch.object(self.service, "request", side_effect=request)
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch_all(self, ids):
+        with ThreadPoolExecutor(len(ids)) as pool:
+            return list(pool.map(self.service.fetch_ticket_detail, ids))
+
+    def test_concurrent_lookups_share_one_search(self):
+        self.assertEqual(self.fetch_all([1, 2, 3, 4]), [issue(i) for i in range(1, 5)])
+        self.assertEqual(self.request.call_count, 1)
+        method, path = self.request.call_args.args
+        self.assertEqual((method, path), ("POST", "search"))
+        payload = self.request.call_args.kwargs["json"]
+        self.assertEqual(payload["maxResults"], 4)
+        self.assertIn("attachment", payload["fields"])
+
+    def test_full_batch_is_sent_at_once(self):
+        self.service.detail_batcher.window = 10
+        self.assertEqual(len(self.fetch_all(list(range(1, 9)))), 8)
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_missing_issue_is_fetched_directly(self):
+        with self.assertRaisesMessage(ValueError, "/rest/api/2/issue/100"):
+            self.service.fetch_ticket_detail(100)
+        self.assertEqual(self.methods, ["POST", "GET"])
+
+    def test_keys_and_ids_are_matched(self):
+        self.assertEqual(self.service.fetch_ticket_detail("TPP-1"), issue(1))
+
+    def test_fetch_ticket_details(self):
+        details = self.service.fetch_ticket_details([3, 100, 1], fields=["summary"])
+        self.assertEqual(details, [issue(3), issue(1)])
+        self.assertEqual(self.methods, ["POST"])
+        self.assertEqual(self.request.call_args.kwargs["json"]["fields"], ["summary"])
+
+    def test_unsafe_ids_skip_the_batch(self):
+        with self.assertRaises(ValueError):
+            self.service.fetch_ticket_detail("1) OR (1")
+        self.assertEqual(self.methods, ["GET"])
+
+    def test_followers_keep_their_own_deadline(self):
+        release = threading.Event()
+
+        def fetch(group, keys):
+            release.wait(1)
+            return {key: key for key in keys}
+
+        def follower():
+            with deadline(0.05), self.assertRaises(DeadlineExceeded):
+                batcher.get("group", "2")
+
+        batcher = MicroBatcher(fetch, window=0.1)
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(batcher.get, "group", "1")
+            while "group" not in batcher._batches:
+                time.sleep(0.001)
+            pool.submit(follower).result()
+            release.set()
+            self.assertEqual(leader.result(), "1")
+
+    def test_batch_out_of_time_falls_back_for_others(self):
+        self.service.detail_batcher.fetch = MagicMock(side_effect=DeadlineExceeded)
+        with self.assertRaisesMessage(ValueError, "/rest/api/2/issue/1"):
+            self.service.fetch_ticket_detail(1)
+        self.assertEqual(self.methods, ["GET"])
+
+    def test_async(self):
+        service = AsyncJiraService(
+            base_url="https://jira.example.com",
+            issue_cache_ttl=0,
+            detail_batch_window=0.2,
+        )
+
+        async def request(method, path, json=None, **kwargs):
+            return search_response(json)
+
+        async def fetch_all():
+            return await asyncio.gather(
+                *(service.fetch_ticket_detail(i) for i in (1, 2, 3))
+            )
+
+        with patch.object(service, "request", side_effect=request) as mock:
+            self.assertEqual(asyncio.run(fetch_all()), [issue(i) for i in (1, 2, 3)])
+        self.assertEqual(mock.call_count, 1)
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+from django.test import SimpleTestCase
+
+from utils.circuitbreaker import CircuitBreaker
+from utils.hedging import HedgeBudget
+from utils.hedging import Hedger
+
+
+class HedgerTests(SimpleTestCase):
+    def setUp(self):
+        self.hedger = Hedger(workers=4)
+        self.addCleanup(lambda: self.hedger.executor.shutdown(wait=True))
+
+    def test_slow_call_is_hedged(self):
+        release = threading.Event()
+        slow, fast = MagicMock(), MagicMock()
+        calls = iter([slow, fast])
+
+        def send():
+            response = next(calls)
+            if response is slow:
+                release.wait(1)
+            return response
+
+        self.assertIs(self.hedger.call(send, 0.01), fast)
+        release.set()
+        self.hedger.executor.shutdown(wait=True)
+        # The losing response gives its connection back.
+        slow.close.assert_called_once()
+        self.assertEqual(
+            self.hedger.budget.stats(),
+            {"calls": 1, "hedged": 1, "won": 1, "denied": 0, "hedge_rate": 1},
+        )
+
+    def test_fast_call_is_not_hedged(self):
+        send = MagicMock()
+        self.assertIs(self.hedger.call(send, 1), send.return_value)
+        send.assert_called_once()
+
+    def test_budget_caps_hedges(self):
+        self.hedger.budget = HedgeBudget(ratio=0.5, burst=1)
+        send = MagicMock(side_effect=lambda: threading.Event().wait(0.05))
+        for _ in range(4):
+            self.hedger.call(send, 0.01)
+        stats = self.hedger.budget.stats()
+        self.assertEqual(stats["hedged"], 2)
+        self.assertEqual(stats["denied"], 2)
+        self.assertEqual(send.call_count, 6)
+
+    def test_errors_without_a_winner_propagate(self):
+        send = MagicMock(side_effect=ValueError)
+        with self.assertRaises(ValueError):
+            self.hedger.call(send, 1)
+
+    def test_no_delay_until_latencies_are_known(self):
+        breaker = CircuitBreaker("test")
+        self.assertIsNone(self.hedger.delay(breaker))
+        breaker.latencies.extend([0.1] * breaker.latencies.maxlen)
+        self.assertEqual(self.hedger.delay(breaker), 0.1)
+
+    def test_async(self):
+        calls = []
+
+        async def send():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                await asyncio.sleep(1)
+            return len(calls)
+
+        self.assertEqual(asyncio.run(self.hedger.acall(send, 0.01)), 2)
+        self.assertEqual(self.hedger.budget.stats()["won"], 1)
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from utils.idempotency import Idempotency
+from utils.idempotency import IdempotencyKeyFailed
+from utils.idempotency import IdempotencyKeyInUse
+from utils.idempotency import IdempotencyKeyMismatch
+from utils.idempotency import idempotent
+
+
+class View:
+    def __init__(self):
+        self.calls = 0
+
+    @idempotent
+    def create(self, request):
+        self.calls += 1
+        response = Response({"id": self.calls}, status=status.HTTP_201_CREATED)
+        response["Location"] = f"/tickets/{self.calls}/"
+        return response
+
+
+def post(data, key="k1", user_id=1):
+    request = APIRequestFactory().post("/tickets/", data, format="json")
+    request.data = data
+    request.user = MagicMock(pk=user_id)
+    if key:
+        request.META["HTTP_IDEMPOTENCY_KEY"] = key
+    return request
+
+
+class IdempotencyTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.view = View()
+
+    def test_replays_first_response(self):
+        first = self.view.create(post({"subject": "a"}))
+        second = self.view.create(post({"subject": "a"}))
+        self.assertEqual(self.view.calls, 1)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Location"], "/tickets/1/")
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+
+    def test_keys_are_per_user_and_optional(self):
+        self.view.create(post({"subject": "a"}))
+        self.view.create(post({"subject": "a"}, user_id=2))
+        self.view.create(post({"subject": "a"}, key=None))
+        self.assertEqual(self.view.calls, 3)
+
+    def test_key_reused_for_another_request(self):
+        self.view.create(post({"subject": "a"}))
+        with self.assertRaises(IdempotencyKeyMismatch):
+            self.view.create(post({"subject": "b"}))
+
+    def test_server_errors_are_not_replayed(self):
+        idempotency = Idempotency()
+        idempotency.run("key", "fp", lambda: Response(status=502))
+        view = MagicMock()
+        with self.assertRaises(IdempotencyKeyFailed):
+            idempotency.run("key", "fp", view)
+        view.assert_not_called()
+
+    def test_failure_after_the_write_keeps_the_key(self):
+        # e.g. the issue was created but attaching its files blew up.
+        idempotency = Idempotency()
+        with self.assertRaises(RuntimeError):
+            idempotency.run("key", "fp", MagicMock(side_effect=RuntimeError))
+        view = MagicMock()
+        with self.assertRaises(IdempotencyKeyFailed):
+            idempotency.run("key", "fp", view)
+        view.assert_not_called()
+
+    def test_client_errors_free_the_key(self):
+        idempotency = Idempotency()
+        with self.assertRaises(ValidationError):
+            idempotency.run("key", "fp", MagicMock(side_effect=ValidationError()))
+        response = idempotency.run("key", "fp", lambda: Response(status=201))
+        self.assertEqual(response.status_code, 201)
+
+    def test_concurrent_retry_waits_for_the_response(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return Response({"id": 1}, status=201)
+
+        idempotency = Idempotency(wait=5)
+        thread = threading.Thread(target=idempotency.run, args=("key", "fp", slow))
+        thread.start()
+        started.wait(5)
+        threading.Timer(0.2, release.set).start()
+        view = MagicMock()
+        response = idempotency.run("key", "fp", view)
+        thread.join()
+        view.assert_not_called()
+        self.assertEqual(response.data, {"id": 1})
+
+    def test_concurrent_retry_gives_up_after_wait(self):
+        cache.add("key:lock", "fp")
+        view = MagicMock()
+        with self.assertRaises(IdempotencyKeyInUse) as e:
+            Idempotency(wait=0.2).run("key", "fp", view)
+        self.assertEqual(e.exception.wait, 1)
+        view.assert_not_called()
+
+    def test_async(self):
+        calls = []
+
+        async def view():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return Response({"id": 1}, status=201)
+
+        async def run():
+            idempotency = Idempotency(wait=5)
+            return await asyncio.gather(
+                idempotency.arun("key", "fp", view), idempotency.arun("key", "fp", view)
+            )
+
+        first, second = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(first.data, second.data)
@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+from itertools import count
+from unittest.mock import MagicMock
+
+import requests
+from django.test import TransactionTestCase
+from django.test import override_settings
+
+from tickets.models import Attachment
+from tickets.models import FollowUp
+from tickets.models import Ticket
+from tickets.services import JiraBackfill
+from tickets.tests.factories import AttachmentFactory
+from tickets.tests.factories import FollowUpFactory
+from tickets.tests.factories import TicketFactory
+from utils.circuitbreaker import CircuitOpen
+
+
+class JiraBackfillTests(TransactionTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        ids = count(1)
+        self.service = MagicMock(ISSUE_TYPE_MAPPING={}, CATEGORY_MAPPING={})
+        self.service.create_issue.side_effect = lambda **kw: {"id": str(next(ids))}
+        self.service.create_comment.side_effect = lambda *a: {"id": str(next(ids))}
+        self.service.upload_attachments.side_effect = lambda issue_id, files: [
+            {"id": str(next(ids))} for _ in files
+        ]
+
+        self.ticket = TicketFactory(attachments=[AttachmentFactory()])
+        self.followups = FollowUpFactory.create_batch(2, ticket=self.ticket)
+        self.followups[1].attachments.add(AttachmentFactory())
+
+    def run_backfill(self):
+        backfill = JiraBackfill(self.service, workers=2)
+        return dict(backfill.run(backfill.pending()))
+
+    def test_copies_ticket_followups_and_attachments(self):
+        results = self.run_backfill()
+
+        self.assertEqual(
+            dict(results[self.ticket.pk]),
+            {"issues": 1, "comments": 2, "attachments": 2},
+        )
+        self.ticket.refresh_from_db()
+        self.assertTrue(self.ticket.jira_issue_id)
+        self.assertFalse(FollowUp.objects.filter(jira_comment_id="").exists())
+        self.assertFalse(Attachment.objects.filter(jira_attachment_id="").exists())
+        self.assertFalse(JiraBackfill.pending().exists())
+        self.assertEqual(
+            [c.args[0] for c in self.service.create_comment.call_args_list],
+            [self.ticket.jira_issue_id] * 2,
+        )
+
+    def test_failed_rows_are_resumed(self):
+        self.service.create_comment.side_effect = [
+            {"id": "c1"},
+            requests.HTTPError("500"),
+        ]
+        results = self.run_backfill()
+        self.assertIsInstance(results[self.ticket.pk], requests.HTTPError)
+        self.assertEqual(list(JiraBackfill.pending()), [self.ticket.pk])
+
+        self.service.create_comment.side_effect = [{"id": "c2"}]
+        results = self.run_backfill()
+
+        self.assertEqual(
+            dict(results[self.ticket.pk]), {"comments": 1, "attachments": 1}
+        )
+        self.service.create_issue.assert_called_once()
+        self.assertEqual(
+            list(FollowUp.objects.values_list("jira_comment_id", flat=True)),
+            ["c1", "c2"],
+        )
+
+    def test_backs_off_while_circuit_is_open(self):
+        self.service.create_issue.side_effect = [CircuitOpen(wait=0), {"id": "1"}]
+        backfill = JiraBackfill(self.service, retries=2)
+        backfill.copy_with_retries(self.ticket.pk)
+        self.assertEqual(Ticket.objects.get().jira_issue_id, "1")
@@ -0,0 +1,74 @@
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+
+from tickets.models import JiraIssue
+from tickets.models import JiraSyncCursor
+from tickets.services import JiraIssueSync
+from tickets.tests.factories import JiraIssueDataFactory
+
+
+def issues_updated_at(*minutes):
+    return [
+        JiraIssueDataFactory(fields__created=f"2024-01-01T10:{minute}:00.000+0330")
+        for minute in minutes
+    ]
+
+
+class JiraIssueSyncTests(TestCase):
+    def setUp(self):
+        self.service = MagicMock(default_project_key="TPP")
+        self.sync = JiraIssueSync(self.service, "test", page_size=2)
+
+    def search_results(self, *pages):
+        # Every page but the last reports more issues after it.
+        def search_issues(jql, start_at, max_results, fields):
+            issues = next(results)
+            more = 0 if results.__length_hint__() == 0 else 1
+            return {
+                "issues": issues,
+                "startAt": start_at,
+                "maxResults": max_results,
+                "total": start_at + len(issues) + more,
+            }
+
+        results = iter(pages)
+        self.service.search_issues.side_effect = search_issues
+
+    def test_sync_resumes_after_last_page(self):
+        self.search_results(issues_updated_at("01", "02"), issues_updated_at("02"))
+        self.assertEqual(self.sync.run(), 3)
+        self.assertEqual(JiraIssue.objects.count(), 3)
+
+        first, second = self.service.search_issues.call_args_list
+        self.assertEqual(
+            first.args[0], 'project = "TPP" ORDER BY updated ASC, key ASC'
+        )
+        self.assertEqual(first.kwargs["start_at"], 0)
+        # The second page skips the issue already stored in minute 10:02.
+        self.assertIn('updated >= "2024/01/01 10:02"', second.args[0])
+        self.assertEqual(second.kwargs["start_at"], 1)
+
+        cursor = JiraSyncCursor.objects.get(name="test")
+        self.assertEqual(cursor.offset, 0)
+
+    def test_offset_grows_within_a_minute(self):
+        self.search_results(*[issues_updated_at("01", "01")] * 3)
+        self.assertEqual(self.sync.run(max_pages=2), 4)
+        cursor = JiraSyncCursor.objects.get(name="test")
+        self.assertEqual(cursor.offset, 4)
+
+    def test_short_page_is_not_the_end(self):
+        # Jira returns fewer issues than asked for while more remain.
+        self.sync.page_size = 1000
+        self.search_results(issues_updated_at("01", "02"), issues_updated_at("03"))
+        self.assertEqual(self.sync.run(), 3)
+        self.assertEqual(self.service.search_issues.call_count, 2)
+
+    def test_resumes_from_saved_cursor(self):
+        self.search_results(issues_updated_at("01", "02"), issues_updated_at("03"))
+        self.sync.run(max_pages=1)
+        self.sync.run()
+        resumed = self.service.search_issues.call_args_list[1]
+        self.assertIn('updated >= "2024/01/01 10:02"', resumed.args[0])
+        self.assertEqual(resumed.kwargs["start_at"], 1)
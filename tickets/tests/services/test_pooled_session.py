@@ -0,0 +1,27 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from utils.http import PooledSession
+
+
+class PooledSessionTests(SimpleTestCase):
+    def test_session_is_shared(self):
+        pool = PooledSession(pool_size=4)
+        self.assertIs(pool.get(), pool.get())
+
+    def test_session_is_rebuilt_after_fork(self):
+        pool = PooledSession()
+        session = pool.get()
+        with patch("utils.http.os.getpid", return_value=-1):
+            self.assertIsNot(pool.get(), session)
+
+    def test_pool_size(self):
+        pool = PooledSession(pool_size=7, pool_block=True)
+        adapter = pool.get().get_adapter("https://jira.example.com")
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertTrue(adapter._pool_block)
+
+    def test_keep_alive_disabled(self):
+        pool = PooledSession(keep_alive=False)
+        self.assertEqual(pool.get().headers["Connection"], "close")
@@ -0,0 +1,115 @@
+import asyncio
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import httpx
+import requests
+from django.test import SimpleTestCase
+
+from utils.ratelimit import JiraRateLimiter
+from utils.ratelimit import RateLimited
+from utils.ratelimit import RateLimitedAdapter
+from utils.ratelimit import RateLimitedTransport
+from utils.ratelimit import TokenBucket
+
+
+def limiter(**kwargs):
+    rates = {"read": 10, "write": 10, "attachment": 10}
+    return JiraRateLimiter(rates, burst=0.1, jitter=0, **kwargs)
+
+
+@patch("utils.ratelimit.time.sleep")
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        TokenBucket._local.clear()
+
+    def test_queued_calls_are_spaced_at_the_rate(self, sleep):
+        bucket = TokenBucket("test", rate=10, burst=1, max_wait=0.25)
+        waits = [bucket.acquire() for _ in range(3)]
+        self.assertEqual(waits[0], 0)
+        self.assertAlmostEqual(waits[1], 0.1, places=2)
+        self.assertAlmostEqual(waits[2], 0.2, places=2)
+
+        with self.assertRaises(RateLimited):
+            bucket.acquire()
+        # Refused calls do not hold a reservation.
+        self.assertAlmostEqual(bucket.take(), -0.3, places=2)
+
+    def test_penalty_delays_the_next_call(self, sleep):
+        bucket = TokenBucket("test", rate=10, burst=5, max_wait=5)
+        bucket.penalize(2)
+        self.assertAlmostEqual(bucket.acquire(), 2.1, places=2)
+
+        bucket.penalize(30)
+        with self.assertRaises(RateLimited):
+            bucket.acquire()
+
+
+class JiraRateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        TokenBucket._local.clear()
+
+    def test_buckets(self):
+        for method, url, name in (
+            ("GET", "https://jira/rest/api/2/issue/1", "read"),
+            ("POST", "https://jira/rest/api/2/search", "read"),
+            ("POST", "https://jira/rest/api/2/issue/1/comment", "write"),
+            ("POST", "https://jira/rest/api/2/issue/1/attachments", "attachment"),
+            ("GET", "https://jira/secure/attachment/5/a.png", "attachment"),
+        ):
+            self.assertEqual(JiraRateLimiter.bucket_name(method, url), name)
+
+    def test_backoff(self):
+        retry_after = MagicMock(headers={"Retry-After": "7"})
+        self.assertEqual(limiter().backoff(retry_after, 0), 7)
+        self.assertEqual(limiter().backoff(MagicMock(headers={}), 2), 4)
+
+    @patch("utils.ratelimit.time.sleep")
+    @patch("requests.adapters.HTTPAdapter.send")
+    def test_adapter_retries_throttled_calls(self, send, sleep):
+        throttled = requests.Response()
+        throttled.status_code = 429
+        throttled.raw = MagicMock()
+        throttled.headers["Retry-After"] = "1"
+        ok = requests.Response()
+        ok.status_code = 200
+        send.side_effect = [throttled, ok]
+
+        adapter = RateLimitedAdapter(limiter())
+        request = requests.Request("GET", "https://jira/rest/api/2/issue/1").prepare()
+        response = adapter.send(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(send.call_count, 2)
+        # The retry waited out the Retry-After.
+        self.assertGreaterEqual(max(call.args[0] for call in sleep.call_args_list), 1)
+
+    @patch("utils.ratelimit.time.sleep")
+    @patch("requests.adapters.HTTPAdapter.send")
+    def test_adapter_gives_up_after_retries(self, send, sleep):
+        throttled = requests.Response()
+        throttled.status_code = 429
+        throttled.raw = MagicMock()
+        send.return_value = throttled
+
+        adapter = RateLimitedAdapter(limiter(retries=1, max_wait=60))
+        request = requests.Request("POST", "https://jira/rest/api/2/search").prepare()
+        self.assertEqual(adapter.send(request).status_code, 429)
+        self.assertEqual(send.call_count, 2)
+
+    def test_transport(self):
+        responses = iter([httpx.Response(429), httpx.Response(200)])
+        transport = RateLimitedTransport(
+            httpx.MockTransport(lambda request: next(responses)),
+            limiter(max_wait=60),
+        )
+
+        async def run():
+            with patch("utils.ratelimit.asyncio.sleep") as sleep:
+                async with httpx.AsyncClient(transport=transport) as client:
+                    response = await client.get("https://jira/rest/api/2/issue/1")
+            return response, sleep
+
+        response, sleep = asyncio.run(run())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(sleep.called)
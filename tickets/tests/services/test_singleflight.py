@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from utils.singleflight import AsyncSingleFlight
+from utils.singleflight import SingleFlight
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_calls_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(1)
+            return {"id": "1"}
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(flights.do, "k", fetch) for _ in range(5)]
+            time.sleep(0.1)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"id": "1"}] * 5)
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flights = SingleFlight()
+
+        def fail():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            flights.do("k", fail)
+        self.assertEqual(flights.do("k", lambda: 1), 1)
+
+    def test_waits_for_result_of_other_process(self):
+        flights = SingleFlight(wait=1)
+        cache.add("singleflight:k:lock", 1)
+
+        def publish():
+            time.sleep(0.1)
+            cache.set("singleflight:k", (time.time(), "theirs"))
+
+        threading.Thread(target=publish).start()
+        self.assertEqual(flights.do("k", lambda: "mine"), "theirs")
+
+    def test_runs_call_when_other_process_gives_up(self):
+        flights = SingleFlight(wait=1)
+        cache.add("singleflight:k:lock", 1)
+        threading.Timer(0.1, cache.delete, args=("singleflight:k:lock",)).start()
+        self.assertEqual(flights.do("k", lambda: "mine"), "mine")
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_calls_share_one_call(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"id": "1"}
+
+        async def run():
+            return await asyncio.gather(*(flights.do("k", fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), [{"id": "1"}] * 5)
+        self.assertEqual(len(calls), 1)
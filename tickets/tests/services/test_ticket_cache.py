@@ -0,0 +1,114 @@
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from utils.jira import JiraService
+
+
+def jira_response(data):
+    response = MagicMock()
+    response.json.return_value = data
+    return response
+
+
+class TicketDetailCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = JiraService(base_url="https://jira.example.com")
+        patcher = patch.object(
+            self.service, "request", return_value=jira_response({"id": "1"})
+        )
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_detail_is_cached(self):
+        self.assertEqual(self.service.fetch_ticket_detail(1), {"id": "1"})
+        self.assertEqual(self.service.fetch_ticket_detail(1), {"id": "1"})
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_invalidate(self):
+        self.service.fetch_ticket_detail(1)
+        self.service.invalidate_ticket(1)
+        self.service.fetch_ticket_detail(1)
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_partial_reads_are_not_cached(self):
+        self.service.fetch_ticket_detail(1, fields=["summary"])
+        self.service.fetch_ticket_detail(1, fields=["summary"])
+        self.assertEqual(self.request.call_count, 2)
+
+
+class TicketListCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = JiraService(base_url="https://jira.example.com")
+        patcher = patch.object(
+            self.service, "request", return_value=jira_response({"issues": []})
+        )
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_list_is_cached_per_page(self):
+        self.service.fetch_tickets(customer_id="7", page=1)
+        self.service.fetch_tickets(customer_id="7", page=1)
+        self.service.fetch_tickets(customer_id="7", page=2)
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_stale_page_is_served_while_refreshing(self):
+        self.service.fetch_tickets(customer_id="7")
+        self.request.return_value = jira_response({"issues": [{"id": "1"}]})
+        with (
+            patch("utils.cache.time") as clock,
+            patch("utils.cache.threading.Thread") as thread,
+        ):
+            clock.time.return_value = 2**32
+            self.assertEqual(
+                self.service.fetch_tickets(customer_id="7"), {"issues": []}
+            )
+            # A second stale read does not start another refresh.
+            self.service.fetch_tickets(customer_id="7")
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+    def test_invalidate_lists(self):
+        self.service.fetch_tickets(customer_id="7")
+        self.service.fetch_tickets(customer_id="8")
+        self.service.fetch_tickets()
+        self.service.invalidate_ticket_lists("7")
+        self.service.fetch_tickets(customer_id="7")
+        self.service.fetch_tickets(customer_id="8")
+        self.service.fetch_tickets()
+        self.assertEqual(self.request.call_count, 5)
+
+
+class FieldProfileTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = JiraService(base_url="https://jira.example.com")
+
+    def test_detail_path(self):
+        self.assertEqual(
+            self.service.ticket_detail_path(1, ["summary", "status"], ["names"]),
+            "/rest/api/2/issue/1?fields=summary,status&expand=names",
+        )
+
+    def test_profiles_are_cached_apart_and_invalidated_together(self):
+        with patch.object(
+            self.service, "request", return_value=jira_response({"id": "1"})
+        ) as request:
+            self.service.fetch_ticket_detail(1)
+            self.service.fetch_ticket_detail(1, profile="ownership")
+            self.assertIn("fields=customfield_10200", request.call_args.kwargs["path"])
+            self.service.invalidate_ticket(1)
+            self.service.fetch_ticket_detail(1)
+            self.service.fetch_ticket_detail(1, profile="ownership")
+        self.assertEqual(request.call_count, 4)
+
+    def test_search_payload_uses_list_profile(self):
+        payload = self.service.search_payload()
+        self.assertIn("summary", payload["fields"])
+        self.assertNotIn("watches", payload["fields"])
+        payload = self.service.search_payload(fields=("summary",))
+        self.assertEqual(payload["fields"], ["summary"])
@@ -0,0 +1,136 @@
+import shutil
+import tempfile
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import requests
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+from rest_framework.test import force_authenticate
+
+from tickets.models import Attachment
+from tickets.models import TicketOperation
+from tickets.tasks import create_jira_ticket
+from tickets.views import TicketViewSet
+from users.factories import UserFactory
+
+ISSUE = {
+    "customer_id": "1",
+    "summary": "Subject",
+    "description": "Description",
+    "issue_type": "Task",
+    "project_key": "TPP",
+    "user_full_name": "A B",
+    "user_email": "a@example.com",
+    "category_field": None,
+}
+
+
+def rejected(status_code):
+    response = MagicMock(status_code=status_code, text="bad summary")
+    return requests.HTTPError(response=response)
+
+
+class TicketOperationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.other_user = UserFactory()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = patch("tickets.services.jira_service")
+        self.jira_service = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.jira_service.create_issue.return_value = {"id": "10", "key": "TPP-1"}
+        self.jira_service.add_attachments.return_value = ([{"id": "5"}], {})
+
+    def operation(self, **kwargs):
+        return TicketOperation.objects.create_operation(
+            self.user, {**ISSUE, **kwargs}, [SimpleUploadedFile("a.txt", b"hi")]
+        )
+
+    def test_creates_issue_and_uploads_attachments(self):
+        operation = self.operation()
+        create_jira_ticket(str(operation.pk))
+
+        operation.refresh_from_db()
+        self.assertEqual(operation.status, TicketOperation.SUCCEEDED)
+        self.assertEqual(operation.issue_key, "TPP-1")
+        self.assertEqual(
+            operation.result, {"id": "10", "key": "TPP-1", "attachments": [{"id": "5"}]}
+        )
+        self.jira_service.create_issue.assert_called_once_with(**ISSUE)
+        ticket_id, files = self.jira_service.add_attachments.call_args.args
+        self.assertEqual(ticket_id, "10")
+        self.assertEqual([f.name for f in files], ["a.txt"])
+        self.assertFalse(Attachment.objects.exists())
+        self.jira_service.invalidate_ticket_lists.assert_called_once_with("1")
+
+    def test_outage_is_retried_without_creating_twice(self):
+        operation = self.operation()
+        self.jira_service.add_attachments.side_effect = requests.ConnectionError
+        with self.assertRaises(requests.ConnectionError):
+            create_jira_ticket(str(operation.pk))
+
+        operation.refresh_from_db()
+        self.assertEqual(operation.status, TicketOperation.RUNNING)
+        self.assertEqual(operation.issue_id, "10")
+
+        self.jira_service.add_attachments.side_effect = None
+        create_jira_ticket(str(operation.pk))
+        operation.refresh_from_db()
+        self.assertEqual(operation.status, TicketOperation.SUCCEEDED)
+        self.jira_service.create_issue.assert_called_once()
+
+    def test_rejected_issue_fails(self):
+        operation = self.operation()
+        self.jira_service.create_issue.side_effect = rejected(400)
+        create_jira_ticket(str(operation.pk))
+
+        operation.refresh_from_db()
+        self.assertEqual(operation.status, TicketOperation.FAILED)
+        self.assertEqual(operation.error, "bad summary")
+        self.assertFalse(Attachment.objects.exists())
+
+    def post(self, user, data):
+        request = APIRequestFactory().post("/", data, format="multipart")
+        request.is_admin_host = False
+        force_authenticate(request, user)
+        return TicketViewSet.as_view({"post": "create"})(request)
+
+    @override_settings(TICKETS_ASYNC_CREATE=True)
+    @patch("tickets.views.create_jira_ticket.delay")
+    def test_create_returns_202(self, delay):
+        data = {"cat": 1, "subject": "Subject", "description": "Description"}
+        data["file"] = SimpleUploadedFile("a.txt", b"hi")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post(self.user, data)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        operation = TicketOperation.objects.get()
+        delay.assert_called_once_with(str(operation.pk))
+        self.assertEqual(operation.issue["summary"], "Subject")
+        self.assertEqual(operation.attachments.count(), 1)
+        self.assertTrue(response["Location"].endswith(f"/operations/{operation.pk}/"))
+
+    def test_retrieve_operation(self):
+        operation = self.operation()
+        view = TicketViewSet.as_view({"get": "retrieve_operation"})
+
+        for user, expected in (
+            (self.user, status.HTTP_200_OK),
+            (self.other_user, status.HTTP_404_NOT_FOUND),
+        ):
+            request = APIRequestFactory().get("/")
+            request.is_admin_host = False
+            force_authenticate(request, user)
+            response = view(request, operation_id=operation.pk)
+            self.assertEqual(response.status_code, expected)
@@ -0,0 +1,91 @@
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+from rest_framework.test import APITestCase
+from rest_framework.test import force_authenticate
+
+from tickets.models import JiraIssue
+from tickets.tests.factories import JiraIssueDataFactory
+from tickets.views import AsyncTicketViewSet
+from users.factories import UserFactory
+
+
+class AsyncTicketViewSetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.other_user = UserFactory()
+
+    def get(self, actions, user, data=None, **kwargs):
+        request = APIRequestFactory().get("/", data)
+        request.is_admin_host = False
+        force_authenticate(request, user)
+        view = AsyncTicketViewSet.as_view(actions)
+        return async_to_sync(view)(request, **kwargs)
+
+    @patch("tickets.views.async_jira_service.fetch_ticket_detail", new_callable=AsyncMock)
+    def test_retrieve(self, fetch_ticket_detail):
+        fetch_ticket_detail.return_value = {
+            "id": "1",
+            "fields": {"customfield_10200": str(self.user.pk)},
+        }
+        response = self.get({"get": "retrieve"}, self.user, ticket_id=1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], "1")
+
+    @patch("tickets.views.async_jira_service.fetch_ticket_detail", new_callable=AsyncMock)
+    def test_retrieve_other_user(self, fetch_ticket_detail):
+        fetch_ticket_detail.return_value = {
+            "id": "1",
+            "fields": {"customfield_10200": str(self.user.pk)},
+        }
+        response = self.get({"get": "retrieve"}, self.other_user, ticket_id=1)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch("tickets.views.async_jira_service.fetch_ticket_comments", new_callable=AsyncMock)
+    @patch("tickets.views.async_jira_service.fetch_ticket_detail", new_callable=AsyncMock)
+    def test_fetch_comments(self, fetch_ticket_detail, fetch_ticket_comments):
+        fetch_ticket_detail.return_value = {
+            "id": "1",
+            "fields": {"customfield_10200": str(self.user.pk)},
+        }
+        fetch_ticket_comments.return_value = {"comments": []}
+        response = self.get({"get": "fetch_comments"}, self.user, ticket_id=1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"comments": []})
+
+    @override_settings(TICKETS_LIST_SOURCE="local")
+    def test_list_from_mirror(self):
+        issue = JiraIssueDataFactory(fields__customfield_10200=str(self.user.pk))
+        JiraIssue.objects.upsert([issue, JiraIssueDataFactory()])
+        response = self.get({"get": "list"}, self.user)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 1)
+        self.assertEqual(response.data["issues"][0]["id"], issue["id"])
+        # Mirrored issues are narrowed to the list profile.
+        self.assertNotIn("project", response.data["issues"][0]["fields"])
+
+    @patch("tickets.views.async_jira_service.fetch_ticket_detail", new_callable=AsyncMock)
+    def test_retrieve_sparse_fields(self, fetch_ticket_detail):
+        fetch_ticket_detail.return_value = {
+            "id": "1",
+            "fields": {"customfield_10200": str(self.user.pk), "summary": "Hi"},
+        }
+        response = self.get(
+            {"get": "retrieve"}, self.user, {"fields": "summary"}, ticket_id=1
+        )
+        self.assertEqual(response.data, {"id": "1", "fields": {"summary": "Hi"}})
+        self.assertEqual(
+            fetch_ticket_detail.call_args.kwargs["fields"],
+            ("summary", "customfield_10200"),
+        )
+
+    def test_retrieve_unknown_field(self):
+        response = self.get(
+            {"get": "retrieve"}, self.user, {"fields": "watches"}, ticket_id=1
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,115 @@
+import re
+from pathlib import Path
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils.translation import override
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+from rest_framework.test import APITestCase
+from rest_framework.test import force_authenticate
+
+from tickets.views import AsyncTicketViewSet
+from tickets.views import TicketViewSet
+from users.factories import UserFactory
+
+
+@patch("tickets.views.jira_service.download_attachment")
+@patch("tickets.views.jira_service.fetch_ticket_detail")
+class AttachmentAccessTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.other_user = UserFactory()
+
+    def ticket(self):
+        return {
+            "id": "1",
+            "fields": {
+                "customfield_10200": str(self.user.pk),
+                "attachment": [{"id": "5", "filename": "report.pdf"}],
+            },
+        }
+
+    def get(self, user, filename="report.pdf", attachment_id=5, admin_host=False):
+        request = APIRequestFactory().get("/")
+        request.is_admin_host = admin_host
+        force_authenticate(request, user)
+        view = TicketViewSet.as_view({"get": "download_attachment"})
+        return view(
+            request, ticket_id=1, attachment_id=attachment_id, filename=filename
+        )
+
+    def test_owner(self, fetch_ticket_detail, download_attachment):
+        fetch_ticket_detail.return_value = self.ticket()
+        download_attachment.return_value = HttpResponse(b"x")
+        response = self.get(self.user)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = fetch_ticket_detail.call_args.kwargs["profile"]
+        self.assertEqual(profile, "attachments")
+        download_attachment.assert_called_once()
+
+    def test_other_user(self, fetch_ticket_detail, download_attachment):
+        fetch_ticket_detail.return_value = self.ticket()
+        response = self.get(self.other_user)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        download_attachment.assert_not_called()
+
+    def test_admin_host(self, fetch_ticket_detail, download_attachment):
+        fetch_ticket_detail.return_value = self.ticket()
+        download_attachment.return_value = HttpResponse(b"x")
+        response = self.get(self.other_user, admin_host=True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_attachment_of_another_ticket(self, fetch_ticket_detail, download):
+        fetch_ticket_detail.return_value = self.ticket()
+        response = self.get(self.user, attachment_id=6)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        download.assert_not_called()
+
+    def test_wrong_filename(self, fetch_ticket_detail, download_attachment):
+        fetch_ticket_detail.return_value = self.ticket()
+        response = self.get(self.user, filename="other.pdf")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        download_attachment.assert_not_called()
+
+    @patch(
+        "tickets.views.async_jira_service.fetch_ticket_detail", new_callable=AsyncMock
+    )
+    def test_async_other_user(self, async_fetch, fetch_ticket_detail, download):
+        async_fetch.return_value = self.ticket()
+        request = APIRequestFactory().get("/")
+        request.is_admin_host = False
+        force_authenticate(request, self.other_user)
+        view = AsyncTicketViewSet.as_view({"get": "download_attachment"})
+        response = async_to_sync(view)(
+            request, ticket_id=1, attachment_id=5, filename="report.pdf"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AttachmentRouteTests(SimpleTestCase):
+    def rule(self):
+        compose = Path(__file__).parents[3] / "docker-compose.production.yml"
+        rule = re.search(
+            r"ticketingapi-attachments\.rule=.*PathRegexp\(`([^`]+)`\)",
+            compose.read_text(),
+        )
+        return re.compile(rule.group(1))
+
+    def test_nginx_serves_downloads(self):
+        kwargs = {"ticket_id": 1, "attachment_id": 5, "filename": "report.pdf"}
+        for language in ("en", "fa"):
+            with override(language):
+                url = reverse("download-attachment", kwargs=kwargs)
+            self.assertRegex(url, self.rule())
+        self.assertRegex("/tickets/attachment-files/5/report.pdf", self.rule())
+
+    def test_nginx_leaves_other_routes(self):
+        with override("en"):
+            url = reverse("comment-list", kwargs={"ticket_id": 1})
+        self.assertNotRegex(url, self.rule())
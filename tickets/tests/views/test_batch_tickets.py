@@ -0,0 +1,71 @@
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+from rest_framework.test import APITestCase
+from rest_framework.test import force_authenticate
+
+from tickets.views import AsyncTicketViewSet
+from tickets.views import TicketViewSet
+from users.factories import UserFactory
+
+
+class BatchTicketsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.other_user = UserFactory()
+
+    def issue(self, issue_id, owner):
+        return {
+            "id": str(issue_id),
+            "fields": {"summary": "s", "customfield_10200": str(owner.pk)},
+        }
+
+    def get(self, ids, viewset=TicketViewSet, admin_host=False, **params):
+        request = APIRequestFactory().get("/", {"ids": ids, **params})
+        request.is_admin_host = admin_host
+        force_authenticate(request, self.user)
+        view = viewset.as_view({"get": "retrieve_batch"})
+        if viewset is AsyncTicketViewSet:
+            return async_to_sync(view)(request)
+        return view(request)
+
+    @patch("tickets.views.jira_service.fetch_ticket_details")
+    def test_only_own_tickets_are_returned(self, fetch_ticket_details):
+        fetch_ticket_details.return_value = [
+            self.issue(1, self.user),
+            self.issue(2, self.other_user),
+        ]
+        response = self.get("1,2,3,1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([i["id"] for i in response.data["issues"]], ["1"])
+        self.assertEqual(fetch_ticket_details.call_args.args[0], [1, 2, 3])
+
+    @patch("tickets.views.jira_service.fetch_ticket_details")
+    def test_admin_host_sees_all(self, fetch_ticket_details):
+        fetch_ticket_details.return_value = [
+            self.issue(1, self.user),
+            self.issue(2, self.other_user),
+        ]
+        response = self.get("1,2", admin_host=True, fields="summary")
+        self.assertEqual(len(response.data["issues"]), 2)
+        self.assertEqual(response.data["issues"][1]["fields"], {"summary": "s"})
+
+    @override_settings(TICKETS_BATCH_MAX_IDS=2)
+    def test_invalid_ids(self):
+        for ids in ("", "1,x", "1,2,3"):
+            response = self.get(ids)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch(
+        "tickets.views.async_jira_service.fetch_ticket_details", new_callable=AsyncMock
+    )
+    def test_async(self, fetch_ticket_details):
+        fetch_ticket_details.return_value = [self.issue(1, self.user)]
+        response = self.get("1", viewset=AsyncTicketViewSet)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["issues"]), 1)
@@ -0,0 +1,96 @@
+import asyncio
+from unittest.mock import patch
+
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+from rest_framework.test import force_authenticate
+
+from tickets.views import BULKHEADS
+from tickets.views import TicketViewSet
+from users.factories import UserFactory
+from utils.bulkhead import Bulkhead
+
+
+class BulkheadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.staff = UserFactory(is_staff=True)
+
+    def get(self, action, user=None, **kwargs):
+        request = APIRequestFactory().get("/")
+        request.is_admin_host = user is self.staff
+        force_authenticate(request, user or self.user)
+        return TicketViewSet.as_view({"get": action})(request, **kwargs)
+
+    @patch("tickets.views.jira_service")
+    @patch.dict(BULKHEADS, {"detail": Bulkhead("detail", 1, retry_after=2)})
+    def test_full_pool_answers_503(self, jira_service):
+        def fetch_ticket_detail(**kwargs):
+            # A second request arrives while this one waits on Jira.
+            nested.append(self.get("retrieve", ticket_id=1))
+            return {"fields": {jira_service.customer_id_field: str(self.user.pk)}}
+
+        nested = []
+        jira_service.fetch_ticket_detail.side_effect = fetch_ticket_detail
+        response = self.get("retrieve", ticket_id=1)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(nested[0].status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(nested[0]["Retry-After"], "2")
+        self.assertEqual(
+            BULKHEADS["detail"].stats(),
+            {"size": 1, "in_use": 0, "peak": 1, "admitted": 1, "rejected": 1},
+        )
+
+    @patch("tickets.views.jira_service")
+    @patch.dict(BULKHEADS, {"attachments": Bulkhead("attachments", 1)})
+    def test_streamed_attachment_holds_slot_until_closed(self, jira_service):
+        jira_service.fetch_ticket_detail.return_value = {
+            "fields": {
+                jira_service.customer_id_field: str(self.user.pk),
+                "attachment": [{"id": "1", "filename": "a"}],
+            }
+        }
+        jira_service.download_attachment.return_value = StreamingHttpResponse([b"x"])
+        response = self.get(
+            "download_attachment", ticket_id=1, attachment_id=1, filename="a"
+        )
+        self.assertEqual(BULKHEADS["attachments"].in_use, 1)
+        response.close()
+        self.assertEqual(BULKHEADS["attachments"].in_use, 0)
+
+    def test_sent_body_releases_the_slot(self):
+        bulkhead = Bulkhead("attachments", 1)
+        bulkhead.acquire()
+        response = StreamingHttpResponse([b"a", b"b"])
+        bulkhead.hold(response)
+        self.assertEqual(b"".join(response), b"ab")
+        self.assertEqual(bulkhead.in_use, 0)
+        # Closing afterwards does not release it twice.
+        response.close()
+        self.assertEqual(bulkhead.in_use, 0)
+
+    def test_async_body_releases_the_slot(self):
+        async def body():
+            yield b"a"
+
+        async def consume(response):
+            return [chunk async for chunk in response]
+
+        bulkhead = Bulkhead("attachments", 1)
+        bulkhead.acquire()
+        response = StreamingHttpResponse(body())
+        bulkhead.hold(response)
+        self.assertTrue(response.is_async)
+        self.assertEqual(asyncio.run(consume(response)), [b"a"])
+        self.assertEqual(bulkhead.in_use, 0)
+
+    def test_stats_are_admin_only(self):
+        response = self.get("worker_stats")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.get("worker_stats", user=self.staff)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["bulkheads"]), set(BULKHEADS))
@@ -1,19 +1,29 @@
+from django.conf import settings
 from django.urls import path
 
+from .views import AsyncTicketViewSet
 from .views import TicketViewSet
 
 # from  import JiraTicketUpdateHook  # 👈 Import from jira app
 
-ticket_list = TicketViewSet.as_view({"get": "list", "post": "create"})
-ticket_detail = TicketViewSet.as_view({"get": "retrieve"})
-comment_list = TicketViewSet.as_view({"get": "fetch_comments", "post": "create_comments"})
-download_attachment = TicketViewSet.as_view({"get": "download_attachment"})
+viewset = AsyncTicketViewSet if settings.TICKETS_ASYNC_VIEWS else TicketViewSet
+
+ticket_list = viewset.as_view({"get": "list", "post": "create"})
+ticket_detail = viewset.as_view({"get": "retrieve"})
+ticket_batch = viewset.as_view({"get": "retrieve_batch"})
+comment_list = viewset.as_view({"get": "fetch_comments", "post": "create_comments"})
+download_attachment = viewset.as_view({"get": "download_attachment"})
+ticket_operation = viewset.as_view({"get": "retrieve_operation"})
+worker_stats = viewset.as_view({"get": "worker_stats"})
 
 urlpatterns = [
     path("", ticket_list, name="ticket-list"),
     path("<int:ticket_id>/", ticket_detail, name="ticket-detail"),
+    path("batch/", ticket_batch, name="ticket-batch"),
     path("<int:ticket_id>/comments/", comment_list, name="comment-list"),
-    path("attachments/<int:attachment_id>/<str:filename>/", download_attachment, name="download-attachment"),
+    path("operations/<uuid:operation_id>/", ticket_operation, name="ticket-operation"),
+    path("stats/", worker_stats, name="ticket-worker-stats"),
+    path("<int:ticket_id>/attachments/<int:attachment_id>/<str:filename>/", download_attachment, name="download-attachment"),
     # path(
     #     "tickets/comment_creation_webhook",
     #     JiraTicketUpdateHook.as_view({"post": "comment_created"}),
@@ -1,39 +1,143 @@
 import logging
+import os
 
+from adrf.viewsets import GenericViewSet as AsyncGenericViewSet
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import FileResponse
 from django.utils.translation import gettext_lazy as _
+from httpx import HTTPStatusError
 from requests import HTTPError
 from rest_framework import exceptions
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.exceptions import ValidationError
+from rest_framework.reverse import reverse
 from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
 from rest_framework.permissions import IsAuthenticated
 from users.permissions import IsAdminHost
+from utils.bulkhead import Bulkhead
+from utils.idempotency import idempotent
+from utils.jira import async_jira_service
 from utils.jira import jira_service
 
+from .models import JiraIssue
+from .models import TicketOperation
 from .permissions import HasAccountableRole
 from .serializers import TicketSerializer
 from .serializers import CommentSerializer
 from .serializers import AttachmentSerializer
+from .serializers import TicketOperationSerializer
+from .services import publish_jira_ticket
+from .services import with_attachments
+from .tasks import create_jira_ticket
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+BULKHEADS = {
+    name: Bulkhead(name, size, retry_after=settings.TICKETS_BULKHEAD_RETRY_AFTER)
+    for name, size in settings.TICKETS_BULKHEADS.items()
+}
+
+
+def requested_fields(request, profile):
+    """Parses a sparse `?fields=` fieldset, which must pick from `profile`."""
+    fields = request.query_params.get("fields")
+    if not fields:
+        return ()
+    fields = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = set(fields) - set(jira_service.FIELD_PROFILES[profile].fields)
+    if unknown:
+        raise ValidationError(
+            {"fields": _("Unknown fields: %s") % ", ".join(sorted(unknown))}
+        )
+    return fields
+
+
+def requested_ids(request):
+    """Parses `?ids=1,2,3`, at most TICKETS_BATCH_MAX_IDS of them."""
+    ids = request.query_params.get("ids", "")
+    try:
+        ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise ValidationError({"ids": _("Ticket ids must be integers.")})
+    if not ids:
+        raise ValidationError({"ids": _("This field is required.")})
+    if len(ids) > settings.TICKETS_BATCH_MAX_IDS:
+        raise ValidationError(
+            {"ids": _("At most %d tickets at once.") % settings.TICKETS_BATCH_MAX_IDS}
+        )
+    return ids
+
+
+def project_search(data, fields):
+    data["issues"] = [jira_service.project_issue(i, fields) for i in data["issues"]]
+    return data
+
 
 class TicketViewSet(viewsets.GenericViewSet):
     serializer_class = TicketSerializer
+    # The bulkhead each Jira-bound action takes a slot from.
+    BULKHEAD_ACTIONS = {
+        "list": "search",
+        "retrieve": "detail",
+        "retrieve_batch": "search",
+        "fetch_comments": "comments",
+        "create": "writes",
+        "create_comments": "writes",
+        "download_attachment": "attachments",
+    }
 
     def get_permission_classes(self):
         if self.action in ["assignables", "assign"]:
             return [IsAdminHost, HasAccountableRole]
+        if self.action == "worker_stats":
+            return [IsAdminHost, IsAdminUser]
 
         return [IsAuthenticated]
 
     def get_permissions(self):
         return [permission() for permission in self.get_permission_classes()]
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if bulkhead := BULKHEADS.get(self.BULKHEAD_ACTIONS.get(self.action)):
+            bulkhead.acquire()
+            request.bulkhead = bulkhead
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if bulkhead := getattr(request, "bulkhead", None):
+            request.bulkhead = None
+            if response.streaming and not isinstance(response, FileResponse):
+                # A proxied attachment holds its slot until the body is sent.
+                # Files from the local cache need no Jira connection and keep
+                # their sendfile path.
+                bulkhead.hold(response)
+            else:
+                bulkhead.release()
+        return response
+
+    def worker_stats(self, request, *args, **kwargs):
+        """
+        This worker process's bulkhead occupancy and Jira hedge rate, to tune
+        TICKETS_BULKHEADS and the hedging settings.
+        """
+        hedger = jira_service.hedger
+        return Response(
+            {
+                "pid": os.getpid(),
+                "bulkheads": {
+                    name: bulkhead.stats() for name, bulkhead in BULKHEADS.items()
+                },
+                "hedging": hedger.budget.stats() if hedger else None,
+            }
+        )
+
     def list(self, request, *args, **kwargs):
         page = int(request.query_params.get("page") or 1)
         page_size = int(request.query_params.get("page_size") or 10)
@@ -44,13 +148,29 @@ class TicketViewSet(viewsets.GenericViewSet):
         if request.is_admin_host:
             user_id = None
 
+        fields = requested_fields(request, "list")
+        if settings.TICKETS_LIST_SOURCE == "local":
+            data = JiraIssue.objects.search(
+                customer_id=user_id,
+                page=page,
+                page_size=page_size,
+                ticket_id=search,
+                ordering=ordering,
+            )
+            return Response(
+                project_search(
+                    data, fields or jira_service.FIELD_PROFILES["list"].fields
+                )
+            )
+
         try:
             data = jira_service.fetch_tickets(
                 customer_id=user_id,
                 page=page,
                 page_size=page_size,
                 ticket_id=search,
-                ordering=ordering
+                ordering=ordering,
+                fields=fields,
             )
         except HTTPError as e:
             raise ValidationError({"detail": e.response.json()})
@@ -58,21 +178,69 @@ class TicketViewSet(viewsets.GenericViewSet):
         return Response(data)
     
 
-    def retrieve(self, request, ticket_id=None, *args, **kwargs):
-        user_key = request.user.pk
+    @staticmethod
+    def owner_fields(fields):
+        # The ownership check needs the customer id even when not requested.
+        if not fields:
+            return ()
+        return tuple(dict.fromkeys([*fields, jira_service.customer_id_field]))
+
+    @staticmethod
+    def can_see(request, data):
+        owner = data["fields"].get(jira_service.customer_id_field)
+        return owner == str(request.user.pk) or request.is_admin_host
+
+    def check_owner(self, request, data, fields=()):
+        if not self.can_see(request, data):
+            raise exceptions.NotFound({"detail": _("Ticket not found")})
+        return jira_service.project_issue(data, fields) if fields else data
+
+    def visible_issues(self, request, issues, fields=()):
+        # Tickets the caller may not see are left out, as if they did not exist.
+        return {
+            "issues": [
+                jira_service.project_issue(issue, fields) if fields else issue
+                for issue in issues
+                if self.can_see(request, issue)
+            ]
+        }
+
+    def get_ticket(self, request, ticket_id, fields=(), profile="detail"):
         try:
-            data = jira_service.fetch_ticket_detail(ticket_id=ticket_id)
+            data = jira_service.fetch_ticket_detail(
+                ticket_id=ticket_id, fields=self.owner_fields(fields), profile=profile
+            )
         except HTTPError as e:
             raise ValidationError({"detail": str(e)})
-        
-        is_user_validated = ((data["fields"]["customfield_10200"] == str(user_key) or request.is_admin_host))
+        return self.check_owner(request, data, fields)
 
+    @staticmethod
+    def check_attachment(data, attachment_id, filename):
+        # The attachment must be on a ticket the caller may see, by its name.
+        for attachment in data["fields"].get("attachment") or ():
+            if str(attachment["id"]) == str(attachment_id):
+                if attachment["filename"] == filename:
+                    return
+                break
+        raise exceptions.NotFound({"detail": _("Attachment not found")})
 
-        if data and is_user_validated:
-            return Response(data)
-        else:
-            raise exceptions.NotFound({"detail": _("Ticket not found")})
+    def retrieve(self, request, ticket_id=None, *args, **kwargs):
+        fields = requested_fields(request, "detail")
+        return Response(self.get_ticket(request, ticket_id, fields))
 
+    def retrieve_batch(self, request, *args, **kwargs):
+        """The tickets of `?ids=` the caller may see, from one Jira search."""
+        ids = requested_ids(request)
+        fields = requested_fields(request, "detail")
+        try:
+            issues = jira_service.fetch_ticket_details(
+                ids, fields=self.owner_fields(fields)
+            )
+        except HTTPError as e:
+            raise ValidationError({"detail": str(e)})
+        return Response(self.visible_issues(request, issues, fields))
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -82,33 +250,59 @@ class TicketViewSet(viewsets.GenericViewSet):
         user_full_name = user.full_name  
         user_email = user.email
 
-        summary = serializer.validated_data["subject"]
-        description = serializer.validated_data["description"]
         cat = serializer.validated_data["cat"]
-        issue_type = jira_service.ISSUE_TYPE_MAPPING.get(cat)
-        category_field = jira_service.CATEGORY_MAPPING.get(cat)
+        issue = {
+            "customer_id": customer_id,
+            "summary": serializer.validated_data["subject"],
+            "description": serializer.validated_data["description"],
+            "issue_type": jira_service.ISSUE_TYPE_MAPPING.get(cat),
+            "project_key": "TPP",
+            "user_full_name": user_full_name,
+            "user_email": user_email,
+            "category_field": jira_service.CATEGORY_MAPPING.get(cat),
+        }
+        if settings.TICKETS_ASYNC_CREATE:
+            return self.enqueue_create(request, user, issue)
 
         try:
-            data = jira_service.create_issue(customer_id, summary, description, issue_type, "TPP",user_full_name, user_email, category_field)
+            data = jira_service.create_issue(**issue)
         except HTTPError as e:
             raise ValidationError({"detail": e.response.content})
 
-        print(data)
-        
         ticket_id = data.get("id")
 
-        print(request.FILES.values())
-        
-        for file in request.FILES.values():
-
-            try:
-                data = jira_service.add_attachment(ticket_id, file)
-            except HTTPError as e:
-                raise ValidationError({"attachment_error": e.response.content})
+        data = with_attachments(
+            data, *jira_service.add_attachments(ticket_id, request.FILES.values())
+        )
 
-        
+        publish_jira_ticket(customer_id, ticket_id)
         return Response(data, status=status.HTTP_201_CREATED)
 
+    def enqueue_create(self, request, user, issue):
+        """Stages the ticket and leaves the Jira calls to a Celery task."""
+        operation = TicketOperation.objects.create_operation(
+            user, issue, request.FILES.values()
+        )
+        transaction.on_commit(lambda: create_jira_ticket.delay(str(operation.pk)))
+        url = reverse(
+            "ticket-operation", kwargs={"operation_id": operation.pk}, request=request
+        )
+        return Response(
+            TicketOperationSerializer(operation).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": url, "Retry-After": "1"},
+        )
+
+    def retrieve_operation(self, request, operation_id=None, *args, **kwargs):
+        queryset = TicketOperation.objects.all()
+        if not request.is_admin_host:
+            queryset = queryset.filter(user_id=request.user.pk)
+        operation = queryset.filter(pk=operation_id).first()
+        if operation is None:
+            raise exceptions.NotFound({"detail": _("Operation not found")})
+        headers = {} if operation.done else {"Retry-After": "1"}
+        return Response(TicketOperationSerializer(operation).data, headers=headers)
+
     
     def fetch_comments(self, request, ticket_id=None, *args, **kwargs):
         page = request.query_params.get("page") or 1
@@ -116,7 +310,7 @@ class TicketViewSet(viewsets.GenericViewSet):
 
         # check ticket owned by user called that
         try:
-            self.retrieve(request, ticket_id=ticket_id, *args, **kwargs)
+            self.get_ticket(request, ticket_id, profile="ownership")
         except exceptions.APIException as e:
             return Response({"detail": str(e.detail)}, status=e.status_code)
 
@@ -131,6 +325,7 @@ class TicketViewSet(viewsets.GenericViewSet):
             logger.error(f"Error fetching comments for ticket {ticket_id}: {e}")
             raise ValidationError({"detail": str(e)})
     
+    @idempotent
     def create_comments(self, request, ticket_id=None, *args, **kwargs):
         serializer = CommentSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -138,15 +333,141 @@ class TicketViewSet(viewsets.GenericViewSet):
 
         data = jira_service.create_comment(ticket_id, comment_text)
 
-        for file in request.FILES.values():
-            try:
-                data = jira_service.add_attachment(ticket_id, file)
-            except HTTPError as e:
-                raise ValidationError({"attachment_error": e.response.content})
+        try:
+            data = with_attachments(
+                data, *jira_service.add_attachments(ticket_id, request.FILES.values())
+            )
+        finally:
+            jira_service.invalidate_ticket(ticket_id)
+            jira_service.invalidate_ticket_lists(str(request.user.pk))
 
         return Response(data, status=status.HTTP_201_CREATED)
     
-    def download_attachment(self, request, attachment_id=None, filename=None, *args, **kwargs):
-        response = jira_service.download_attachment(attachment_id, filename)
+    def download_attachment(self, request, ticket_id=None, attachment_id=None, filename=None, *args, **kwargs):
+        data = self.get_ticket(request, ticket_id, profile="attachments")
+        self.check_attachment(data, attachment_id, filename)
+        return jira_service.download_attachment(
+            attachment_id, filename, headers=request.headers
+        )
+
+
+class AsyncTicketViewSet(AsyncGenericViewSet, TicketViewSet):
+    """
+    Async variant of `TicketViewSet` for ASGI deployments.
+
+    The Jira proxy actions await the pooled `async_jira_service` instead of
+    holding a worker thread for the whole round-trip. `create` is inherited
+    and runs in a thread.
+    """
+
+    async def list(self, request, *args, **kwargs):
+        page = int(request.query_params.get("page") or 1)
+        page_size = int(request.query_params.get("page_size") or 10)
+        search = request.query_params.get("search") or None
+        ordering = request.query_params.get("ordering") or "created DESC"
+
+        user_id = str(request.user.pk)
+        if request.is_admin_host:
+            user_id = None
+
+        fields = requested_fields(request, "list")
+        if settings.TICKETS_LIST_SOURCE == "local":
+            data = await JiraIssue.objects.asearch(
+                customer_id=user_id,
+                page=page,
+                page_size=page_size,
+                ticket_id=search,
+                ordering=ordering,
+            )
+            return Response(
+                project_search(
+                    data, fields or jira_service.FIELD_PROFILES["list"].fields
+                )
+            )
+
+        try:
+            data = await async_jira_service.fetch_tickets(
+                customer_id=user_id,
+                page=page,
+                page_size=page_size,
+                ticket_id=search,
+                ordering=ordering,
+                fields=fields,
+            )
+        except HTTPStatusError as e:
+            raise ValidationError({"detail": e.response.json()})
+
+        return Response(data)
+
+    async def get_ticket(self, request, ticket_id, fields=(), profile="detail"):
+        try:
+            data = await async_jira_service.fetch_ticket_detail(
+                ticket_id=ticket_id, fields=self.owner_fields(fields), profile=profile
+            )
+        except HTTPStatusError as e:
+            raise ValidationError({"detail": str(e)})
+        return self.check_owner(request, data, fields)
+
+    async def retrieve(self, request, ticket_id=None, *args, **kwargs):
+        fields = requested_fields(request, "detail")
+        return Response(await self.get_ticket(request, ticket_id, fields))
+
+    async def retrieve_batch(self, request, *args, **kwargs):
+        ids = requested_ids(request)
+        fields = requested_fields(request, "detail")
+        try:
+            issues = await async_jira_service.fetch_ticket_details(
+                ids, fields=self.owner_fields(fields)
+            )
+        except HTTPStatusError as e:
+            raise ValidationError({"detail": str(e)})
+        return Response(self.visible_issues(request, issues, fields))
+
+    async def fetch_comments(self, request, ticket_id=None, *args, **kwargs):
+        page = request.query_params.get("page") or 1
+        page_size = request.query_params.get("page_size") or 10
+
+        # check ticket owned by user called that
+        try:
+            await self.get_ticket(request, ticket_id, profile="ownership")
+        except exceptions.APIException as e:
+            return Response({"detail": str(e.detail)}, status=e.status_code)
+
+        try:
+            data = await async_jira_service.fetch_ticket_comments(
+                ticket_id=ticket_id,
+                page=page,
+                page_size=page_size
+            )
+            return Response(data)
+        except HTTPStatusError as e:
+            logger.error(f"Error fetching comments for ticket {ticket_id}: {e}")
+            raise ValidationError({"detail": str(e)})
+
+    @idempotent
+    async def create_comments(self, request, ticket_id=None, *args, **kwargs):
+        serializer = CommentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        comment_text = serializer.validated_data["body"]
+
+        data = await async_jira_service.create_comment(ticket_id, comment_text)
+
+        try:
+            data = with_attachments(
+                data,
+                *await async_jira_service.add_attachments(
+                    ticket_id, request.FILES.values()
+                ),
+            )
+        finally:
+            await async_jira_service.invalidate_ticket(ticket_id)
+            await async_jira_service.invalidate_ticket_lists(str(request.user.pk))
+
+        return Response(data, status=status.HTTP_201_CREATED)
 
-        return response
\ No newline at end of file
+    async def download_attachment(self, request, ticket_id=None, attachment_id=None, filename=None, *args, **kwargs):
+        data = await self.get_ticket(request, ticket_id, profile="attachments")
+        self.check_attachment(data, attachment_id, filename)
+        return await async_jira_service.download_attachment(
+            attachment_id, filename, headers=request.headers
+        )
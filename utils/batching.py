@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from utils.deadline import DeadlineExceeded
+from utils.deadline import remaining
+
+
+class Batch:
+    def __init__(self, full):
+        self.futures = {}
+        self.full = full
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent `get` calls and answers them with one call of
+    `fetch(group, keys)`, which returns a dict of the keys it found.
+
+    The first caller of a batch waits up to `window` seconds, or until
+    `max_size` keys have joined, then fetches for everyone. Only keys of the
+    same `group` share a batch. Keys missing from the result get None.
+
+    The fetch runs on the first caller's deadline; every other caller waits
+    for it no longer than its own deadline allows.
+    """
+
+    def __init__(self, fetch, window=0.005, max_size=50):
+        self.fetch = fetch
+        self.window = window
+        self.max_size = max_size
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def join(self, batches, group, new_batch):
+        """Adds the caller to the open batch of `group`, or opens one."""
+        batch = batches.get(group)
+        leader = batch is None
+        if leader:
+            batch = batches[group] = new_batch()
+        return batch, leader
+
+    def close(self, batches, group, batch):
+        if batches.get(group) is batch:
+            del batches[group]
+
+    def resolve(self, batch, found):
+        for key, future in batch.futures.items():
+            if not future.done():
+                future.set_result(found.get(key))
+
+    def fail(self, batch, error):
+        for future in batch.futures.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def get(self, group, key):
+        with self._lock:
+            batch, leader = self.join(
+                self._batches, group, lambda: Batch(threading.Event())
+            )
+            future = batch.futures.setdefault(key, Future())
+            if len(batch.futures) >= self.max_size:
+                self.close(self._batches, group, batch)
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                self.close(self._batches, group, batch)
+            try:
+                self.resolve(batch, self.fetch(group, list(batch.futures)))
+            except BaseException as e:
+                self.fail(batch, e)
+        try:
+            return future.result(timeout=remaining())
+        except FutureTimeout:
+            if future.done():
+                raise
+            raise DeadlineExceeded from None
+
+
+class AsyncMicroBatcher(MicroBatcher):
+    def __init__(self, fetch, window=0.005, max_size=50):
+        super().__init__(fetch, window, max_size)
+        # Futures are bound to the loop that created them.
+        self._loop_batches = weakref.WeakKeyDictionary()
+
+    async def run(self, batches, group, batch):
+        try:
+            await asyncio.wait_for(batch.full.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        self.close(batches, group, batch)
+        try:
+            self.resolve(batch, await self.fetch(group, list(batch.futures)))
+        except BaseException as e:
+            self.fail(batch, e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+
+    async def get(self, group, key):
+        loop = asyncio.get_running_loop()
+        batches = self._loop_batches.setdefault(loop, {})
+        batch, leader = self.join(batches, group, lambda: Batch(asyncio.Event()))
+        if leader:
+            # The batch runs in its own task so that a cancelled first
+            # caller does not cancel it for the others.
+            batch.task = asyncio.ensure_future(self.run(batches, group, batch))
+        future = batch.futures.setdefault(key, loop.create_future())
+        if len(batch.futures) >= self.max_size:
+            self.close(batches, group, batch)
+            batch.full.set()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), remaining())
+        except asyncio.TimeoutError:
+            if future.done():
+                raise
+            raise DeadlineExceeded from None
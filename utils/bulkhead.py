@@ -0,0 +1,113 @@
+import logging
+import threading
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework import status
+
+logger = logging.getLogger(__name__)
+
+
+class BulkheadFull(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("Too many requests of this kind, please retry shortly.")
+    default_code = "bulkhead_full"
+
+    def __init__(self, wait=None, **kwargs):
+        super().__init__(**kwargs)
+        self.wait = wait
+
+
+class Releasing:
+    """
+    A streaming body that calls `release` once, when it has been sent or
+    the response is closed. Django closes a body that has `close()` along
+    with its response, even when the client went away mid-way.
+    """
+
+    def __init__(self, content, release):
+        self.content = content
+        self.release = release
+        self.released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            self.release()
+
+
+class AsyncReleasing(Releasing):
+    # No __iter__, so Django serves it as an async body.
+    __iter__ = None
+    __next__ = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await anext(self.content)
+        except BaseException:
+            self.close()
+            raise
+
+
+class Bulkhead:
+    """
+    Caps how many requests of one kind a process serves at once, so a slow
+    upstream endpoint cannot take every worker thread. Requests over `size`
+    are turned away at once with `BulkheadFull` rather than queued. A size
+    of 0 admits everything but still counts.
+    """
+
+    def __init__(self, name, size, retry_after=1):
+        self.name = name
+        self.size = size
+        self.retry_after = retry_after
+        self.in_use = 0
+        self.peak = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.size and self.in_use >= self.size:
+                self.rejected += 1
+                logger.warning("Bulkhead %s is full (%s)", self.name, self.size)
+                raise BulkheadFull(wait=self.retry_after)
+            self.in_use += 1
+            self.admitted += 1
+            self.peak = max(self.peak, self.in_use)
+
+    def release(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def hold(self, response):
+        """Keeps the slot until a streaming `response` is sent or closed."""
+        body = AsyncReleasing if response.is_async else Releasing
+        response.streaming_content = body(response.streaming_content, self.release)
+
+    def stats(self):
+        """Occupancy since the last call; the peak starts over from now."""
+        with self._lock:
+            stats = {
+                "size": self.size,
+                "in_use": self.in_use,
+                "peak": self.peak,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+            self.peak = self.in_use
+        return stats
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def read_through(key, fetch, timeout):
+    value = cache.get(key)
+    if value is None:
+        value = fetch()
+        cache.set(key, value, timeout)
+    return value
+
+
+async def aread_through(key, fetch, timeout):
+    value = await cache.aget(key)
+    if value is None:
+        value = await fetch()
+        await cache.aset(key, value, timeout)
+    return value
+
+
+def make_key(prefix, *parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()  # noqa: S324
+    return f"{prefix}:{digest}"
+
+
+def get_generation(namespace):
+    return cache.get_or_set(f"generation:{namespace}", 1, timeout=None)
+
+
+def bump_generation(namespace):
+    key = f"generation:{namespace}"
+    cache.add(key, 1, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr; any new value invalidates old keys.
+        cache.set(key, int(time.time()), timeout=None)
+
+
+def store(key, value, fresh_for, stale_for):
+    entry = {"value": value, "fresh_until": time.time() + fresh_for}
+    cache.set(key, entry, timeout=fresh_for + stale_for)
+    return value
+
+
+def refresh(key, fetch, fresh_for, stale_for):
+    try:
+        store(key, fetch(), fresh_for, stale_for)
+    except Exception:
+        logger.exception("Background refresh of %s failed", key)
+    finally:
+        cache.delete(f"{key}:refreshing")
+
+
+def stale_while_revalidate(key, fetch, fresh_for, stale_for):
+    """
+    Serve a cached value, refreshing it in a background thread once it is
+    older than `fresh_for`. Stale values are served for `stale_for` more
+    seconds; only one process refreshes a given key at a time.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return store(key, fetch(), fresh_for, stale_for)
+    if entry["fresh_until"] < time.time() and cache.add(
+        f"{key}:refreshing", 1, timeout=30
+    ):
+        threading.Thread(
+            target=refresh, args=(key, fetch, fresh_for, stale_for), daemon=True
+        ).start()
+    return entry["value"]
+
+
+async def arefresh(key, fetch, fresh_for, stale_for):
+    try:
+        value = await fetch()
+        entry = {"value": value, "fresh_until": time.time() + fresh_for}
+        await cache.aset(key, entry, timeout=fresh_for + stale_for)
+    except Exception:
+        logger.exception("Background refresh of %s failed", key)
+    finally:
+        await cache.adelete(f"{key}:refreshing")
+
+
+_background_tasks = set()
+
+
+async def astale_while_revalidate(key, fetch, fresh_for, stale_for):
+    entry = await cache.aget(key)
+    if entry is None:
+        value = await fetch()
+        entry = {"value": value, "fresh_until": time.time() + fresh_for}
+        await cache.aset(key, entry, timeout=fresh_for + stale_for)
+        return value
+    if entry["fresh_until"] < time.time() and await cache.aadd(
+        f"{key}:refreshing", 1, timeout=30
+    ):
+        task = asyncio.create_task(arefresh(key, fetch, fresh_for, stale_for))
+        # Keep a reference so the task is not garbage collected mid-flight.
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return entry["value"]
@@ -0,0 +1,229 @@
+import logging
+import math
+import time
+from collections import deque
+
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework import status
+
+from utils.cache import store
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("The ticketing service is temporarily unavailable.")
+    default_code = "circuit_open"
+
+    def __init__(self, wait=None, **kwargs):
+        super().__init__(**kwargs)
+        # DRF's exception handler turns `wait` into a Retry-After header.
+        self.wait = wait
+
+
+class CircuitBreaker:
+    """
+    Trips after too many failed calls to one class of upstream endpoints.
+
+    Call counts, the open state and the half-open probe live in the cache so
+    all workers trip and recover together. While open, calls fail at once
+    with `CircuitOpen`; after `open_for` seconds a single call is let through
+    and closes the circuit if it succeeds.
+
+    Timeouts adapt to this process's recent latencies: `timeout_multiplier`
+    times the p99 of successful calls, clamped to `min_timeout` and
+    `max_timeout`.
+    """
+
+    def __init__(
+        self,
+        name,
+        errors=(),
+        error_rate=0.5,
+        min_calls=20,
+        window=30,
+        open_for=30,
+        min_timeout=1,
+        max_timeout=5,
+        timeout_multiplier=3,
+        latency_samples=500,
+    ):
+        self.name = name
+        self.errors = errors
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_for = open_for
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.latencies = deque(maxlen=latency_samples)
+        self.open_key = f"circuit:{name}:open"
+        self.tripped_key = f"circuit:{name}:tripped"
+        self.probe_key = f"circuit:{name}:probe"
+
+    def counter_keys(self):
+        bucket = int(time.time() // self.window)
+        prefix = f"circuit:{self.name}:{bucket}"
+        return f"{prefix}:calls", f"{prefix}:failures"
+
+    def latency_percentile(self, q):
+        """The `q` quantile of recent successful calls, or None if too few."""
+        if len(self.latencies) < self.latencies.maxlen // 10:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[math.ceil(q * len(latencies)) - 1]
+
+    @property
+    def timeout(self):
+        p99 = self.latency_percentile(0.99)
+        # Too few samples for a stable p99 yet.
+        if p99 is None:
+            return self.max_timeout
+        return min(
+            self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier)
+        )
+
+    @staticmethod
+    def failed(response):
+        return response.status_code >= 500 or response.status_code == 429
+
+    def allow(self, state):
+        """Returns whether the call is the half-open probe."""
+        if state.get(self.open_key):
+            raise CircuitOpen(wait=self.open_for)
+        return bool(state.get(self.tripped_key))
+
+    def trip(self):
+        logger.warning("Opening the %s circuit for %ss", self.name, self.open_for)
+        cache.set(self.tripped_key, 1, timeout=None)
+        # The open flag expires on its own, which half-opens the circuit.
+        cache.set(self.open_key, 1, timeout=self.open_for)
+
+    def call(self, send):
+        """Calls `send(timeout)` and records its outcome."""
+        probing = self.allow(cache.get_many([self.open_key, self.tripped_key]))
+        if probing and not cache.add(self.probe_key, 1, timeout=self.max_timeout):
+            raise CircuitOpen(wait=self.max_timeout)
+
+        started = time.monotonic()
+        try:
+            try:
+                response = send(self.timeout)
+            except self.errors:
+                self.record(False, probing)
+                raise
+            failed = self.failed(response)
+            if not failed:
+                self.latencies.append(time.monotonic() - started)
+            self.record(not failed, probing)
+            return response
+        finally:
+            # Whatever the probe raised, the next call may probe again.
+            if probing:
+                cache.delete(self.probe_key)
+
+    def record(self, succeeded, probing):
+        if probing:
+            if succeeded:
+                logger.info("Closing the %s circuit", self.name)
+                cache.delete_many([self.tripped_key, *self.counter_keys()])
+            else:
+                cache.set(self.open_key, 1, timeout=self.open_for)
+            return
+
+        calls_key, failures_key = self.counter_keys()
+        cache.add(calls_key, 0, timeout=self.window * 2)
+        calls = cache.incr(calls_key)
+        if succeeded:
+            return
+        cache.add(failures_key, 0, timeout=self.window * 2)
+        failures = cache.incr(failures_key)
+        if calls >= self.min_calls and failures / calls >= self.error_rate:
+            self.trip()
+
+    async def atrip(self):
+        logger.warning("Opening the %s circuit for %ss", self.name, self.open_for)
+        await cache.aset(self.tripped_key, 1, timeout=None)
+        await cache.aset(self.open_key, 1, timeout=self.open_for)
+
+    async def acall(self, send):
+        state = await cache.aget_many([self.open_key, self.tripped_key])
+        probing = self.allow(state)
+        if probing and not await cache.aadd(
+            self.probe_key, 1, timeout=self.max_timeout
+        ):
+            raise CircuitOpen(wait=self.max_timeout)
+
+        started = time.monotonic()
+        try:
+            try:
+                response = await send(self.timeout)
+            except self.errors:
+                await self.arecord(False, probing)
+                raise
+            failed = self.failed(response)
+            if not failed:
+                self.latencies.append(time.monotonic() - started)
+            await self.arecord(not failed, probing)
+            return response
+        finally:
+            if probing:
+                await cache.adelete(self.probe_key)
+
+    async def arecord(self, succeeded, probing):
+        if probing:
+            if succeeded:
+                logger.info("Closing the %s circuit", self.name)
+                await cache.adelete_many([self.tripped_key, *self.counter_keys()])
+            else:
+                await cache.aset(self.open_key, 1, timeout=self.open_for)
+            return
+
+        calls_key, failures_key = self.counter_keys()
+        await cache.aadd(calls_key, 0, timeout=self.window * 2)
+        calls = await cache.aincr(calls_key)
+        if succeeded:
+            return
+        await cache.aadd(failures_key, 0, timeout=self.window * 2)
+        failures = await cache.aincr(failures_key)
+        if calls >= self.min_calls and failures / calls >= self.error_rate:
+            await self.atrip()
+
+
+def serve_stale_on_open(key, fetch, fresh_for, stale_for):
+    """
+    A read-through cache whose entries are served for `fresh_for` seconds
+    and kept `stale_for` seconds longer, to be served only in place of a
+    `CircuitOpen` error. One cache entry and one write per fetch.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry["fresh_until"] > time.time():
+        return entry["value"]
+    try:
+        value = fetch()
+    except CircuitOpen:
+        if entry is None:
+            raise
+        logger.warning("Serving %s from the last good response", key)
+        return entry["value"]
+    return store(key, value, fresh_for, stale_for)
+
+
+async def aserve_stale_on_open(key, fetch, fresh_for, stale_for):
+    entry = await cache.aget(key)
+    if entry is not None and entry["fresh_until"] > time.time():
+        return entry["value"]
+    try:
+        value = await fetch()
+    except CircuitOpen:
+        if entry is None:
+            raise
+        logger.warning("Serving %s from the last good response", key)
+        return entry["value"]
+    entry = {"value": value, "fresh_until": time.time() + fresh_for}
+    await cache.aset(key, entry, timeout=fresh_for + stale_for)
+    return value
@@ -0,0 +1,81 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+
+from utils.circuitbreaker import CircuitOpen
+
+# Calls with less time left than this are not started.
+MIN_CALL_TIME = 0.05
+
+_deadline = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(CircuitOpen):
+    """
+    The request ran out of time for further upstream calls. Handled wherever
+    an open circuit is, so cached fallbacks and per-file upload errors apply.
+    """
+
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = _("The ticketing service took too long to respond.")
+    default_code = "deadline_exceeded"
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Gives the upstream calls made inside the block `seconds` in total. A
+    nested deadline can shorten the current one but never extend it.
+    """
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the deadline, or None outside of one."""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def budget(timeout):
+    """`timeout` cut to the time left; raises once too little is left."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left < MIN_CALL_TIME:
+        raise DeadlineExceeded
+    return min(timeout, left)
+
+
+def capped(seconds):
+    """`seconds` of waiting cut to the time left, never below zero."""
+    left = remaining()
+    return seconds if left is None else max(0, min(seconds, left))
+
+
+def expired():
+    left = remaining()
+    return left is not None and left < MIN_CALL_TIME
+
+
+@contextmanager
+def bounded(timeout, errors=()):
+    """
+    Yields `timeout` cut to the deadline. `errors` raised once the deadline
+    has passed become `DeadlineExceeded`: our budget ran out, which says
+    nothing about the health of the upstream.
+    """
+    try:
+        yield budget(timeout)
+    except errors as e:
+        if expired():
+            raise DeadlineExceeded from e
+        raise
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    Size-bounded on-disk cache for immutable files, shared by every worker on
+    the host.
+
+    Files are written to a temporary name and renamed into place, so readers
+    never see a partial file. Reads bump the file's mtime, and once the cache
+    grows past `max_bytes` the least recently used files are removed.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory) if directory else None
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self):
+        return bool(self.directory and self.max_bytes)
+
+    def paths(self, key):
+        return self.directory / str(key), self.directory / f"{key}.json"
+
+    def open(self, key):
+        """Returns `(file, metadata)` for a cached entry, or None."""
+        path, meta_path = self.paths(key)
+        try:
+            file = path.open("rb")
+        except FileNotFoundError:
+            return None
+        try:
+            metadata = json.loads(meta_path.read_text())
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            # Evicted by another worker between the two reads.
+            file.close()
+            return None
+        return file, metadata
+
+    def writer(self, key, metadata):
+        return DiskCacheWriter(self, key, metadata)
+
+    def evict(self):
+        entries = []
+        abandoned_before = time.time() - 3600
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith(".tmp"):
+                    # Left behind by a worker that died mid-download.
+                    if stat.st_mtime < abandoned_before:
+                        Path(entry.path).unlink(missing_ok=True)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.name))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% so that the next few writes do not rescan.
+        target = self.max_bytes * 0.9
+        for _, size, name in sorted(entries):
+            for path in self.paths(name):
+                path.unlink(missing_ok=True)
+            total -= size
+            if total <= target:
+                break
+
+
+class DiskCacheWriter:
+    """Writes one entry; `commit` publishes it and `discard` drops it."""
+
+    def __init__(self, cache, key, metadata):
+        self.cache = cache
+        self.key = key
+        self.metadata = metadata
+        self.size = 0
+        cache.directory.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.directory, suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.cache.max_bytes:
+            raise ValueError("Entry is larger than the cache")
+        self.file.write(chunk)
+
+    def commit(self):
+        self.file.close()
+        self.metadata["size"] = self.size
+        path, meta_path = self.cache.paths(self.key)
+        # Metadata goes first: a visible file always has its metadata.
+        fd, tmp_meta_path = tempfile.mkstemp(dir=self.cache.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as meta_file:
+            json.dump(self.metadata, meta_file)
+        os.replace(tmp_meta_path, meta_path)
+        # mkstemp creates files private to this user; nginx may serve them.
+        os.chmod(self.tmp_path, 0o644)
+        os.replace(self.tmp_path, path)
+        self.cache.evict()
+
+    def discard(self):
+        self.file.close()
+        Path(self.tmp_path).unlink(missing_ok=True)
+
+    def tee(self, chunks, staging=False):
+        """
+        Yields `chunks` while writing them; commits once all were read. When
+        `staging`, nobody needs the chunks but the cache, so reading stops as
+        soon as the entry cannot be cached.
+        """
+        try:
+            for chunk in chunks:
+                self.write_quietly(chunk)
+                if staging and self.file.closed:
+                    return
+                yield chunk
+        except BaseException:
+            self.discard()
+            raise
+        finally:
+            chunks.close()
+        self.finish()
+
+    async def atee(self, chunks, staging=False):
+        # Chunks go to the page cache; the writes are too short to offload.
+        try:
+            async for chunk in chunks:
+                self.write_quietly(chunk)
+                if staging and self.file.closed:
+                    return
+                yield chunk
+        except BaseException:
+            self.discard()
+            raise
+        finally:
+            await chunks.aclose()
+        self.finish()
+
+    def write_quietly(self, chunk):
+        # A full disk or an oversized file must not break the download.
+        if self.file.closed:
+            return
+        try:
+            self.write(chunk)
+        except (OSError, ValueError):
+            logger.warning("Not caching %s", self.key, exc_info=True)
+            self.discard()
+
+    def finish(self):
+        if self.file.closed:
+            return
+        try:
+            self.commit()
+        except OSError:
+            logger.warning("Could not cache %s", self.key, exc_info=True)
+            self.discard()
@@ -0,0 +1,151 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures import wait
+
+
+class HedgeBudget:
+    """
+    Lets hedges add at most `ratio` extra calls on top of the calls that
+    could be hedged. Each call earns `ratio` of a hedge, up to `burst`
+    unspent hedges.
+    """
+
+    def __init__(self, ratio=0.05, burst=10):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.calls = 0
+        self.hedged = 0
+        self.won = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.calls += 1
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self):
+        with self._lock:
+            if self.tokens < 1:
+                self.denied += 1
+                return False
+            self.tokens -= 1
+            self.hedged += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.won += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "won": self.won,
+                "denied": self.denied,
+                "hedge_rate": self.hedged / self.calls if self.calls else 0,
+            }
+
+
+def close_response(future):
+    # The losing response is not read by anyone; give its connection back.
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class Hedger:
+    """
+    Sends a second, identical call when the first has not answered after
+    `delay` seconds and returns whichever answers first. Only for idempotent
+    reads. `percentile` picks the delay from recent latencies, so only the
+    slowest calls are hedged, and `budget` caps the extra load.
+    """
+
+    def __init__(self, percentile=0.95, budget=0.05, min_delay=0.02, workers=20):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget = HedgeBudget(ratio=budget)
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Threads do not survive a fork, so each process builds its own pool.
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="hedge"
+                    )
+                    self._pid = pid
+        return self._executor
+
+    def delay(self, breaker):
+        latency = breaker.latency_percentile(self.percentile)
+        return None if latency is None else max(self.min_delay, latency)
+
+    def call(self, send, delay):
+        """Calls `send()`, hedged after `delay` seconds; None never hedges."""
+        if delay is None:
+            return send()
+        self.budget.earn()
+        context = contextvars.copy_context()
+        primary = self.executor.submit(context.copy().run, send)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        if not self.budget.spend():
+            return primary.result()
+
+        hedge = self.executor.submit(context.copy().run, send)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.add_done_callback(close_response)
+                    if future is hedge:
+                        self.budget.record_win()
+                    return future.result()
+        return primary.result()
+
+    async def acall(self, send, delay):
+        if delay is None:
+            return await send()
+        self.budget.earn()
+        primary = asyncio.ensure_future(send())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self.budget.spend():
+                return await primary
+
+            hedge = asyncio.ensure_future(send())
+            tasks.append(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.budget.record_win()
+                        return task.result()
+            return primary.result()
+        finally:
+            # Cancels the loser, or both calls if the caller was cancelled.
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.fields import format_multipart_header_param
+
+from utils.ratelimit import RateLimitedAdapter
+
+
+class PooledSession:
+    """
+    Lazily builds a single keep-alive `requests.Session` per process.
+
+    The underlying urllib3 pool is thread-safe, so every thread of a gunicorn
+    worker shares the same connections. The session is rebuilt after a fork so
+    that pre-forked workers never share sockets with their parent.
+    """
+
+    def __init__(
+        self,
+        auth=None,
+        pool_size=10,
+        pool_block=False,
+        keep_alive=True,
+        verify=False,
+        rate_limiter=None,
+    ):
+        self.auth = auth
+        self.pool_size = pool_size
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.verify = verify
+        self.rate_limiter = rate_limiter
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        session = requests.Session()
+        session.auth = self.auth
+        session.verify = self.verify
+        pool = {
+            "pool_connections": self.pool_size,
+            "pool_maxsize": self.pool_size,
+            "pool_block": self.pool_block,
+        }
+        if self.rate_limiter:
+            adapter = RateLimitedAdapter(self.rate_limiter, **pool)
+        else:
+            adapter = HTTPAdapter(**pool)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def get(self):
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self.build()
+                    self._pid = pid
+        return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._pid = None
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    """
+    Parses a single-range `Range` header against a body of `size` bytes.
+
+    Returns `(start, end)` with an inclusive end, `None` when the whole body
+    should be sent, or `False` when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match((header or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if not start:
+        # A suffix range: the last `end` bytes.
+        start, end = max(0, size - int(end)), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class MultipartStream:
+    """
+    A `multipart/form-data` body with one file part whose content is read
+    from `chunks` while the request is sent, so the file is never held in
+    memory. requests sends a Content-Length when `size` is known and
+    chunked transfer encoding otherwise.
+    """
+
+    def __init__(self, field, filename, chunks, size=None):
+        self.boundary = uuid.uuid4().hex
+        self.head = (
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: form-data; "
+            f"{format_multipart_header_param('name', field)}; "
+            f"{format_multipart_header_param('filename', filename)}\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self.chunks = chunks
+        self.size = size
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        # requests treats a length of 0 as unknown.
+        if self.size is None:
+            return 0
+        return len(self.head) + self.size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        yield from self.chunks
+        yield self.tail
@@ -0,0 +1,238 @@
+import asyncio
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework import status
+from rest_framework.response import Response
+
+from utils.deadline import DeadlineExceeded
+from utils.deadline import capped
+from utils.deadline import expired
+
+HEADER = "Idempotency-Key"
+# Response headers kept with the stored response.
+STORED_HEADERS = ("Location", "Retry-After")
+
+
+class IdempotencyKeyInUse(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _("A request with this idempotency key is still in progress.")
+    default_code = "idempotency_key_in_use"
+
+    def __init__(self, wait=None, **kwargs):
+        super().__init__(**kwargs)
+        self.wait = wait
+
+
+class IdempotencyKeyFailed(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _(
+        "A request with this idempotency key failed part-way and may have taken "
+        "effect. Check its outcome and retry with a new key."
+    )
+    default_code = "idempotency_key_failed"
+
+
+class IdempotencyKeyMismatch(exceptions.APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = _("This idempotency key was used for a different request.")
+    default_code = "idempotency_key_mismatch"
+
+
+def idempotency_key(request):
+    key = request.headers.get(HEADER)
+    if not key:
+        return None
+    if len(key) > 255:
+        raise exceptions.ValidationError({HEADER: _("Must be at most 255 characters.")})
+    # Keys are chosen by clients, so they are scoped to the user.
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idempotency:{request.user.pk}:{digest}"
+
+
+def describe(value):
+    if isinstance(value, UploadedFile):
+        digest = hashlib.sha256()
+        for chunk in value.chunks():
+            digest.update(chunk)
+        value.seek(0)
+        return {"name": value.name, "sha256": digest.hexdigest()}
+    return value
+
+
+def fingerprint(request):
+    """Hashes what makes two requests the same: method, path, data and files."""
+    data = request.data
+    if hasattr(data, "lists"):
+        data = {name: [describe(v) for v in values] for name, values in data.lists()}
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(
+        f"{request.method} {request.get_full_path()} {body}".encode()
+    ).hexdigest()
+
+
+def failed(request_fingerprint):
+    return {"fingerprint": request_fingerprint, "failed": True}
+
+
+def is_server_error(error):
+    # Client errors are raised before anything is written.
+    return getattr(error, "status_code", 500) >= 500
+
+
+def record(response, request_fingerprint):
+    # After a server error the write may or may not have happened, so
+    # retries must not run it again.
+    if response.status_code >= 500:
+        return failed(request_fingerprint)
+    return {
+        "fingerprint": request_fingerprint,
+        "status": response.status_code,
+        "data": response.data,
+        "headers": {
+            name: response[name] for name in STORED_HEADERS if response.has_header(name)
+        },
+    }
+
+
+def replay(stored, request_fingerprint):
+    if stored["fingerprint"] != request_fingerprint:
+        raise IdempotencyKeyMismatch
+    if stored.get("failed"):
+        raise IdempotencyKeyFailed
+    response = Response(stored["data"], status=stored["status"])
+    for name, value in stored["headers"].items():
+        response[name] = value
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def check_in_flight(lock, request_fingerprint):
+    if lock is not None and lock != request_fingerprint:
+        raise IdempotencyKeyMismatch
+
+
+class Idempotency:
+    """
+    Runs a view once per `Idempotency-Key` and replays its response.
+
+    The first request holds a cache lock while the view runs and stores the
+    response for `ttl` seconds. Retries with the same key and body get the
+    stored response. A key reused for a different request gets a 422.
+    Requests without the header are not affected.
+
+    Retries that arrive while the first request runs wait for its response
+    for up to `wait` seconds, or until the request's deadline, and then get
+    a 409 with Retry-After. If the first request fails with a server error,
+    the key is marked failed and its retries get a 409 instead of a second
+    write.
+    """
+
+    poll_interval = 0.1
+
+    def __init__(self, ttl=None, wait=None, lock_timeout=None):
+        self.ttl = ttl or settings.IDEMPOTENCY_KEY_TTL
+        self.wait = settings.IDEMPOTENCY_WAIT if wait is None else wait
+        self.lock_timeout = lock_timeout or settings.IDEMPOTENCY_LOCK_TIMEOUT
+
+    def poll_delay(self, deadline):
+        return max(0, min(self.poll_interval, deadline - time.monotonic()))
+
+    @staticmethod
+    def check_waited(deadline):
+        """Ends polling once `deadline` has passed."""
+        if time.monotonic() < deadline:
+            return
+        if expired():
+            raise DeadlineExceeded
+        raise IdempotencyKeyInUse(wait=1)
+
+    def run(self, key, request_fingerprint, view):
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + capped(self.wait)
+        while True:
+            stored = cache.get(key)
+            if stored is not None:
+                return replay(stored, request_fingerprint)
+            if cache.add(lock_key, request_fingerprint, timeout=self.lock_timeout):
+                try:
+                    response = view()
+                except BaseException as e:
+                    if is_server_error(e):
+                        cache.set(key, failed(request_fingerprint), timeout=self.ttl)
+                    raise
+                else:
+                    cache.set(
+                        key, record(response, request_fingerprint), timeout=self.ttl
+                    )
+                    return response
+                finally:
+                    cache.delete(lock_key)
+            check_in_flight(cache.get(lock_key), request_fingerprint)
+            self.check_waited(deadline)
+            time.sleep(self.poll_delay(deadline))
+
+    async def arun(self, key, request_fingerprint, view):
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + capped(self.wait)
+        while True:
+            stored = await cache.aget(key)
+            if stored is not None:
+                return replay(stored, request_fingerprint)
+            if await cache.aadd(
+                lock_key, request_fingerprint, timeout=self.lock_timeout
+            ):
+                try:
+                    response = await view()
+                except BaseException as e:
+                    if is_server_error(e):
+                        await cache.aset(
+                            key, failed(request_fingerprint), timeout=self.ttl
+                        )
+                    raise
+                else:
+                    await cache.aset(
+                        key, record(response, request_fingerprint), timeout=self.ttl
+                    )
+                    return response
+                finally:
+                    await cache.adelete(lock_key)
+            check_in_flight(await cache.aget(lock_key), request_fingerprint)
+            self.check_waited(deadline)
+            await asyncio.sleep(self.poll_delay(deadline))
+
+
+def idempotent(view):
+    """Makes a viewset action honour the `Idempotency-Key` header."""
+    if asyncio.iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def async_wrapper(self, request, *args, **kwargs):
+            key = idempotency_key(request)
+            if key is None:
+                return await view(self, request, *args, **kwargs)
+            return await Idempotency().arun(
+                key,
+                fingerprint(request),
+                lambda: view(self, request, *args, **kwargs),
+            )
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = idempotency_key(request)
+        if key is None:
+            return view(self, request, *args, **kwargs)
+        return Idempotency().run(
+            key, fingerprint(request), lambda: view(self, request, *args, **kwargs)
+        )
+
+    return wrapper
@@ -1,18 +1,61 @@
 import uuid
+import asyncio
+import base64
+import contextvars
+import hashlib
 import logging
+import re
+import time
+import weakref
 
 from io import BytesIO
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from urllib.parse import urlencode
 from urllib.parse import urljoin
+from urllib.parse import urlsplit
 
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse
 from django.http import HttpResponse
+from django.http import HttpResponseNotModified
+from django.http import HttpResponseRedirect
+from django.http import StreamingHttpResponse
+from django.utils.http import parse_etags
 from requests.auth import HTTPBasicAuth
 
 from tickets.events import JiraTicketCommentCreated
 from tickets.models import Ticket
 from tickets.serializers import JiraIssueCommentSerializer
 from tickets.serializers import JiraIssueTypeSerializer
+from utils.batching import AsyncMicroBatcher
+from utils.batching import MicroBatcher
+from utils.cache import astale_while_revalidate
+from utils.cache import bump_generation
+from utils.cache import get_generation
+from utils.cache import make_key
+from utils.cache import stale_while_revalidate
+from utils.circuitbreaker import CircuitBreaker
+from utils.circuitbreaker import CircuitOpen
+from utils.circuitbreaker import aserve_stale_on_open
+from utils.circuitbreaker import serve_stale_on_open
+from utils.deadline import DeadlineExceeded
+from utils.deadline import bounded
+from utils.deadline import expired
+from utils.diskcache import DiskCache
+from utils.hedging import Hedger
+from utils.http import PooledSession
+from utils.http import parse_range
+from utils.ratelimit import JiraRateLimiter
+from utils.ratelimit import RateLimitedTransport
+from utils.singleflight import AsyncSingleFlight
+from utils.singleflight import SingleFlight
 
 
 logger = logging.getLogger(__name__)
@@ -31,7 +74,10 @@ class Categories:
     TECHNICAL = "فنی"
     SALES = "فروش"
 
-class JiraService:
+FieldProfile = namedtuple("FieldProfile", ["fields", "expand"], defaults=[()])
+
+
+class BaseJiraService:
     customer_id_field = "customfield_10200"
     category_field = "customfield_10203"
     panel_customer_name_field = "customfield_10300"
@@ -49,14 +95,500 @@ class JiraService:
         Ticket.SALE: Categories.SALES,
     }
 
+    # Jira `fields`/`expand` sent for each kind of read. Sparse `?fields=`
+    # requests must pick from their endpoint's profile.
+    FIELD_PROFILES = {
+        "list": FieldProfile(
+            fields=(
+                "summary",
+                "status",
+                "priority",
+                "issuetype",
+                "created",
+                "updated",
+                customer_id_field,
+                "customfield_10201",
+            )
+        ),
+        "detail": FieldProfile(
+            fields=(
+                "summary",
+                "description",
+                "project",
+                "creator",
+                "reporter",
+                "assignee",
+                "status",
+                "priority",
+                "issuetype",
+                "resolution",
+                "created",
+                "updated",
+                "attachment",
+                customer_id_field,
+                "customfield_10201",
+                category_field,
+            )
+        ),
+        "ownership": FieldProfile(fields=(customer_id_field,)),
+        # What a download checks before an attachment is served.
+        "attachments": FieldProfile(fields=(customer_id_field, "attachment")),
+    }
+
+    ATTACHMENT_CHUNK_SIZE = 64 * 1024
+    # Attachments never change once uploaded.
+    ATTACHMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+    # Upstream headers an attachment download passes through.
+    ATTACHMENT_HEADERS = (
+        "Content-Type",
+        "Content-Length",
+        "Content-Range",
+        "Content-Disposition",
+        "Accept-Ranges",
+        "ETag",
+        "Last-Modified",
+    )
+
+    # proxy: stream through Django; accel: hand the cached file to nginx with
+    # X-Accel-Redirect; signed: redirect to a short-lived nginx secure_link URL.
+    ATTACHMENT_DELIVERIES = ("proxy", "accel", "signed")
+
+    # Each class gets its own circuit breaker and timeout.
+    ENDPOINT_CLASSES = ("search", "issue", "comment", "attachment")
+    # GETs of these classes are hedged when hedging is on.
+    HEDGED_CLASSES = ("issue", "comment")
+    ISSUE_ID_PATTERN = re.compile(r"\d+|[A-Z][A-Z0-9_]*-\d+")
+    transport_errors = ()
+
 
     def __init__(
-        self, base_url=None, username=None, password=None, default_project_key=None
+        self,
+        base_url=None,
+        username=None,
+        password=None,
+        default_project_key=None,
+        issue_cache_ttl=300,
+        list_cache_ttl=30,
+        list_stale_ttl=300,
+        coalesce_wait=5,
+        circuit_breaker=None,
+        stale_fallback_ttl=86400,
+        attachment_cache_dir=None,
+        attachment_cache_size=0,
+        attachment_delivery="proxy",
+        attachment_accel_location="/internal/jira-attachments/",
+        attachment_signed_location="/tickets/attachment-files/",
+        attachment_url_secret=None,
+        attachment_url_ttl=300,
+        attachment_upload_workers=4,
+        rate_limit=None,
+        hedging=None,
+        detail_batch_window=0,
+        detail_batch_size=50,
     ):
-        self.auth = HTTPBasicAuth(username=username, password=password)
+        self.username = username
+        self.password = password
         self.bare_base_url = base_url
         self.base_url = urljoin(base_url, "/rest/api/2/")
         self.default_project_key = default_project_key
+        self.issue_cache_ttl = issue_cache_ttl
+        self.list_cache_ttl = list_cache_ttl
+        self.list_stale_ttl = list_stale_ttl
+        self.coalesce_wait = coalesce_wait
+        self.stale_fallback_ttl = stale_fallback_ttl
+        self.attachment_cache = DiskCache(attachment_cache_dir, attachment_cache_size)
+        if attachment_delivery not in self.ATTACHMENT_DELIVERIES:
+            raise ImproperlyConfigured(
+                f"Unknown attachment delivery {attachment_delivery!r}"
+            )
+        if attachment_delivery != "proxy" and not self.attachment_cache.enabled:
+            raise ImproperlyConfigured(
+                f"Attachment delivery {attachment_delivery!r} needs the "
+                "attachment cache"
+            )
+        if attachment_delivery == "signed" and not attachment_url_secret:
+            raise ImproperlyConfigured("Signed attachment URLs need a secret")
+        self.attachment_delivery = attachment_delivery
+        self.attachment_accel_location = attachment_accel_location
+        self.attachment_signed_location = attachment_signed_location
+        self.attachment_url_secret = attachment_url_secret
+        self.attachment_url_ttl = attachment_url_ttl
+        self.attachment_upload_workers = attachment_upload_workers
+        self.rate_limiter = JiraRateLimiter(**rate_limit) if rate_limit else None
+        self.hedger = Hedger(**hedging) if hedging else None
+        self.detail_batch_window = detail_batch_window
+        self.detail_batch_size = detail_batch_size
+        self.breakers = {
+            name: CircuitBreaker(
+                f"jira:{name}", errors=self.transport_errors, **(circuit_breaker or {})
+            )
+            for name in self.ENDPOINT_CLASSES
+        }
+
+    @staticmethod
+    def ticket_cache_key(ticket_id, profile="detail"):
+        return f"jira:issue:{ticket_id}:{profile}"
+
+    def ticket_cache_keys(self, ticket_id):
+        return [
+            self.ticket_cache_key(ticket_id, profile) for profile in self.FIELD_PROFILES
+        ]
+
+    @staticmethod
+    def project_issue(issue, fields):
+        """Narrows an issue to `fields`, as Jira would have returned it."""
+        projected = {key: value for key, value in issue.items() if key != "fields"}
+        projected["fields"] = {
+            field: value for field, value in issue["fields"].items() if field in fields
+        }
+        return projected
+
+    @staticmethod
+    def endpoint_class(path):
+        path = urlsplit(path).path.rstrip("/")
+        if path.endswith("search"):
+            return "search"
+        if "/attachment" in path:
+            return "attachment"
+        if path.endswith("/comment"):
+            return "comment"
+        return "issue"
+
+    def hedge_delay(self, method, endpoint_class):
+        """Seconds before a second attempt is sent, or None for no hedging."""
+        if self.hedger is None or method != "GET":
+            return None
+        if endpoint_class not in self.HEDGED_CLASSES:
+            return None
+        return self.hedger.delay(self.breakers[endpoint_class])
+
+    @staticmethod
+    def flight_key(path, params=None):
+        return make_key("jira:GET", path, params)
+
+    @staticmethod
+    def last_good_key(path, params=None):
+        return make_key("jira:last-good", path, params)
+
+    @staticmethod
+    def ticket_list_namespace(customer_id):
+        # Admin-host lists are not filtered by customer and share one namespace.
+        return f"jira:tickets:{customer_id or '*'}"
+
+    def ticket_list_key(self, customer_id, *params):
+        namespace = self.ticket_list_namespace(customer_id)
+        return make_key(namespace, get_generation(namespace), *params)
+
+    def invalidate_ticket_lists(self, customer_id=None):
+        bump_generation(self.ticket_list_namespace(None))
+        if customer_id:
+            bump_generation(self.ticket_list_namespace(customer_id))
+
+    def search_payload(self, customer_id=None, page=None, page_size=None, ticket_id=None, ordering="created DESC", fields=()):
+        page = page or 1
+        page_size = page_size or 10
+        profile = self.FIELD_PROFILES["list"]
+        payload = {
+            "startAt": (page - 1) * page_size,
+            "maxResults": page_size,
+            "fields": list(fields or profile.fields),
+        }
+        if profile.expand:
+            payload["expand"] = list(profile.expand)
+
+        jql_parts = []
+        if customer_id:
+            jql_parts.append(f"customer_id ~ {customer_id}")
+        if ticket_id:
+            jql_parts.append(f"id = {ticket_id}")
+        
+        jql_parts.append(f'project = "{"TPP"}"')
+
+        jql_query = " AND ".join(jql_parts) if jql_parts else ""
+        if ordering:
+            jql_query += f" ORDER BY {ordering}"
+
+        if jql_query:
+            payload["jql"] = jql_query
+        return payload
+
+    def ticket_detail_path(self, ticket_id, fields=(), expand=()):
+        path = f"/rest/api/2/issue/{ticket_id}"
+        params = {"fields": ",".join(fields), "expand": ",".join(expand)}
+        if query := urlencode({k: v for k, v in params.items() if v}, safe=","):
+            path += f"?{query}"
+        return path
+
+    def batches_detail(self, ticket_id):
+        # Anything but a plain id or key would be spliced into JQL.
+        return self.detail_batcher is not None and bool(
+            self.ISSUE_ID_PATTERN.fullmatch(str(ticket_id))
+        )
+
+    @staticmethod
+    def detail_batch_payload(ids, fields=(), expand=()):
+        """Searches for the issues `ids` (ids or keys) in one call."""
+        payload = {
+            "jql": f"id in ({', '.join(ids)})",
+            "maxResults": len(ids),
+            "fields": list(fields) or ["*all"],
+            # Unknown ids are dropped with a warning instead of failing the
+            # whole batch; they are then fetched one by one.
+            "validateQuery": "warn",
+        }
+        if expand:
+            payload["expand"] = list(expand)
+        return payload
+
+    def detail_batch_group(self, fields=(), profile="detail"):
+        profile = self.FIELD_PROFILES[profile]
+        return tuple(fields or profile.fields), profile.expand
+
+    @staticmethod
+    def pick_issues(found, ticket_ids):
+        """The issues of `ticket_ids` that were found, in the order asked."""
+        return [found[str(i)] for i in ticket_ids if str(i) in found]
+
+    @staticmethod
+    def index_issues(issues):
+        """Maps the issues of a search to both their ids and their keys."""
+        found = {}
+        for issue in issues:
+            found[issue["id"]] = found[issue["key"]] = issue
+        return found
+
+    def comments_params(self, page=None, page_size=None):
+        page = int(page or 1)
+        page_size = int(page_size or 10)
+        return {
+            "startAt": (page - 1) * page_size,
+            "maxResults": page_size
+        }
+
+    @staticmethod
+    def attachment_request_headers(headers):
+        headers = headers or {}
+        # Lengths and ranges then count the file's own bytes.
+        return {"Accept-Encoding": "identity"} | {
+            name: headers[name] for name in ("Range", "If-Range") if headers.get(name)
+        }
+
+    @staticmethod
+    def attachment_length(headers):
+        """The file size Jira announced, or None when it is unknown."""
+        if headers.get("Content-Encoding", "identity") != "identity":
+            # The length is of the encoded body, which the client decodes.
+            return None
+        size = headers.get("Content-Length")
+        return None if size is None else int(size)
+
+    def attachment_response(self, attachment_id, status, headers, body):
+        response = StreamingHttpResponse(body, status=status)
+        for name in self.ATTACHMENT_HEADERS:
+            if name == "Content-Length" and self.attachment_length(headers) is None:
+                continue
+            if value := headers.get(name):
+                response[name] = value
+        if status in (200, 206):
+            response["ETag"] = self.attachment_etag(attachment_id)
+            response["Cache-Control"] = self.ATTACHMENT_CACHE_CONTROL
+        return response
+
+    @staticmethod
+    def attachment_etag(attachment_id):
+        return f'"jira-attachment-{attachment_id}"'
+
+    @property
+    def offloads_attachments(self):
+        return self.attachment_delivery != "proxy"
+
+    def cached_attachment_response(self, attachment_id, filename, headers):
+        """
+        Answers a download from the client's or the local cache, or returns
+        None when Jira has to be asked.
+        """
+        headers = headers or {}
+        etag = self.attachment_etag(attachment_id)
+        if_none_match = parse_etags(headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        elif self.attachment_cache.enabled and (
+            entry := self.attachment_cache.open(attachment_id)
+        ):
+            file, metadata = entry
+            if self.offloads_attachments:
+                file.close()
+                return self.offloaded_attachment_response(
+                    attachment_id, filename, metadata
+                )
+            response = self.file_response(file, metadata, headers, etag)
+        else:
+            return None
+        response["ETag"] = etag
+        response["Cache-Control"] = self.ATTACHMENT_CACHE_CONTROL
+        return response
+
+    def offloaded_attachment_response(self, attachment_id, filename, metadata):
+        """Leaves sending a cached attachment to nginx."""
+        if self.attachment_delivery == "signed":
+            response = HttpResponseRedirect(
+                self.signed_attachment_url(attachment_id, filename)
+            )
+            # The URL expires, so the redirect must not outlive it.
+            response["Cache-Control"] = "private, no-store"
+            return response
+
+        # nginx keeps these headers and serves the body, ranges included.
+        response = HttpResponse(content_type=metadata["content_type"])
+        location = f"{self.attachment_accel_location}{attachment_id}"
+        response["X-Accel-Redirect"] = location
+        if content_disposition := metadata.get("content_disposition"):
+            response["Content-Disposition"] = content_disposition
+        response["ETag"] = self.attachment_etag(attachment_id)
+        response["Cache-Control"] = self.ATTACHMENT_CACHE_CONTROL
+        return response
+
+    def signed_attachment_url(self, attachment_id, filename):
+        """
+        Returns a URL checked by nginx's secure_link module:
+        md5 over "<expires><path> <secret>", base64url without padding.
+        """
+        expires = int(time.time()) + self.attachment_url_ttl
+        path = f"{self.attachment_signed_location}{attachment_id}/{filename}"
+        digest = hashlib.md5(
+            f"{expires}{path} {self.attachment_url_secret}".encode()
+        ).digest()
+        signature = base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+        query = urlencode({"md5": signature, "expires": expires})
+        return f"{quote(path)}?{query}"
+
+    def staged_attachment_response(self, attachment_id, filename):
+        """
+        Hands an attachment that was just drained into the cache to nginx, or
+        returns None if it could not be cached after all.
+        """
+        entry = self.attachment_cache.open(attachment_id)
+        if entry is None:
+            return None
+        file, metadata = entry
+        file.close()
+        return self.offloaded_attachment_response(attachment_id, filename, metadata)
+
+    def file_response(self, file, metadata, headers, etag):
+        size = metadata["size"]
+        byte_range = None
+        if headers.get("If-Range", etag) == etag:
+            byte_range = parse_range(headers.get("Range"), size)
+
+        if byte_range is None:
+            # Served with sendfile where the server supports it.
+            response = FileResponse(file, content_type=metadata["content_type"])
+        elif byte_range is False:
+            file.close()
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+        else:
+            start, end = byte_range
+            file.seek(start)
+            response = StreamingHttpResponse(
+                self.read_file(file, end - start + 1),
+                status=206,
+                content_type=metadata["content_type"],
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = end - start + 1
+
+        response["Accept-Ranges"] = "bytes"
+        if content_disposition := metadata.get("content_disposition"):
+            response["Content-Disposition"] = content_disposition
+        elif response.has_header("Content-Disposition"):
+            del response["Content-Disposition"]
+        return response
+
+    @classmethod
+    def read_file(cls, file, length):
+        with file:
+            while length > 0:
+                chunk = file.read(min(length, cls.ATTACHMENT_CHUNK_SIZE))
+                if not chunk:
+                    return
+                length -= len(chunk)
+                yield chunk
+
+    def cache_attachment(
+        self, attachment_id, headers, chunks, asynchronous=False, staging=False
+    ):
+        """
+        Tees a full download from Jira into the attachment cache. Without a
+        Content-Length (e.g. chunked), the writer counts the bytes and drops
+        the entry as soon as it outgrows the cache.
+        """
+        size = self.attachment_length(headers) or 0
+        if not self.attachment_cache.enabled or size > self.attachment_cache.max_bytes:
+            return chunks
+        metadata = {
+            "content_type": headers.get("Content-Type"),
+            "content_disposition": headers.get("Content-Disposition"),
+        }
+        try:
+            writer = self.attachment_cache.writer(attachment_id, metadata)
+        except OSError:
+            logger.warning(
+                "Could not cache attachment %s", attachment_id, exc_info=True
+            )
+            return chunks
+        if asynchronous:
+            return writer.atee(chunks, staging=staging)
+        return writer.tee(chunks, staging=staging)
+
+    @staticmethod
+    def attachment_files(uploaded_files):
+        return [("file", (f.name, f)) for f in uploaded_files]
+
+    @staticmethod
+    def upload_error(error):
+        response = getattr(error, "response", None)
+        if response is not None:
+            return response.text
+        return str(getattr(error, "detail", error))
+
+    @staticmethod
+    def rewind(uploaded_files):
+        for uploaded_file in uploaded_files:
+            uploaded_file.seek(0)
+
+    def attachment_url(self, attachment_id, filename):
+        path = f"/secure/attachment/{attachment_id}/{filename}"
+        return urljoin(self.bare_base_url, path)
+
+
+class JiraService(BaseJiraService):
+    transport_errors = (requests.RequestException,)
+
+    def __init__(self, pool_size=10, pool_block=False, keep_alive=True, **kwargs):
+        super().__init__(**kwargs)
+        self.auth = HTTPBasicAuth(username=self.username, password=self.password)
+        self.pool = PooledSession(
+            auth=self.auth,
+            pool_size=pool_size,
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+            rate_limiter=self.rate_limiter,
+        )
+        self.flights = SingleFlight(wait=self.coalesce_wait)
+        self.detail_batcher = (
+            MicroBatcher(
+                self.fetch_ticket_batch,
+                self.detail_batch_window,
+                self.detail_batch_size,
+            )
+            if self.detail_batch_window
+            else None
+        )
+
+    @property
+    def session(self):
+        return self.pool.get()
 
 
     def request(self, method, path, headers=None, **kwargs):
@@ -66,14 +598,19 @@ class JiraService:
             headers.setdefault("Content-Type", "application/json")
 
         url = urljoin(self.base_url, path)
-        return requests.request(
-            method,
-            url,
-            headers=headers,
-            timeout=5,
-            verify=False,
-            auth=self.auth,
-            **kwargs,
+
+        def send(timeout):
+            with bounded(timeout, self.transport_errors) as timeout:
+                return self.session.request(
+                    method, url, headers=headers, timeout=timeout, **kwargs
+                )
+
+        endpoint_class = self.endpoint_class(path)
+        if self.hedger is None:
+            return self.breakers[endpoint_class].call(send)
+        return self.hedger.call(
+            lambda: self.breakers[endpoint_class].call(send),
+            self.hedge_delay(method, endpoint_class),
         )
 
 
@@ -105,67 +642,153 @@ class JiraService:
         return response.json()
     
     def add_attachment(self, ticket_id, django_uploaded_file):
+        return self.upload_attachments(ticket_id, [django_uploaded_file])
+
+    def upload_attachments(self, ticket_id, django_uploaded_files):
         path = f"/rest/api/2/issue/{ticket_id}/attachments"
         headers = {
             "X-Atlassian-Token": "no-check"
         }
 
-        files = {
-            "file": (django_uploaded_file.name, django_uploaded_file)
-        }
-        
         response = self.request(
             method="POST",
             path=path,
             headers=headers,
-            files=files,
+            files=self.attachment_files(django_uploaded_files),
         )
         response.raise_for_status()
         return response.json()
-    
-    def fetch_tickets(self, customer_id=None, page=None, page_size=None, ticket_id=None, ordering="created DESC", project=None):
-        page = page or 1
-        page_size = page_size or 10
-        payload = {
-            "startAt": (page - 1) * page_size,
-            "maxResults": page_size,
-        }
 
-        jql_parts = []
-        if customer_id:
-            jql_parts.append(f"customer_id ~ {customer_id}")
-        if ticket_id:
-            jql_parts.append(f"id = {ticket_id}")
-        
-        jql_parts.append(f'project = "{"TPP"}"')
+    def add_attachments(self, ticket_id, django_uploaded_files):
+        """
+        Uploads files to an issue and returns `(attachments, errors)`, where
+        `errors` maps the name of each file that failed to the reason.
 
-        jql_query = " AND ".join(jql_parts) if jql_parts else ""
-        if ordering:
-            jql_query += f" ORDER BY {ordering}"
+        All files go to Jira in one multipart request. If Jira rejects it,
+        they are retried one per request on a bounded pool so that the good
+        ones still land. Transport errors are not retried, as Jira may have
+        stored the files already.
+        """
+        uploaded_files = list(django_uploaded_files)
+        if len(uploaded_files) > 1:
+            try:
+                return self.upload_attachments(ticket_id, uploaded_files), {}
+            except requests.HTTPError as e:
+                logger.warning("Jira rejected attachments for %s: %s", ticket_id, e)
+                self.rewind(uploaded_files)
+            except (requests.RequestException, CircuitOpen) as e:
+                return [], {f.name: self.upload_error(e) for f in uploaded_files}
 
-        if jql_query:
-            payload["jql"] = jql_query
+        attachments, errors = [], {}
+        if not uploaded_files:
+            return attachments, errors
+        workers = min(self.attachment_upload_workers, len(uploaded_files))
+
+        def upload(uploaded_file):
+            return self.upload_attachments(ticket_id, [uploaded_file])
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each upload runs in a copy of this context to keep the deadline.
+            futures = [
+                (f, pool.submit(contextvars.copy_context().run, upload, f))
+                for f in uploaded_files
+            ]
+        for uploaded_file, future in futures:
+            try:
+                attachments.extend(future.result())
+            except (requests.RequestException, CircuitOpen) as e:
+                errors[uploaded_file.name] = self.upload_error(e)
+        return attachments, errors
+    
+    def fetch_tickets(self, customer_id=None, page=None, page_size=None, ticket_id=None, ordering="created DESC", project=None, fields=()):
+        payload = self.search_payload(
+            customer_id=customer_id,
+            page=page,
+            page_size=page_size,
+            ticket_id=ticket_id,
+            ordering=ordering,
+            fields=fields,
+        )
+
+        def fetch():
+            response = self.request("POST", "search", json=payload)
+            response.raise_for_status()
+            return response.json()
+
+        if not self.list_cache_ttl:
+            return fetch()
+        key = self.ticket_list_key(
+            customer_id, page, page_size, ordering, ticket_id, tuple(fields)
+        )
+        return stale_while_revalidate(
+            key, fetch, self.list_cache_ttl, self.list_stale_ttl
+        )
 
+    def search_issues(self, jql, start_at=0, max_results=100, fields=None):
+        payload = {"jql": jql, "startAt": start_at, "maxResults": max_results}
+        if fields:
+            payload["fields"] = fields
         response = self.request("POST", "search", json=payload)
         response.raise_for_status()
         return response.json()
 
+    def fetch_ticket_batch(self, group, ids):
+        fields, expand = group
+        payload = self.detail_batch_payload(ids, fields, expand)
+        response = self.request("POST", "search", json=payload)
+        response.raise_for_status()
+        return self.index_issues(response.json()["issues"])
+
+    def fetch_ticket_details(self, ticket_ids, fields=(), profile="detail"):
+        """Looks up several issues with one search, leaving out unknown ones."""
+        group = self.detail_batch_group(fields, profile)
+        found = self.fetch_ticket_batch(group, [str(i) for i in ticket_ids])
+        return self.pick_issues(found, ticket_ids)
 
     def fetch_ticket_detail(
         self,
         ticket_id,
         fields=(),
+        profile="detail",
     ):
-        path = f"/rest/api/2/issue/{ticket_id}"
-        if fields:
-            path += f"?fields={','.join(fields)}"
+        expand = self.FIELD_PROFILES[profile].expand
+        sparse = bool(fields)
+        fields = tuple(fields or self.FIELD_PROFILES[profile].fields)
+        path = self.ticket_detail_path(ticket_id, fields, expand)
 
-        response = self.request(
-            method="GET",
-            path=path,
+        def request():
+            # Concurrent lookups share one search; issues it did not find
+            # are asked for directly so that Jira answers 404 for them.
+            if self.batches_detail(ticket_id):
+                try:
+                    issue = self.detail_batcher.get((fields, expand), str(ticket_id))
+                except DeadlineExceeded:
+                    # The batch ran out of another caller's time, not ours.
+                    if expired():
+                        raise
+                    issue = None
+                if issue is not None:
+                    return issue
+            response = self.request(method="GET", path=path)
+            response.raise_for_status()
+            return response.json()
+
+        def fetch():
+            return self.flights.do(self.flight_key(path), request)
+
+        # Only named profiles are cached, and kept to answer while the
+        # circuit is open; sparse reads go straight to Jira.
+        if sparse:
+            return fetch()
+        return serve_stale_on_open(
+            self.ticket_cache_key(ticket_id, profile),
+            fetch,
+            self.issue_cache_ttl,
+            self.stale_fallback_ttl,
         )
-        response.raise_for_status()
-        return response.json()
+
+    def invalidate_ticket(self, ticket_id):
+        cache.delete_many(self.ticket_cache_keys(ticket_id))
 
 
 
@@ -209,24 +832,25 @@ class JiraService:
         return created_ticket_data
     
     def fetch_ticket_comments(self, ticket_id, page=None, page_size=None):
-        page = int(page or 1)
-        page_size = int(page_size or 10)
-        start_at = (page - 1) * page_size
-
         path = f"/rest/api/2/issue/{ticket_id}/comment"
-        params = {
-            "startAt": start_at,
-            "maxResults": page_size
-        }
+        params = self.comments_params(page, page_size)
 
-        try:
-            response = self.request(
-                method="GET",
-                path=path,
-                params=params
-            )
+        def request():
+            response = self.request(method="GET", path=path, params=params)
             response.raise_for_status()
             return response.json()
+
+        try:
+            return self.flights.do(
+                self.flight_key(path, params),
+                # Comments are not cached, only kept for an open circuit.
+                lambda: serve_stale_on_open(
+                    self.last_good_key(path, params),
+                    request,
+                    0,
+                    self.stale_fallback_ttl,
+                ),
+            )
         except requests.HTTPError as e:
             # logger.error(f"Failed to fetch comments for ticket {ticket_id}: {e}")
             raise
@@ -257,32 +881,368 @@ class JiraService:
         # self.event_store.add_event(event)
         return followup_data
     
-    def download_attachment(
-        self,
-        attachment_id,
-        filename
-    ):
-        path = f"/secure/attachment/{attachment_id}/{filename}"
-        url = urljoin(self.bare_base_url, path)
-        response = requests.request(
-            "GET",
-            url,
-            timeout=5,
-            verify=False,
+    def download_attachment(self, attachment_id, filename, headers=None, offload=True):
+        """
+        Streams an attachment from Jira. `headers` may carry the client's
+        Range and If-Range, which are forwarded so downloads can resume.
+        Full downloads are kept in the attachment cache.
+
+        When delivery is offloaded, the whole file is staged in the cache
+        first and nginx sends it; only what cannot be cached is streamed, for
+        the client's Range if it sent one.
+        """
+        if cached := self.cached_attachment_response(attachment_id, filename, headers):
+            return cached
+
+        offload = offload and self.offloads_attachments
+
+        def send(timeout):
+            with bounded(timeout, self.transport_errors) as timeout:
+                return self.session.request(
+                    "GET",
+                    self.attachment_url(attachment_id, filename),
+                    headers=self.attachment_request_headers(
+                        None if offload else headers
+                    ),
+                    stream=True,
+                    timeout=timeout,
+                )
+
+        response = self.breakers["attachment"].call(send)
+
+        def body():
+            try:
+                yield from response.iter_content(self.ATTACHMENT_CHUNK_SIZE)
+            finally:
+                response.close()
+
+        chunks = body()
+        if response.status_code == 200:
+            teed = self.cache_attachment(
+                attachment_id, response.headers, chunks, staging=offload
+            )
+            if offload and teed is chunks and (headers or {}).get("Range"):
+                # Too large to stage: ask again for the range the client wants.
+                response.close()
+                return self.download_attachment(
+                    attachment_id, filename, headers, offload=False
+                )
+            if offload and teed is not chunks:
+                for _ in teed:
+                    pass
+                if staged := self.staged_attachment_response(attachment_id, filename):
+                    return staged
+                # Could not be cached (a full disk, or too large): stream it.
+                return self.download_attachment(
+                    attachment_id, filename, headers, offload=False
+                )
+            chunks = teed
+        return self.attachment_response(
+            attachment_id, response.status_code, response.headers, chunks
+        )
+
+
+class AsyncJiraService(BaseJiraService):
+    """
+    asyncio counterpart of `JiraService` for the ASGI views.
+
+    Connections are pooled per event loop, so a single uvicorn worker can keep
+    hundreds of Jira calls in flight. httpcore scans its whole pool for every
+    queued request, so the pool is split across several small clients that
+    are used round-robin.
+    """
+
+    CLIENT_POOL_SIZE = 10
+    transport_errors = (httpx.TransportError,)
+
+    def __init__(self, pool_size=100, keep_alive=True, http2=True, **kwargs):
+        super().__init__(**kwargs)
+        self.auth = httpx.BasicAuth(
+            username=self.username or "", password=self.password or ""
+        )
+        client_pool_size = min(pool_size, self.CLIENT_POOL_SIZE)
+        self.limits = httpx.Limits(
+            max_connections=client_pool_size,
+            max_keepalive_connections=client_pool_size if keep_alive else 0,
+        )
+        self.shards = max(1, pool_size // client_pool_size)
+        self.http2 = http2
+        self._clients = weakref.WeakKeyDictionary()
+        self.flights = AsyncSingleFlight(wait=self.coalesce_wait)
+        self.detail_batcher = (
+            AsyncMicroBatcher(
+                self.fetch_ticket_batch,
+                self.detail_batch_window,
+                self.detail_batch_size,
+            )
+            if self.detail_batch_window
+            else None
+        )
+        self._next_client = 0
+
+    def build_client(self):
+        if self.rate_limiter is None:
+            return httpx.AsyncClient(
+                auth=self.auth,
+                limits=self.limits,
+                http2=self.http2,
+                verify=False,
+                timeout=5,
+            )
+        transport = httpx.AsyncHTTPTransport(
+            limits=self.limits, http2=self.http2, verify=False
+        )
+        return httpx.AsyncClient(
             auth=self.auth,
+            transport=RateLimitedTransport(transport, self.rate_limiter),
+            timeout=5,
         )
 
-        django_response = HttpResponse(
-            content=response.content,
-            status=response.status_code,
-            headers = {
-                'Content-Disposition': response.headers["Content-Disposition"]
-            }
+    @property
+    def client(self):
+        loop = asyncio.get_running_loop()
+        clients = self._clients.get(loop)
+        if clients is None:
+            clients = [self.build_client() for _ in range(self.shards)]
+            self._clients[loop] = clients
+        self._next_client = (self._next_client + 1) % len(clients)
+        return clients[self._next_client]
+
+    async def aclose(self):
+        for client in self._clients.pop(asyncio.get_running_loop(), []):
+            await client.aclose()
+
+    async def request(self, method, path, headers=None, **kwargs):
+        headers = headers or {}
+
+        if "files" not in kwargs:
+            headers.setdefault("Content-Type", "application/json")
+
+        url = urljoin(self.base_url, path)
+
+        async def send(timeout):
+            with bounded(timeout, self.transport_errors) as timeout:
+                return await self.client.request(
+                    method, url, headers=headers, timeout=timeout, **kwargs
+                )
+
+        endpoint_class = self.endpoint_class(path)
+        if self.hedger is None:
+            return await self.breakers[endpoint_class].acall(send)
+        return await self.hedger.acall(
+            lambda: self.breakers[endpoint_class].acall(send),
+            self.hedge_delay(method, endpoint_class),
         )
 
+    async def fetch_tickets(self, customer_id=None, page=None, page_size=None, ticket_id=None, ordering="created DESC", fields=()):
+        payload = self.search_payload(
+            customer_id=customer_id,
+            page=page,
+            page_size=page_size,
+            ticket_id=ticket_id,
+            ordering=ordering,
+            fields=fields,
+        )
 
-        
-        return django_response
+        async def fetch():
+            response = await self.request("POST", "search", json=payload)
+            response.raise_for_status()
+            return response.json()
+
+        if not self.list_cache_ttl:
+            return await fetch()
+        key = await sync_to_async(self.ticket_list_key)(
+            customer_id, page, page_size, ordering, ticket_id, tuple(fields)
+        )
+        return await astale_while_revalidate(
+            key, fetch, self.list_cache_ttl, self.list_stale_ttl
+        )
+
+    async def fetch_ticket_batch(self, group, ids):
+        fields, expand = group
+        payload = self.detail_batch_payload(ids, fields, expand)
+        response = await self.request("POST", "search", json=payload)
+        response.raise_for_status()
+        return self.index_issues(response.json()["issues"])
+
+    async def fetch_ticket_details(self, ticket_ids, fields=(), profile="detail"):
+        group = self.detail_batch_group(fields, profile)
+        found = await self.fetch_ticket_batch(group, [str(i) for i in ticket_ids])
+        return self.pick_issues(found, ticket_ids)
+
+    async def fetch_ticket_detail(self, ticket_id, fields=(), profile="detail"):
+        expand = self.FIELD_PROFILES[profile].expand
+        sparse = bool(fields)
+        fields = tuple(fields or self.FIELD_PROFILES[profile].fields)
+        path = self.ticket_detail_path(ticket_id, fields, expand)
+
+        async def request():
+            if self.batches_detail(ticket_id):
+                try:
+                    issue = await self.detail_batcher.get(
+                        (fields, expand), str(ticket_id)
+                    )
+                except DeadlineExceeded:
+                    if expired():
+                        raise
+                    issue = None
+                if issue is not None:
+                    return issue
+            response = await self.request("GET", path)
+            response.raise_for_status()
+            return response.json()
+
+        async def fetch():
+            return await self.flights.do(self.flight_key(path), request)
+
+        if sparse:
+            return await fetch()
+        return await aserve_stale_on_open(
+            self.ticket_cache_key(ticket_id, profile),
+            fetch,
+            self.issue_cache_ttl,
+            self.stale_fallback_ttl,
+        )
+
+    async def invalidate_ticket(self, ticket_id):
+        await cache.adelete_many(self.ticket_cache_keys(ticket_id))
+
+    async def invalidate_ticket_lists(self, customer_id=None):
+        await sync_to_async(super().invalidate_ticket_lists)(customer_id)
+
+    async def fetch_ticket_comments(self, ticket_id, page=None, page_size=None):
+        path = f"/rest/api/2/issue/{ticket_id}/comment"
+        params = self.comments_params(page, page_size)
+
+        async def request():
+            response = await self.request("GET", path, params=params)
+            response.raise_for_status()
+            return response.json()
+
+        return await self.flights.do(
+            self.flight_key(path, params),
+            lambda: aserve_stale_on_open(
+                self.last_good_key(path, params),
+                request,
+                0,
+                self.stale_fallback_ttl,
+            ),
+        )
+
+    async def create_comment(self, ticket_id, comment_text):
+        path = f"/rest/api/2/issue/{ticket_id}/comment"
+        try:
+            response = await self.request("POST", path, json={"body": comment_text})
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Failed to add comment to ticket {ticket_id}: {e}")
+            raise
+
+    async def add_attachment(self, ticket_id, django_uploaded_file):
+        return await self.upload_attachments(ticket_id, [django_uploaded_file])
+
+    async def upload_attachments(self, ticket_id, django_uploaded_files):
+        path = f"/rest/api/2/issue/{ticket_id}/attachments"
+        headers = {"X-Atlassian-Token": "no-check"}
+        files = self.attachment_files(django_uploaded_files)
+        response = await self.request("POST", path, headers=headers, files=files)
+        response.raise_for_status()
+        return response.json()
+
+    async def add_attachments(self, ticket_id, django_uploaded_files):
+        uploaded_files = list(django_uploaded_files)
+        if len(uploaded_files) > 1:
+            try:
+                return await self.upload_attachments(ticket_id, uploaded_files), {}
+            except httpx.HTTPStatusError as e:
+                logger.warning("Jira rejected attachments for %s: %s", ticket_id, e)
+                self.rewind(uploaded_files)
+            except (httpx.HTTPError, CircuitOpen) as e:
+                return [], {f.name: self.upload_error(e) for f in uploaded_files}
+
+        semaphore = asyncio.Semaphore(self.attachment_upload_workers)
+
+        async def upload(uploaded_file):
+            async with semaphore:
+                return await self.upload_attachments(ticket_id, [uploaded_file])
+
+        results = await asyncio.gather(
+            *(upload(f) for f in uploaded_files), return_exceptions=True
+        )
+        attachments, errors = [], {}
+        for uploaded_file, result in zip(uploaded_files, results):
+            if isinstance(result, (httpx.HTTPError, CircuitOpen)):
+                errors[uploaded_file.name] = self.upload_error(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                attachments.extend(result)
+        return attachments, errors
+
+    async def download_attachment(
+        self, attachment_id, filename, headers=None, offload=True
+    ):
+        if cached := await sync_to_async(self.cached_attachment_response)(
+            attachment_id, filename, headers
+        ):
+            return cached
+
+        offload = offload and self.offloads_attachments
+        client = self.client
+
+        async def send(timeout):
+            with bounded(timeout, self.transport_errors) as timeout:
+                return await client.send(
+                    client.build_request(
+                        "GET",
+                        self.attachment_url(attachment_id, filename),
+                        headers=self.attachment_request_headers(
+                            None if offload else headers
+                        ),
+                        timeout=timeout,
+                    ),
+                    stream=True,
+                )
+
+        response = await self.breakers["attachment"].acall(send)
+
+        async def body():
+            try:
+                async for chunk in response.aiter_bytes(self.ATTACHMENT_CHUNK_SIZE):
+                    yield chunk
+            finally:
+                await response.aclose()
+
+        chunks = body()
+        if response.status_code == 200:
+            teed = self.cache_attachment(
+                attachment_id,
+                response.headers,
+                chunks,
+                asynchronous=True,
+                staging=offload,
+            )
+            if offload and teed is chunks and (headers or {}).get("Range"):
+                await response.aclose()
+                return await self.download_attachment(
+                    attachment_id, filename, headers, offload=False
+                )
+            if offload and teed is not chunks:
+                async for _ in teed:
+                    pass
+                if staged := await sync_to_async(self.staged_attachment_response)(
+                    attachment_id, filename
+                ):
+                    return staged
+                return await self.download_attachment(
+                    attachment_id, filename, headers, offload=False
+                )
+            chunks = teed
+        return self.attachment_response(
+            attachment_id, response.status_code, response.headers, chunks
+        )
 
 
 jira_service = JiraService(**settings.JIRA_SETTINGS)
+async_jira_service = AsyncJiraService(**settings.JIRA_ASYNC_SETTINGS)
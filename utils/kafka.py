@@ -100,7 +100,28 @@ class Consumer:
             msg = f"Failed to commit offsets: {e}"
             logger.exception(msg)
 
-    def start_consuming(self, on_message=None):
+    def send_to_dlq(self, message):
+        if self.dlq_producer:
+            try:
+                self.dlq_producer.send("DLQ", message.value)
+            except KafkaError:
+                report_exception()
+
+    def process_batch(self, messages, on_batch):
+        """
+        Hands a whole poll to `on_batch`, which returns `(message, exception)`
+        for each message that failed; those go to the DLQ one by one.
+        """
+        try:
+            failures = on_batch(messages)
+        except Exception as e:
+            logger.exception(f"Failed to process batch: {e}")
+            failures = [(message, e) for message in messages]
+        for message, exc in failures:
+            logger.error(f"Failed to process message {message.value}: {exc}")
+            self.send_to_dlq(message)
+
+    def start_consuming(self, on_message=None, on_batch=None):
         # Setup signal handling for graceful shutdown
         signal.signal(signal.SIGTERM, self.handle_shutdown_signal)
         signal.signal(signal.SIGINT, self.handle_shutdown_signal)
@@ -111,7 +132,11 @@ class Consumer:
                 try:
                     message_batch = self.consumer.poll(timeout_ms=1000)
 
-                    if message_batch:
+                    if message_batch and on_batch:
+                        self.process_batch(
+                            [m for ms in message_batch.values() for m in ms], on_batch
+                        )
+                    elif message_batch:
                         for messages in message_batch.values():
                             for message in messages:
                                 try:
@@ -123,12 +148,9 @@ class Consumer:
                                 except Exception as e:
                                     msg = f"Failed to process message: {e}"
                                     logger.exception(msg)
-                                    if self.dlq_producer:
-                                        try:
-                                            self.dlq_producer.send("DLQ", message.value)
-                                        except KafkaError as e:
-                                            report_exception()
+                                    self.send_to_dlq(message)
 
+                    if message_batch:
                         # Commit offsets after processing the batch
                         self.commit_offsets()
 
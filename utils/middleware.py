@@ -1,9 +1,13 @@
 import logging
 
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
 from django.conf import settings
 from django.db import connection
 from rest_framework import status
 
+from utils.deadline import deadline
+
 logger = logging.getLogger(__name__)
 
 
@@ -60,3 +64,33 @@ class DeleteCookieMiddleware:
                 response.delete_cookie(cookie)
 
         return response
+
+
+class DeadlineMiddleware:
+    """
+    Gives each request `REQUEST_DEADLINE` seconds for all of its Jira calls.
+    Each call's timeout is cut to what is left and no call is started once
+    it is spent, so chained calls cannot add up past the budget.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REQUEST_DEADLINE:
+            return self.get_response(request)
+        with deadline(settings.REQUEST_DEADLINE):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not settings.REQUEST_DEADLINE:
+            return await self.get_response(request)
+        with deadline(settings.REQUEST_DEADLINE):
+            return await self.get_response(request)
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.utils.http import parse_http_date_safe
+from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
+
+from utils.circuitbreaker import CircuitOpen
+from utils.deadline import remaining
+
+logger = logging.getLogger(__name__)
+
+# Takes `cost` tokens from the bucket at KEYS[1] and returns how many
+# milliseconds the caller must wait before using them. Tokens may go below
+# zero: each waiting caller holds a reservation, so queued calls are spread
+# out at `rate` instead of all retrying together. A caller that would wait
+# more than `max_wait` gets the negated wait and takes nothing. `penalty`
+# seconds of debt are added when Jira answers 429.
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local cost, max_wait = tonumber(ARGV[3]), tonumber(ARGV[4])
+local penalty = tonumber(ARGV[5])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+if penalty > 0 then
+    tokens = math.min(tokens, -penalty * rate)
+end
+local wait = 0
+if tokens < cost then
+    wait = (cost - tokens) / rate
+end
+if wait > max_wait then
+    return -math.ceil(wait * 1000)
+end
+tokens = tokens - cost
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return math.ceil(wait * 1000)
+"""
+
+
+class RateLimited(CircuitOpen):
+    default_detail = _("The ticketing service is busy, please retry shortly.")
+    default_code = "rate_limited"
+
+
+def get_redis():
+    try:
+        from django_redis import get_redis_connection
+
+        return get_redis_connection("default")
+    except NotImplementedError:
+        # The cache is not Redis (local development and tests).
+        return None
+
+
+class TokenBucket:
+    """
+    A token bucket refilled at `rate` tokens per second up to `burst`,
+    shared by every process through Redis. Without a Redis cache each
+    process keeps its own bucket.
+    """
+
+    _local = {}
+    _local_lock = threading.Lock()
+
+    def __init__(self, name, rate, burst, max_wait=5):
+        self.key = f"ratelimit:{name}"
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self._script = None
+        self._redis_checked = False
+
+    @property
+    def script(self):
+        if not self._redis_checked:
+            if (redis := get_redis()) is not None:
+                self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+            self._redis_checked = True
+        return self._script
+
+    def wait_limit(self):
+        # No point queueing past the request's deadline.
+        left = remaining()
+        return self.max_wait if left is None else max(0, min(self.max_wait, left))
+
+    def take_local(self, cost, penalty, max_wait):
+        # Same arithmetic as TOKEN_BUCKET_SCRIPT.
+        now = time.monotonic()
+        with self._local_lock:
+            tokens, ts = self._local.get(self.key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - ts) * self.rate)
+            if penalty > 0:
+                tokens = min(tokens, -penalty * self.rate)
+            wait = max(0, (cost - tokens) / self.rate)
+            if wait > max_wait:
+                return -wait
+            self._local[self.key] = (tokens - cost, now)
+            return wait
+
+    def take(self, cost=1, penalty=0, max_wait=None):
+        """Returns the seconds to wait for `cost` tokens, negated if refused."""
+        if max_wait is None:
+            max_wait = self.wait_limit()
+        if self.script is None:
+            return self.take_local(cost, penalty, max_wait)
+        try:
+            wait = self.script(
+                keys=[self.key],
+                args=[self.rate, self.burst, cost, max_wait, penalty],
+            )
+        except RedisError:
+            # Jira's own throttling is better than no Jira at all.
+            logger.warning("Rate limiter %s unavailable", self.key, exc_info=True)
+            return 0
+        return wait / 1000
+
+    def acquire(self):
+        wait = self.take()
+        if wait < 0:
+            raise RateLimited(wait=round(-wait) or 1)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self):
+        wait = await sync_to_async(self.take, thread_sensitive=False)()
+        if wait < 0:
+            raise RateLimited(wait=round(-wait) or 1)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def penalize(self, seconds):
+        # The debt is recorded however long it is.
+        self.take(cost=0, penalty=seconds, max_wait=10**9)
+
+
+class JiraRateLimiter:
+    """
+    Paces calls to Jira with one token bucket per kind of call: reads
+    (GETs and searches), writes and attachments. `rates` gives the calls
+    per second of each and `burst` how many seconds of calls may be sent at
+    once. Calls over the rate wait up to `max_wait` seconds for their turn
+    and fail with `RateLimited` after that.
+
+    A 429 puts its bucket into debt for Retry-After seconds, or an
+    exponential backoff without one, and the call is retried up to
+    `retries` times with up to `jitter` seconds of random delay.
+    """
+
+    BUCKETS = ("read", "write", "attachment")
+
+    def __init__(self, rates, burst=2, max_wait=5, retries=2, jitter=0.5):
+        self.buckets = {
+            name: TokenBucket(
+                f"jira:{name}", rates[name], rates[name] * burst, max_wait
+            )
+            for name in self.BUCKETS
+            if rates.get(name)
+        }
+        self.retries = retries
+        self.jitter = jitter
+
+    @staticmethod
+    def bucket_name(method, url):
+        path = urlsplit(str(url)).path.rstrip("/")
+        if "/attachment" in path:
+            return "attachment"
+        if method in ("GET", "HEAD") or path.endswith("/search"):
+            return "read"
+        return "write"
+
+    def bucket(self, method, url):
+        return self.buckets.get(self.bucket_name(method, url))
+
+    def backoff(self, response, attempt):
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return int(retry_after)
+        if retry_after and (date := parse_http_date_safe(retry_after)):
+            return max(0, date - time.time())
+        return 2**attempt
+
+    def delay(self):
+        return random.uniform(0, self.jitter)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """A requests adapter that paces its calls with a `JiraRateLimiter`."""
+
+    def __init__(self, limiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        bucket = self.limiter.bucket(request.method, request.url)
+        if bucket is None:
+            return super().send(request, **kwargs)
+        # Streamed bodies cannot be sent twice.
+        replayable = request.body is None or isinstance(request.body, (bytes, str))
+        attempt = 0
+        while True:
+            bucket.acquire()
+            response = super().send(request, **kwargs)
+            if response.status_code != 429 or not replayable:
+                return response
+            if attempt == self.limiter.retries:
+                return response
+            backoff = self.limiter.backoff(response, attempt)
+            logger.warning("Jira throttled %s, backing off %ss", request.url, backoff)
+            bucket.penalize(backoff)
+            response.close()
+            time.sleep(self.limiter.delay())
+            attempt += 1
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """httpx counterpart of `RateLimitedAdapter`."""
+
+    def __init__(self, transport, limiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    async def handle_async_request(self, request):
+        bucket = self.limiter.bucket(request.method, request.url)
+        if bucket is None:
+            return await self.transport.handle_async_request(request)
+        replayable = isinstance(request.stream, httpx.ByteStream)
+        attempt = 0
+        while True:
+            await bucket.aacquire()
+            response = await self.transport.handle_async_request(request)
+            if response.status_code != 429 or not replayable:
+                return response
+            if attempt == self.limiter.retries:
+                return response
+            backoff = self.limiter.backoff(response, attempt)
+            logger.warning("Jira throttled %s, backing off %ss", request.url, backoff)
+            await sync_to_async(bucket.penalize, thread_sensitive=False)(backoff)
+            await response.aclose()
+            await asyncio.sleep(self.limiter.delay())
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
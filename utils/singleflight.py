@@ -0,0 +1,125 @@
+import asyncio
+import copy
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+from django.core.cache import cache
+
+from utils.deadline import DeadlineExceeded
+from utils.deadline import capped
+from utils.deadline import expired
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls so that only one of them runs.
+
+    Inside a process, callers of `do` with the same key wait on the leader's
+    future. Across processes, the leader holds a short cache lock and
+    publishes its result; other processes poll for it for up to `wait`
+    seconds and then run the call themselves. `wait=0` keeps coalescing
+    in-process only. Polling stops at the request's deadline.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, wait=5):
+        self.wait = wait
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def poll_delay(self, deadline):
+        return max(0, min(self.poll_interval, deadline - time.monotonic()))
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            # Callers must not share one mutable result.
+            return copy.deepcopy(call.result())
+
+        try:
+            result = self.shared(key, fn) if self.wait else fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def shared(self, key, fn):
+        lock_key, result_key = f"singleflight:{key}:lock", f"singleflight:{key}"
+        started = time.time()
+        if cache.add(lock_key, 1, timeout=self.wait):
+            try:
+                result = fn()
+                cache.set(result_key, (time.time(), result), timeout=self.wait)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        deadline = time.monotonic() + capped(self.wait)
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_delay(deadline))
+            finished = cache.get(result_key)
+            # Results that finished before this call began may predate a
+            # write this caller has already seen.
+            if finished is not None and finished[0] >= started:
+                return finished[1]
+            if cache.get(lock_key) is None:
+                break
+        if expired():
+            raise DeadlineExceeded
+        return fn()
+
+
+class AsyncSingleFlight(SingleFlight):
+    def __init__(self, wait=5):
+        super().__init__(wait)
+        # Futures are bound to the loop that created them.
+        self._loop_calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, fn):
+        calls = self._loop_calls.setdefault(asyncio.get_running_loop(), {})
+        task = calls.get(key)
+        leader = task is None
+        if leader:
+            # The call runs in its own task so that a cancelled leader does
+            # not cancel it for the callers waiting on it.
+            task = calls[key] = asyncio.ensure_future(
+                self.shared(key, fn) if self.wait else fn()
+            )
+            task.add_done_callback(lambda _: calls.pop(key, None))
+        result = await asyncio.shield(task)
+        return result if leader else copy.deepcopy(result)
+
+    async def shared(self, key, fn):
+        lock_key, result_key = f"singleflight:{key}:lock", f"singleflight:{key}"
+        started = time.time()
+        if await cache.aadd(lock_key, 1, timeout=self.wait):
+            try:
+                result = await fn()
+                await cache.aset(result_key, (time.time(), result), timeout=self.wait)
+                return result
+            finally:
+                await cache.adelete(lock_key)
+
+        deadline = time.monotonic() + capped(self.wait)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_delay(deadline))
+            finished = await cache.aget(result_key)
+            if finished is not None and finished[0] >= started:
+                return finished[1]
+            if await cache.aget(lock_key) is None:
+                break
+        if expired():
+            raise DeadlineExceeded
+        return await fn()